@@ -22,7 +22,7 @@ from statistics import mean
 from classification.machine_learning import util
 from data import loadDataset
 from blocking import blocking_functions
-from blocking import blocking
+from blocking import blocking_profile
 from comparison import comparison
 from comparison import string_functions
 from classification import threshold_classification
@@ -77,37 +77,30 @@ recB_dict = loadDataset.load_data_set(datasetB_name, rec_idB_col, \
                                       attr_list, headerB_line)
 
 # -----------------------------------------------------------------------------
-# Step 2: Block the datasets
+# Step 2: Profile the blocking keys on both datasets in one pass
 
+start_time = time.time()
 
+blocking_funct_list = [(blocking_functions.simple_blocking_key, attr) for attr in attr_list] + \
+                      [(blocking_functions.phonetic_blocking_key, attr) for attr in attr_list]
 
+profile_list = blocking_profile.profile_blocking_keys(recA_dict, recB_dict, blocking_funct_list)
 
-for attr in attr_list:
-    
-    print(f"{attributes[attr]}")
-    start_time = time.time()
-
-    blocking_funct_list = [(blocking_functions.simple_blocking_key, attr)]
-
-    blockA_dict = blocking.conjunctive_block(recA_dict, blocking_funct_list)
-    blockB_dict = blocking.conjunctive_block(recB_dict, blocking_funct_list)
-
-    blocking_time = time.time() - start_time
-
-    blocking.print_block_statistics(blockA_dict, blockB_dict)
-
-print("\n\n\n--------------------------\n\n\n")
-
-for attr in attr_list:
-    
-    print(f"{attributes[attr]}")
-    start_time = time.time()
-
-    blocking_funct_list = [(blocking_functions.phonetic_blocking_key, attr)]
+blocking_time = time.time() - start_time
 
-    blockA_dict = blocking.conjunctive_block(recA_dict, blocking_funct_list)
-    blockB_dict = blocking.conjunctive_block(recB_dict, blocking_funct_list)
+for (bf, attr), profile in zip(blocking_funct_list, profile_list):
 
-    blocking_time = time.time() - start_time
+    print(f"{attributes[attr]} ({bf.__name__})")
+    print('  Dataset A number of blocks generated: %d' % (profile['num_blocksA']))
+    print('    Minimum block size: %d' % (profile['min_block_sizeA']))
+    print('    Average block size: %.4f' % (profile['avg_block_sizeA']))
+    print('    Maximum block size: %d' % (profile['max_block_sizeA']))
+    print('  Dataset B number of blocks generated: %d' % (profile['num_blocksB']))
+    print('    Minimum block size: %d' % (profile['min_block_sizeB']))
+    print('    Average block size: %.4f' % (profile['avg_block_sizeB']))
+    print('    Maximum block size: %d' % (profile['max_block_sizeB']))
+    print('  Number of record pairs: %d' % (profile['num_pairs']))
+    print('  Reduction ratio: %.4f' % (profile['reduction_ratio']))
+    print('')
 
-    blocking.print_block_statistics(blockA_dict, blockB_dict)
\ No newline at end of file
+print('Profiling runtime: %.3f sec' % blocking_time)
@@ -0,0 +1,269 @@
+""" Module with a block-size-aware blocking technique that bounds the number
+    of record pairs per block.
+
+    The records of both data sets are first blocked with a conjunctive
+    blocking scheme. Every block whose number of record pairs |A| x |B| is
+    larger than max_block_pairs is then split by the blocking key values of
+    the first fallback key, sub-blocks that are still too large are split by
+    the next fallback key, and so on. Blocks that are still too large when
+    all fallback keys are used are covered by overlapping windows of records
+    sorted on sorting key values (a sorted neighbourhood within the block).
+    The window size is limited so that a window has at most max_block_pairs
+    record pairs.
+
+    The number of record pairs of every returned block is therefore at most
+    max_block_pairs, whatever the distribution of the key values.
+
+    The blocking key value of a sub-block is a tuple of the value of its
+    parent block and the value of the fallback key, and that of a window is
+    a tuple of the value of its block, 'sn' and the window number, so they
+    cannot be equal to the (string) value of another block.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import math
+
+import numpy as np
+
+from blocking.blocking import get_blocking_attributes, group_block_keys
+from blocking.blocking_functions import apply_blocking_function
+from data.record_store import as_record_store
+
+
+# =============================================================================
+
+def _get_key_columns(rec_dict, blocking_keys, fallback_keys, sorting_keys):
+    """Return the record identifiers, the concatenated blocking key values,
+     the list of fallback key value arrays and the concatenated sorting key
+     values of all records (aligned by row).
+  """
+
+    rec_store = as_record_store(rec_dict, get_blocking_attributes(
+        blocking_keys + fallback_keys + sorting_keys))
+
+    bkv_array = np.full(len(rec_store), '', dtype=object)
+    for bf, attr in blocking_keys:
+        bkv_array = bkv_array + apply_blocking_function(bf, rec_store, attr)
+
+    fallback_bkv_list = [apply_blocking_function(bf, rec_store, attr)
+                         for (bf, attr) in fallback_keys]
+
+    skv_array = np.full(len(rec_store), '', dtype=object)
+    for bf, attr in sorting_keys:
+        skv_array = skv_array + apply_blocking_function(bf, rec_store, attr)
+
+    return rec_store.rec_id_list, bkv_array, fallback_bkv_list, skv_array
+
+
+def _group_rows(bkv_array, row_array):
+    """Return a dictionary with the blocking key values of the given rows as
+     keys and int64 arrays of the rows with that value.
+  """
+
+    return {bkv: np.array(rows, dtype=np.int64) for (bkv, rows) in
+            group_block_keys(bkv_array[row_array], row_array.tolist()).items()}
+
+
+def _tie_ranks(code_array):
+    """Return for each element the number of earlier elements with the same
+     code, as int64 array.
+  """
+
+    order = np.argsort(code_array, kind='stable')
+    sorted_code_array = code_array[order]
+
+    is_start = np.ones(len(order), dtype=bool)
+    is_start[1:] = sorted_code_array[1:] != sorted_code_array[:-1]
+    run_start_array = np.flatnonzero(is_start)
+    run_num_array = np.cumsum(is_start) - 1
+
+    rank_array = np.empty(len(order), dtype=np.int64)
+    rank_array[order] = np.arange(len(order)) - run_start_array[run_num_array]
+
+    return rank_array
+
+
+def _window_blocks(block_bkv, rowsA, rowsB, sortA_array, sortB_array, window_size):
+    """Cover the records of a block with overlapping windows of window_size
+     records sorted on their sorting key values. Consecutive windows start
+     window_size // 2 records apart, so two records that are less than
+     window_size - window_size // 2 positions apart share a window.
+
+     Records with the same sorting key value are interleaved (first record
+     of A, first record of B, second record of A, and so on), so that a run
+     of equal values that is longer than a window still gives windows with
+     records of both data sets.
+
+     Returns the list of ((block_bkv, 'sn', window number), rowsA, rowsB)
+     tuples.
+  """
+
+    row_array = np.concatenate([rowsA, rowsB])
+    is_a_array = np.zeros(len(row_array), dtype=bool)
+    is_a_array[:len(rowsA)] = True
+    skv_array = np.concatenate([sortA_array[rowsA], sortB_array[rowsB]])
+
+    skv_code_array = np.unique(skv_array, return_inverse=True)[1].ravel()
+    rank_array = np.concatenate([_tie_ranks(skv_code_array[:len(rowsA)]),
+                                 _tie_ranks(skv_code_array[len(rowsA):])])
+
+    order = np.lexsort((~is_a_array, rank_array, skv_code_array))
+    row_array = row_array[order]
+    is_a_array = is_a_array[order]
+
+    step = max(1, window_size // 2)
+
+    window_list = []
+    for (window_num, start) in enumerate(range(0, max(1, len(row_array) - step), step)):
+        window_rows = row_array[start:start + window_size]
+        window_is_a = is_a_array[start:start + window_size]
+        window_list.append(((block_bkv, 'sn', window_num),
+                            window_rows[window_is_a], window_rows[~window_is_a]))
+
+    return window_list
+
+
+# -----------------------------------------------------------------------------
+
+def size_bounded_block(recA_dict, recB_dict, blocking_keys, max_block_pairs,
+                       fallback_keys=None, sorting_keys=None,
+                       window_size=None):
+    """Build the blocking indexes of both data sets with a conjunctive blocking
+     scheme and split every block with more than max_block_pairs record pairs
+     using the fallback keys, or windows of sorted records as last resort.
+
+     The blocking key value of a sub-block is the tuple of the value of its
+     parent block and the value of the fallback key, so the blocks of the
+     two data sets stay aligned and can be passed to
+     comparison.compare_blocks. Blocks of one data set that have no
+     corresponding block in the other data set are not split.
+
+     Parameters
+     ----------
+       recA_dict       :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict       :
+          Dictionary (or RecordStore) of records from dataset B
+       blocking_keys   :
+          List of tuples consisting of the blocking key function and the
+          attribute where the function is applied (as for conjunctive_block)
+       max_block_pairs :
+          Maximum number of record pairs |A| x |B| of a block
+       fallback_keys   :
+          List of (blocking key function, attribute) tuples used one after the
+          other to split blocks that are too large (default: none)
+       sorting_keys    :
+          List of (blocking key function, attribute) tuples whose concatenated
+          values are used to sort the records of blocks that are still too
+          large after all fallback keys are used (default: the fallback keys,
+          at least one key is required)
+       window_size     :
+          Number of records per window for blocks that are still too large
+          (default and maximum: the largest size so that a window has at
+          most max_block_pairs record pairs)
+
+     Returns
+     -------
+     blockA_dict, blockB_dict:
+         dictionaries with blocking key values (strings, or tuples for
+         sub-blocks and windows) as key and lists of record identifiers of
+         data set A resp. B
+  """
+
+    assert max_block_pairs >= 1, max_block_pairs
+
+    if fallback_keys is None:
+        fallback_keys = []
+    if sorting_keys is None:
+        sorting_keys = fallback_keys
+    assert len(sorting_keys) > 0, \
+        'size_bounded_block needs sorting keys (or fallback keys) for the windows'
+
+    # A window of w records has at most (w // 2) * (w - w // 2) record pairs,
+    # so windows of up to 2 * isqrt(max_block_pairs) records keep the bound
+    #
+    max_window_size = max(2, 2 * math.isqrt(max_block_pairs))
+    if window_size is None:
+        window_size = max_window_size
+    assert window_size >= 2, window_size
+    window_size = min(window_size, max_window_size)
+
+    print('Run size bounded blocking:')
+    print('  Number of blocking keys: ' + str(len(blocking_keys)))
+    print('  Number of fallback keys: ' + str(len(fallback_keys)))
+    print('  Maximum number of record pairs per block: %d' % (max_block_pairs))
+    print('  Number of records to be blocked: %d / %d' % \
+          (len(recA_dict), len(recB_dict)))
+
+    rec_idA_list, bkvA_array, fallbackA_list, sortA_array = \
+        _get_key_columns(recA_dict, blocking_keys, fallback_keys, sorting_keys)
+    rec_idB_list, bkvB_array, fallbackB_list, sortB_array = \
+        _get_key_columns(recB_dict, blocking_keys, fallback_keys, sorting_keys)
+
+    rowsA_dict = _group_rows(bkvA_array, np.arange(len(rec_idA_list)))
+    rowsB_dict = _group_rows(bkvB_array, np.arange(len(rec_idB_list)))
+
+    # Blocks still to be processed, with the number of fallback keys used
+    #
+    block_stack = [(bkv, rowsA, rowsB_dict[bkv], 0) for (bkv, rowsA) in
+                   rowsA_dict.items() if bkv in rowsB_dict]
+    block_stack.reverse()
+
+    final_list = []
+    num_split = 0
+    num_windowed = 0
+
+    while block_stack:
+        block_bkv, rowsA, rowsB, depth = block_stack.pop()
+
+        if len(rowsA) * len(rowsB) <= max_block_pairs:
+            final_list.append((block_bkv, rowsA, rowsB))
+
+        elif depth < len(fallback_keys):
+            num_split += 1
+            sub_rowsA_dict = _group_rows(fallbackA_list[depth], rowsA)
+            sub_rowsB_dict = _group_rows(fallbackB_list[depth], rowsB)
+
+            sub_block_list = [((block_bkv, sub_bkv), sub_rowsA,
+                               sub_rowsB_dict[sub_bkv], depth + 1)
+                              for (sub_bkv, sub_rowsA) in sub_rowsA_dict.items()
+                              if sub_bkv in sub_rowsB_dict]
+            sub_block_list.reverse()
+            block_stack.extend(sub_block_list)
+
+        else:
+            num_windowed += 1
+            final_list.extend(_window_blocks(block_bkv, rowsA, rowsB,
+                                             sortA_array, sortB_array, window_size))
+
+    blockA_dict = {}
+    blockB_dict = {}
+    max_pairs = 0
+    for (block_bkv, rowsA, rowsB) in final_list:
+        if len(rowsA) == 0 or len(rowsB) == 0:
+            continue
+        blockA_dict[block_bkv] = [rec_idA_list[row] for row in rowsA.tolist()]
+        blockB_dict[block_bkv] = [rec_idB_list[row] for row in rowsB.tolist()]
+        max_pairs = max(max_pairs, len(rowsA) * len(rowsB))
+
+    # Blocks without a corresponding block in the other data set
+    #
+    for (bkv, rowsA) in rowsA_dict.items():
+        if bkv not in rowsB_dict:
+            blockA_dict[bkv] = [rec_idA_list[row] for row in rowsA.tolist()]
+    for (bkv, rowsB) in rowsB_dict.items():
+        if bkv not in rowsA_dict:
+            blockB_dict[bkv] = [rec_idB_list[row] for row in rowsB.tolist()]
+
+    print('  Number of blocks split with fallback keys: %d' % (num_split))
+    print('  Number of blocks split into sorted windows: %d' % (num_windowed))
+    print('  Maximum number of record pairs per block: %d' % (max_pairs))
+    print('')
+
+    return blockA_dict, blockB_dict
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -3,6 +3,12 @@
     as keys and values being sets or lists of record identifiers in that block.
 """
 
+import numpy as np
+
+from blocking.blocking_functions import apply_blocking_function, \
+    blocking_key_prefix, conjunction_blocking_key
+from data.record_store import as_record_store
+
 
 # =============================================================================
 
@@ -76,6 +82,18 @@ def conjunctive_block(rec_dict, blocking_keys):
     print('  Number of records to be blocked: ' + str(len(rec_dict)))
     print('')
 
+    add_conjunctive_blocks(block_dict, rec_dict, blocking_keys)
+
+    return block_dict
+
+
+def add_conjunctive_blocks(block_dict, rec_dict, blocking_keys, rec_bkv_dict=None):
+    """Insert the records of rec_dict into an existing conjunctive blocking
+     index block_dict (see conjunctive_block). The block_dict is modified in
+     place and returned. If rec_bkv_dict is given, the list of blocking key
+     values of each record is stored in it with the record identifier as key.
+  """
+
     for (rec_id, rec_values) in rec_dict.items():
 
         rec_bkv = ''  # Initialise the blocking key value for this record
@@ -101,6 +119,9 @@ def conjunctive_block(rec_dict, blocking_keys):
 
         block_dict[rec_bkv] = rec_id_list  # Store the new block
 
+        if rec_bkv_dict is not None:
+            rec_bkv_dict[rec_id] = [rec_bkv]
+
     return block_dict
 
 
@@ -150,8 +171,23 @@ def disjunctive_block(rec_dict, blocking_keys):
     print('  Number of records to be blocked: ' + str(len(rec_dict)))
     print('')
 
+    add_disjunctive_blocks(block_dict, rec_dict, blocking_keys)
+
+    return block_dict
+
+
+def add_disjunctive_blocks(block_dict, rec_dict, blocking_keys, rec_bkv_dict=None):
+    """Insert the records of rec_dict into an existing disjunctive blocking
+     index block_dict (see disjunctive_block). The block_dict is modified in
+     place and returned. If rec_bkv_dict is given, the list of blocking key
+     values of each record is stored in it with the record identifier as key.
+  """
+
     for (rec_id, rec_values) in rec_dict.items():
 
+        if rec_bkv_dict is not None:
+            rec_bkv_list = rec_bkv_dict[rec_id] = []
+
         # Initialise the blocking key value for this record
 
         # Process selected blocking blocking keys
@@ -159,7 +195,7 @@ def disjunctive_block(rec_dict, blocking_keys):
         for bf, attr in blocking_keys:
             # Add the attribute index to the blocking key values
             # to distinguish them if they are the same for different attributes
-            rec_bkv = str(attr) + bf(rec_values, attr)
+            rec_bkv = blocking_key_prefix(bf, attr) + bf(rec_values, attr)
             # Insert the blocking key value and record into blocking dictionary
             if rec_bkv in block_dict:  # Block key value in block index
                 # Only need to add the record
@@ -172,9 +208,204 @@ def disjunctive_block(rec_dict, blocking_keys):
 
             block_dict[rec_bkv] = rec_id_list  # Store the new block
 
+            if rec_bkv_dict is not None:
+                rec_bkv_list.append(rec_bkv)
+
+    return block_dict
+
+
+def block_batches(rec_batch_iter, blocking_keys, conjunctive=True):
+    """Build a blocking index from an iterator over dictionaries of records,
+     such as the one returned by loadDataset.iter_data_set, so that records
+     are blocked while they are read from the data file. A record with the
+     identifier of a record of an earlier batch replaces that record.
+
+     Parameters
+     -----------
+       rec_batch_iter :
+          Iterable of record dictionaries (record identifiers as keys and
+          lists of record values as values)
+       blocking_keys  :
+          List of tuples consisting of the blocking key function and the
+          attribute where the function is applied
+       conjunctive    :
+          If True a conjunctive blocking scheme is used (see
+          conjunctive_block), otherwise a disjunctive one (see
+          disjunctive_block)
+
+     Returns
+     -------
+     block_dict:
+         dictionary with blocking key values as key and a list of record identifiers
+  """
+
+    block_dict = {}  # The dictionary with blocks to be generated and returned
+
+    print('Run blocking on batches of records:')
+    print('  Number of blocking keys: ' + str(len(blocking_keys)))
+    print('  Blocking scheme: ' + ('conjunctive' if conjunctive else 'disjunctive'))
+
+    rec_bkv_dict = {}  # Blocking key values of all records blocked so far
+    for rec_dict in rec_batch_iter:
+
+        # A record whose identifier occurred in an earlier batch replaces the
+        # earlier record (as in loadDataset.load_data_set), so the earlier
+        # record is removed from its own blocks first. Blocks that become
+        # empty are kept until all batches are blocked, so that the order of
+        # the blocks does not change if the record is inserted into them again
+        #
+        for rec_id in rec_dict:
+            old_bkv_list = rec_bkv_dict.get(rec_id)
+            if old_bkv_list is not None:
+                for rec_bkv in dict.fromkeys(old_bkv_list):
+                    block_dict[rec_bkv] = [other_rec_id for other_rec_id in block_dict[rec_bkv]
+                                           if other_rec_id != rec_id]
+
+        if conjunctive:
+            add_conjunctive_blocks(block_dict, rec_dict, blocking_keys, rec_bkv_dict)
+        else:
+            add_disjunctive_blocks(block_dict, rec_dict, blocking_keys, rec_bkv_dict)
+
+    for rec_bkv in [rec_bkv for (rec_bkv, rec_id_list) in block_dict.items()
+                    if len(rec_id_list) == 0]:
+        del block_dict[rec_bkv]
+
+    print('  Number of records blocked: ' + str(len(rec_bkv_dict)))
+    print('')
+
     return block_dict
 
 
+def get_blocking_attributes(blocking_keys):
+    """Return the sorted list of all attribute indices used by the given
+     blocking keys (the attribute of a key may also be a list of indices, or
+     the list of keys of a conjunction_blocking_key).
+  """
+    attr_set = set()
+    for bf, attr in blocking_keys:
+        if bf is conjunction_blocking_key:
+            attr_set.update(get_blocking_attributes(attr))
+        elif isinstance(attr, (list, tuple)):
+            attr_set.update(attr)
+        else:
+            attr_set.add(attr)
+
+    return sorted(attr_set)
+
+
+def group_block_keys(bkv_array, rec_id_array):
+    """Build a block dictionary from aligned arrays of blocking key values and
+     record identifiers.
+
+     The blocking key values are mapped to integer codes (in the order of
+     their first occurrence), and the record identifiers are grouped by a
+     stable sort on these codes, so that the records of a block keep their
+     order.
+  """
+
+    num_bkvs = len(bkv_array)
+
+    code_of = {}
+    bkv_codes = np.fromiter((code_of.setdefault(bkv, len(code_of))
+                             for bkv in bkv_array), dtype=np.int64, count=num_bkvs)
+
+    order = np.argsort(bkv_codes, kind='stable')
+    block_ends = np.cumsum(np.bincount(bkv_codes, minlength=len(code_of)))
+
+    sorted_rec_id_list = np.asarray(rec_id_array, dtype=object)[order].tolist()
+
+    block_dict = {}
+    block_start = 0
+    for (rec_bkv, block_end) in zip(code_of, block_ends.tolist()):
+        block_dict[rec_bkv] = sorted_rec_id_list[block_start:block_end]
+        block_start = block_end
+
+    return block_dict
+
+
+def conjunctive_block_vectorised(rec_dict, blocking_keys):
+    """Build the same conjunctive blocking index as conjunctive_block, but
+     compute the blocking key values of all records at once per blocking key
+     (using the batch versions of the blocking functions, which encode each
+     distinct attribute value only once) and group them by integer key codes.
+
+     Parameters
+     -------------
+       rec_dict:
+          Dictionary or RecordStore that holds the record identifiers as keys
+          and corresponding list of record values
+       blocking_keys:
+           List of tuples consisting of the blocking key function and the attribute
+           where the function is applied
+
+     Returns
+     -------
+     block_dict:
+         dictionary with blocking key values as key and a list of record identifiers
+  """
+
+    print('Run vectorised blocking:')
+    print('  Number of blocking keys: ' + str(len(blocking_keys)))
+    print('  Number of records to be blocked: ' + str(len(rec_dict)))
+    print('')
+
+    rec_store = as_record_store(rec_dict, get_blocking_attributes(blocking_keys))
+
+    bkv_array = np.full(len(rec_store), '', dtype=object)
+    for bf, attr in blocking_keys:
+        # Concatenate the blocking key values of all records
+        bkv_array = bkv_array + apply_blocking_function(bf, rec_store, attr)
+
+    return group_block_keys(bkv_array, rec_store.rec_id_list)
+
+
+def disjunctive_block_vectorised(rec_dict, blocking_keys):
+    """Build the same disjunctive blocking index as disjunctive_block, but
+     compute the blocking key values of all records at once per blocking key
+     and group them by integer key codes (see conjunctive_block_vectorised).
+
+     Parameters
+     -----------
+       rec_dict      :
+           Dictionary or RecordStore that holds the record identifiers as keys
+                       and corresponding list of record values
+       blocking_keys :
+          List of tuples consisting of the blocking key function and the attribute
+          where the function is applied
+
+     Returns
+     -------
+     block_dict:
+         dictionary with blocking key values as key and a list of record identifiers
+  """
+
+    print('Run vectorised blocking:')
+    print('  Number of blocking keys: ' + str(len(blocking_keys)))
+    print('  Number of records to be blocked: ' + str(len(rec_dict)))
+    print('')
+
+    rec_store = as_record_store(rec_dict, get_blocking_attributes(blocking_keys))
+
+    if len(blocking_keys) == 0 or len(rec_store) == 0:
+        return {}
+
+    # One column of blocking key values per blocking key, prefixed with the
+    # attribute index to distinguish them
+    #
+    bkv_matrix = np.empty((len(rec_store), len(blocking_keys)), dtype=object)
+    for (key_num, (bf, attr)) in enumerate(blocking_keys):
+        bkv_matrix[:, key_num] = blocking_key_prefix(bf, attr) + \
+                                 apply_blocking_function(bf, rec_store, attr)
+
+    # Flatten row by row, so that the records are inserted in the same order
+    # as in disjunctive_block
+    #
+    rec_id_array = np.repeat(np.asarray(rec_store.rec_id_list, dtype=object),
+                             len(blocking_keys))
+
+    return group_block_keys(bkv_matrix.ravel(), rec_id_array)
+
+
 def print_block_statistics(blockA_dict, blockB_dict):
     """Calculate and print some basic statistics about the generated blocks
     """
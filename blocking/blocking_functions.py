@@ -1,8 +1,16 @@
 """ Module to define blocking functions. Each function computes for a record and a specified attribute a
 blocking key value that can be concatenated with other blocking key values
+
+Most blocking functions also have a batch version that computes the blocking key values of all records of a
+RecordStore at once and returns them as numpy array (see BATCH_BLOCKING_FUNCTIONS).
 """
+import functools
 import re
 
+import numpy as np
+
+BKV_SEPARATOR = '\x1f'  # Separator of the parts of a combined blocking key value
+
 def simple_blocking_key(rec_values, attr):
     """Builds the blocking index data structure (dictionary) to store blocking
      key values (BKV) as keys and the corresponding list of record identifiers.
@@ -22,45 +30,41 @@ def simple_blocking_key(rec_values, attr):
     return rec_values[attr]
 
 
+# Soundex code of each letter, letters without a code (vowels, H, W, Y) and
+# all other characters separate runs of equal codes. Digits of the name are
+# translated to a non-digit character so that they act as separators too.
+#
+SOUNDEX_TABLE = str.maketrans({**{char: code for (chars, code) in
+                                  [('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'),
+                                   ('L', '4'), ('MN', '5'), ('R', '6')]
+                                  for char in chars},
+                               **{digit: '.' for digit in '0123456789'}})
+
+SOUNDEX_CODE_RUN_RE = re.compile(r'([0-9])\1+')  # Run of the same code
+NON_CODE_RE = re.compile(r'[^0-9]')
+
+MEMO_CACHE_SIZE = 2 ** 16  # Maximum number of memoised encoded values
+
+
+@functools.lru_cache(maxsize=MEMO_CACHE_SIZE)
 def soundex(name):
     """
     Generate the Soundex code for a given name.
+
+    The letters are translated into their codes with a translation table, runs of the same code are collapsed
+    and all characters without a code are removed. The codes of the most recent names are memoised.
     """
     name = name.upper()
     if not name:
         return "0000"
 
-    # Initialize the Soundex code with the first letter of the name
-    soundex_code = name[0]
-
-    # Soundex mappings
-    mappings = {
-        'BFPV': '1',
-        'CGJKQSXZ': '2',
-        'DT': '3',
-        'L': '4',
-        'MN': '5',
-        'R': '6'
-    }
-
-    def get_code(char):
-        """Return the Soundex code for a given character."""
-        for key, value in mappings.items():
-            if char in key:
-                return value
-        return ''
-
-    # Encode the rest of the string
-    prev_code = get_code(name[0])
-    for char in name[1:]:
-        current_code = get_code(char)
-        if current_code != prev_code and current_code:
-            soundex_code += current_code
-        prev_code = current_code
+    # Collapse each run of the same code into one code, the first run belongs to the first letter of the name
+    # which is kept as is
+    code_str = SOUNDEX_CODE_RUN_RE.sub(r'\1', name.translate(SOUNDEX_TABLE))
+    code_str = NON_CODE_RE.sub('', code_str[1:])
 
     # Pad the Soundex code with zeros and return the first four characters
-    return (soundex_code + '000')[:4]
-
+    return (name[0] + code_str + '000')[:4]
 
 
 def phonetic_blocking_key(rec_values, attr):
@@ -76,14 +80,34 @@ def phonetic_blocking_key(rec_values, attr):
     return soundex(value)
 
 
+NON_CONSONANT_RE = re.compile(r'[^BCDFGHJKLMNPQRSTVWXYZ]')
+NON_DIGIT_RE = re.compile(r'\D')
+
+
 def extract_consonants(name, length, padding_char):
     """
     Extract consonants from a name and pad to the specified length.
     """
-    consonants = re.sub(r'[^BCDFGHJKLMNPQRSTVWXYZ]', '', name)[:length]
+    consonants = NON_CONSONANT_RE.sub('', name)[:length]
     return consonants.ljust(length, padding_char)
 
 
+@functools.lru_cache(maxsize=MEMO_CACHE_SIZE)
+def slk_name_part(name, length):
+    """
+    Return the consonants part of a SLK-581 key for a (not upper case) name. The most recent results are memoised.
+    """
+    return extract_consonants(name.upper(), length, '2')
+
+
+@functools.lru_cache(maxsize=MEMO_CACHE_SIZE)
+def slk_date_part(dob):
+    """
+    Return the date of birth part of a SLK-581 key (all digits of the date). The most recent results are memoised.
+    """
+    return NON_DIGIT_RE.sub('', dob)
+
+
 def slk_blocking_key(rec_values, attribute_index_list):
     """
 
@@ -106,15 +130,126 @@ def slk_blocking_key(rec_values, attribute_index_list):
      This method returns a blocking key value utilizing SLK-581
   """
     # *********** Implement SLK-581 function here ***********
-    family_name = rec_values[attribute_index_list[0]].upper()
-    given_name = rec_values[attribute_index_list[1]].upper()
-    dob = re.sub(r'\D', '', rec_values[attribute_index_list[2]])  # Remove non-digit characters
+    dob = slk_date_part(rec_values[attribute_index_list[2]])  # Remove non-digit characters
     sex = rec_values[attribute_index_list[3]].upper()
 
     # Extract consonants from family and given names
-    family_consonants = extract_consonants(family_name, 3, '2')
-    given_consonants = extract_consonants(given_name, 2, '2')
+    family_consonants = slk_name_part(rec_values[attribute_index_list[0]], 3)
+    given_consonants = slk_name_part(rec_values[attribute_index_list[1]], 2)
 
     # Combine components to form the SLK
     slk = family_consonants + given_consonants + dob + sex
     return slk
+
+
+def conjunction_blocking_key(rec_values, key_list):
+    """
+     A blocking key that combines several blocking keys into one, so that a
+     conjunction of keys can be used as a single key of a disjunctive
+     blocking scheme (a blocking scheme in disjunctive normal form).
+
+     Parameter Description:
+       rec_values : list of record values
+       key_list   : tuple of (blocking function, attribute) tuples
+
+     This method returns the blocking key values of all keys in key_list
+     joined with BKV_SEPARATOR, so that different combinations of values
+     cannot give the same blocking key value
+  """
+    return BKV_SEPARATOR.join([bf(rec_values, attr) for (bf, attr) in key_list])
+
+
+def blocking_key_prefix(bf, attr):
+    """
+     The prefix that distinguishes the blocking key values of the blocking key
+     (bf, attr) from those of other keys in a disjunctive blocking scheme.
+
+     For most keys this is the attribute index (or list of indices). For a
+     conjunction_blocking_key it is built from the names of the blocking
+     functions and their attributes (not from the function objects, whose
+     string representation differs between processes), followed by
+     BKV_SEPARATOR, so that the blocking key values are the same in every
+     process and can be stored in a block index on disk.
+  """
+    if bf is conjunction_blocking_key:
+        return '&'.join(['%s(%s)' % (key_bf.__name__,
+                                     blocking_key_prefix(key_bf, key_attr).rstrip(BKV_SEPARATOR))
+                         for (key_bf, key_attr) in attr]) + BKV_SEPARATOR
+
+    return str(attr)
+
+
+# -----------------------------------------------------------------------------
+# Batch versions of the blocking functions. A batch blocking function takes a
+# RecordStore (see data/record_store.py) and the same attribute argument as
+# the corresponding blocking function, and returns a numpy array (dtype
+# object) with the blocking key value of every row of the store.
+
+def encode_distinct_values(encode_funct, rec_store, attr):
+    """Apply the function encode_funct(value) once to each distinct value of
+     the attribute and return the encoded values of all rows of the store.
+  """
+    distinct_list = rec_store.distinct_values(attr)
+
+    encoded_array = np.empty(len(distinct_list), dtype=object)
+    encoded_array[:] = [encode_funct(val) for val in distinct_list]
+
+    return encoded_array[rec_store.codes(attr)]
+
+
+def simple_blocking_key_batch(rec_store, attr):
+    """Batch version of simple_blocking_key."""
+    return rec_store.column(attr)
+
+
+def phonetic_blocking_key_batch(rec_store, attr):
+    """Batch version of phonetic_blocking_key."""
+    return encode_distinct_values(soundex, rec_store, attr)
+
+
+def slk_blocking_key_batch(rec_store, attribute_index_list):
+    """Batch version of slk_blocking_key."""
+    family_consonants = encode_distinct_values(
+        lambda val: slk_name_part(val, 3), rec_store, attribute_index_list[0])
+    given_consonants = encode_distinct_values(
+        lambda val: slk_name_part(val, 2), rec_store, attribute_index_list[1])
+    dob = encode_distinct_values(slk_date_part, rec_store, attribute_index_list[2])
+    sex = encode_distinct_values(str.upper, rec_store, attribute_index_list[3])
+
+    return family_consonants + given_consonants + dob + sex
+
+
+def conjunction_blocking_key_batch(rec_store, key_list):
+    """Batch version of conjunction_blocking_key."""
+    bkv_array = np.full(len(rec_store), '', dtype=object)
+    for (key_num, (bf, attr)) in enumerate(key_list):
+        if key_num > 0:
+            bkv_array = bkv_array + BKV_SEPARATOR
+        bkv_array = bkv_array + apply_blocking_function(bf, rec_store, attr)
+
+    return bkv_array
+
+
+def apply_blocking_function(bf, rec_store, attr):
+    """Compute the blocking key values of all rows of a RecordStore with the
+     blocking function bf. The batch version of bf is used if there is one,
+     otherwise bf is applied to one record after the other.
+  """
+    bf_batch = BATCH_BLOCKING_FUNCTIONS.get(bf)
+    if bf_batch is not None:
+        return bf_batch(rec_store, attr)
+
+    bkv_array = np.empty(len(rec_store), dtype=object)
+    bkv_array[:] = [bf(rec_values, attr) for rec_values in rec_store.row_records()]
+
+    return bkv_array
+
+
+# Blocking functions and their batch versions
+#
+BATCH_BLOCKING_FUNCTIONS = {
+    simple_blocking_key: simple_blocking_key_batch,
+    phonetic_blocking_key: phonetic_blocking_key_batch,
+    slk_blocking_key: slk_blocking_key_batch,
+    conjunction_blocking_key: conjunction_blocking_key_batch,
+}
@@ -1,8 +1,12 @@
+from itertools import combinations
 from random import Random
 
 import numpy as np
 from numpy import ndarray
 
+from blocking.blocking_functions import conjunction_blocking_key
+from blocking.blocking_profile import count_block_sizes, encode_blocking_keys, profile_blocking_keys
+
 
 def select_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates, ground_truth_pairs, training_size,
                          eps, max_block_size_ratio):
@@ -41,64 +45,187 @@ def select_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates, ground
     positive_pairs, negative_pairs = generate_samples(rec_dict_a, rec_dict_b, ground_truth_pairs, training_size)
     number_of_uncovered_recs = eps * training_size
     max_block_size = max_block_size_ratio * max(len(rec_dict_a), len(rec_dict_a))
-    max_block_sizes = get_max_block_size(rec_dict_a, rec_dict_b, blocking_key_candidates)
-    new_filtered_candidates = []
-    for index, bk in enumerate(blocking_key_candidates):
-        if max_block_sizes[index] < max_block_size:
-            new_filtered_candidates.append(blocking_key_candidates[index])
-            
+
+    # Blocking key values of all records as integer codes, computed once per record and candidate
+    rec_store_a, rec_store_b, codes_a, codes_b, num_codes_list = \
+        encode_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates)
+    max_block_sizes = get_max_block_size_from_codes(codes_a, codes_b, num_codes_list)
+    filtered_indices = [index for index in range(len(blocking_key_candidates))
+                        if max_block_sizes[index] < max_block_size]
+    new_filtered_candidates = [blocking_key_candidates[index] for index in filtered_indices]
+
     print(f"Original # blocking keys: {len(blocking_key_candidates)}")
     print(f"Remaining after filtering: {len(new_filtered_candidates)}")
-    pf_vectors = generate_feature_vectors(rec_dict_a, rec_dict_b, positive_pairs, new_filtered_candidates)
-    nf_vectors = generate_feature_vectors(rec_dict_a, rec_dict_b, negative_pairs, new_filtered_candidates)
+    codes_a = codes_a[:, filtered_indices]
+    codes_b = codes_b[:, filtered_indices]
+    pf_vectors = generate_feature_vectors_from_codes(rec_store_a, rec_store_b, codes_a, codes_b, positive_pairs)
+    nf_vectors = generate_feature_vectors_from_codes(rec_store_a, rec_store_b, codes_a, codes_b, negative_pairs)
     fisher_scores = compute_fisher_score(pf_vectors, nf_vectors)
     print(f"fisher score: {fisher_scores}")
     candidates_score_list = list(zip([index for index in range(len(new_filtered_candidates))], fisher_scores.tolist()))
     candidates_score_list = sorted(candidates_score_list, key=lambda cand: cand[1], reverse=True)
-    covered_rec_pairs = set()
+    covered_rec_pairs = np.zeros(len(pf_vectors), dtype=bool)
     final_bks = []
     for bk_index, score in candidates_score_list:
-        indices = np.where(pf_vectors[:, bk_index] == 1)
-        indices = set(indices[0])
         # check if more matches are covered than before
-        diff = indices.difference(covered_rec_pairs)
-        if len(diff) > 0:
-            covered_rec_pairs = covered_rec_pairs.union(diff)
+        newly_covered = (pf_vectors[:, bk_index] == 1) & ~covered_rec_pairs
+        if newly_covered.any():
+            covered_rec_pairs |= newly_covered
             final_bks.append(new_filtered_candidates[bk_index])
-        if training_size - len(covered_rec_pairs) < number_of_uncovered_recs:
+        if training_size - np.count_nonzero(covered_rec_pairs) < number_of_uncovered_recs:
+            break
+    return final_bks
+
+
+def select_dnf_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates, ground_truth_pairs, training_size,
+                             eps, max_block_size_ratio, max_conjunction_size=2):
+    """
+    This method learns a blocking scheme in disjunctive normal form (DNF), a disjunction of conjunctions of up to
+    max_conjunction_size blocking key candidates. The method processes the following steps.
+      - All conjunctions (terms) of up to max_conjunction_size candidates are generated, and the terms whose
+        maximum block size exceeds the max_block_size_ratio are removed before their coverage is evaluated.
+      - The coverage of each term on the positive and negative training pairs is represented as packed bitsets,
+        so that the coverage of a conjunction is the AND of the bitsets of its keys.
+      - In each iteration, the term with the maximum Fisher score on the positive pairs not covered yet (and all
+        negative pairs) is added to the result, and the positive pairs it covers are removed (OR of bitsets).
+
+    The procedure terminates, if the number of uncovered positive pairs is smaller than eps * training_size, or if
+    no term covers any further positive pair.
+
+    Parameters
+    -----------
+    rec_dict_a:
+       record dictionary with rec id and list of value pairs for data data source A
+     rec_dict_b:
+        record dictionary with rec id and list of value pairs for data data source B
+     blocking_key_candidates:
+         list of blocking key candidates
+     ground_truth_pairs:
+        set of real matches
+     training_size:
+        number of positive training samples
+     eps:
+       allowed ratio of uncovered record pairs
+     max_block_size_ratio:
+       ratio of maximum block size regarding the total number of records
+     max_conjunction_size:
+       maximum number of blocking keys in a conjunction
+
+    Returns
+    ----------
+     final_bks:
+         list of blocking keys for disjunctive_block, where a conjunction of several candidates is given as
+         (conjunction_blocking_key, tuple of candidates)
+    """
+    positive_pairs, negative_pairs = generate_samples(rec_dict_a, rec_dict_b, ground_truth_pairs, training_size)
+    number_of_uncovered_recs = eps * training_size
+    max_block_size = max_block_size_ratio * max(len(rec_dict_a), len(rec_dict_b))
+
+    rec_store_a, rec_store_b, codes_a, codes_b, num_codes_list = \
+        encode_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates)
+    terms = get_dnf_candidate_terms(codes_a, codes_b, num_codes_list, max_block_size, max_conjunction_size)
+
+    print(f"Original # blocking keys: {len(blocking_key_candidates)}")
+    print(f"# conjunctions within the maximum block size: {len(terms)}")
+
+    pf_vectors = generate_feature_vectors_from_codes(rec_store_a, rec_store_b, codes_a, codes_b, positive_pairs)
+    nf_vectors = generate_feature_vectors_from_codes(rec_store_a, rec_store_b, codes_a, codes_b, negative_pairs)
+    pos_bits = get_term_bitsets(np.packbits(pf_vectors == 1, axis=0).T, terms)
+    neg_bits = get_term_bitsets(np.packbits(nf_vectors == 1, axis=0).T, terms)
+
+    neg_coverage = np.bitwise_count(neg_bits).sum(axis=1) / max(1, len(nf_vectors))
+    covered_rec_pairs = np.zeros(pos_bits.shape[1], dtype=np.uint8)
+    final_terms = []
+    while len(terms) > 0:
+        number_uncovered = len(pf_vectors) - int(np.bitwise_count(covered_rec_pairs).sum())
+        if number_uncovered == 0 or number_uncovered < number_of_uncovered_recs:
             break
+        newly_covered = np.bitwise_count(pos_bits & ~covered_rec_pairs).sum(axis=1)
+        fisher_scores = compute_binary_fisher_score(newly_covered / number_uncovered, neg_coverage)
+        fisher_scores[newly_covered == 0] = -1.0
+        best_index = int(np.argmax(fisher_scores))
+        if fisher_scores[best_index] < 0:
+            break
+        covered_rec_pairs |= pos_bits[best_index]
+        final_terms.append(terms[best_index])
+
+    final_bks = []
+    for term in final_terms:
+        if len(term) == 1:
+            final_bks.append(blocking_key_candidates[term[0]])
+        else:
+            final_bks.append((conjunction_blocking_key, tuple(blocking_key_candidates[index] for index in term)))
     return final_bks
 
 
+def get_dnf_candidate_terms(codes_a, codes_b, num_codes_list, max_block_size, max_conjunction_size):
+    """
+    Returns all conjunctions (as sorted tuples of candidate indices) of up to max_conjunction_size blocking key
+    candidates whose maximum block size over both data sources is smaller than max_block_size. A conjunction of
+    a term that is small enough is small enough as well, so block sizes are only counted for conjunctions of
+    terms that are all too large, using the combined blocking key codes of the records.
+    """
+    num_keys = len(num_codes_list)
+    valid_terms = set()
+    large_term_codes = {}  # Blocking key codes of the terms that are too large
+
+    for index in range(num_keys):
+        term_codes = (codes_a[:, index], codes_b[:, index], num_codes_list[index])
+        if max(block_size.max(initial=0) for block_size in count_block_sizes(*term_codes)) < max_block_size:
+            valid_terms.add((index,))
+        else:
+            large_term_codes[(index,)] = term_codes
+
+    level_terms = [(index,) for index in range(num_keys)]
+    for conjunction_size in range(2, max_conjunction_size + 1):
+        next_level_terms = []
+        next_large_term_codes = {}
+        for term in level_terms:
+            for index in range(term[-1] + 1, num_keys):
+                new_term = term + (index,)
+                next_level_terms.append(new_term)
+                if any(sub_term in valid_terms for sub_term in combinations(new_term, conjunction_size - 1)):
+                    valid_terms.add(new_term)
+                    continue
+                # All sub terms are too large, so the codes of the term without the last key are available
+                term_codes_a, term_codes_b, num_codes = large_term_codes[term]
+                combined_codes, new_codes = np.unique(np.concatenate([
+                    term_codes_a * num_codes_list[index] + codes_a[:, index],
+                    term_codes_b * num_codes_list[index] + codes_b[:, index]]), return_inverse=True)
+                new_term_codes = (new_codes[:len(term_codes_a)], new_codes[len(term_codes_a):], len(combined_codes))
+                if max(block_size.max(initial=0) for block_size in count_block_sizes(*new_term_codes)) < \
+                        max_block_size:
+                    valid_terms.add(new_term)
+                else:
+                    next_large_term_codes[new_term] = new_term_codes
+        level_terms = next_level_terms
+        large_term_codes = next_large_term_codes
+
+    return sorted(valid_terms, key=lambda term: (len(term), term))
+
+
+def get_term_bitsets(key_bits, terms):
+    """
+    Returns the packed coverage bitsets of the given terms (one row per term), where the bitset of a conjunction
+    is the AND of the bitsets of its blocking keys (given as rows of key_bits).
+    """
+    term_bits = np.zeros((len(terms), key_bits.shape[1]), dtype=np.uint8)
+    for term_index, term in enumerate(terms):
+        bits = key_bits[term[0]]
+        for index in term[1:]:
+            bits = bits & key_bits[index]
+        term_bits[term_index] = bits
+    return term_bits
+
+
 def get_max_block_size(rec_dict_a, rec_dict_b, blocking_key_candidates):
-    max_block_size_list = []
-    for bf, a in blocking_key_candidates:
-        block_dict = {}
-        for rec_id, rec_values in rec_dict_a.items():
-            rec_bkv = bf(rec_values, a)
-            if rec_bkv in block_dict:
-                rec_id_list = block_dict[rec_bkv]
-                rec_id_list.append(rec_id)
-            else:
-                rec_id_list = [rec_id]
-            block_dict[rec_bkv] = rec_id_list  # Store the new block
-        max_block_size = max([len(rec_list) for rec_list in block_dict.values()])
-        max_block_size_list.append(max_block_size)
-    att_index = 0
-    for bf, a in blocking_key_candidates:
-        block_dict = {}
-        for rec_id, rec_values in rec_dict_b.items():
-            rec_bkv = bf(rec_values, a)
-            if rec_bkv in block_dict:
-                rec_id_list = block_dict[rec_bkv]
-                rec_id_list.append(rec_id)
-            else:
-                rec_id_list = [rec_id]
-            block_dict[rec_bkv] = rec_id_list  # Store the new block
-        max_block_size = max([len(rec_list) for rec_list in block_dict.values()])
-        max_block_size_list[att_index] = max(max_block_size_list[att_index], max_block_size)
-        att_index += 1
-    return max_block_size_list
+    """
+    Return for each blocking key candidate the maximum block size over both data sources, computed in one
+    pass with the blocking profile (see blocking_profile.py) instead of building a block dictionary per
+    candidate and data source.
+    """
+    profile_list = profile_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates)
+    return [max(profile['max_block_sizeA'], profile['max_block_sizeB']) for profile in profile_list]
 
 
 def generate_samples(rec_dict_a, rec_dict_b, ground_truth_pairs, training_size):
@@ -132,22 +259,58 @@ def generate_samples(rec_dict_a, rec_dict_b, ground_truth_pairs, training_size):
     return positive_pairs, negative_pairs
 
 
+def get_max_block_size_from_codes(codes_a, codes_b, num_codes_list):
+    """
+    Return for each blocking key candidate the maximum block size over both data sources from the blocking
+    key codes of the records (see blocking_profile.encode_blocking_keys).
+    """
+    max_block_size_list = []
+    for index, num_codes in enumerate(num_codes_list):
+        size_a, size_b = count_block_sizes(codes_a[:, index], codes_b[:, index], num_codes)
+        max_block_size_list.append(int(max(size_a.max(initial=0), size_b.max(initial=0))))
+    return max_block_size_list
+
+
 def generate_feature_vectors(rec_dict_a, rec_dict_b, pair_set, blocking_key_candidates):
     """
     Generates a binary matrix where entry (i, j) = 1 if the j-th blocking key gives same value for the i-th pair.
     """
-    feature_vector_array = np.zeros((len(pair_set), len(blocking_key_candidates)))
+    rec_store_a, rec_store_b, codes_a, codes_b, _ = \
+        encode_blocking_keys(rec_dict_a, rec_dict_b, blocking_key_candidates)
+    return generate_feature_vectors_from_codes(rec_store_a, rec_store_b, codes_a, codes_b, pair_set)
+
+
+def generate_feature_vectors_from_codes(rec_store_a, rec_store_b, codes_a, codes_b, pair_set):
+    """
+    Generates the binary matrix of generate_feature_vectors from the blocking key codes of the records (see
+    blocking_profile.encode_blocking_keys): the code rows of the records of all pairs are gathered and
+    compared at once.
+    """
     pair_list = list(pair_set)
+    rows_a = np.fromiter((rec_store_a.row_of[id_a] for (id_a, _) in pair_list), dtype=np.int64,
+                         count=len(pair_list))
+    rows_b = np.fromiter((rec_store_b.row_of[id_b] for (_, id_b) in pair_list), dtype=np.int64,
+                         count=len(pair_list))
 
-    for i, (id_a, id_b) in enumerate(pair_list):
-        rec_a = rec_dict_a[id_a]
-        rec_b = rec_dict_b[id_b]
-        for j, (bf, attr) in enumerate(blocking_key_candidates):
-            if bf(rec_a, attr) == bf(rec_b, attr):
-                feature_vector_array[i, j] = 1
+    feature_vector_array = (codes_a[rows_a] == codes_b[rows_b]).astype(np.float64)
     return feature_vector_array
 
 
+def compute_binary_fisher_score(pos_ratio: ndarray, neg_ratio: ndarray):
+    """
+    Computes the Fisher score of binary features from the ratios of positive and negative pairs where the feature
+    is 1 (the same score as compute_fisher_score on the feature vectors).
+    """
+    numerator = np.square(pos_ratio - neg_ratio)
+    denominator = pos_ratio * (1.0 - pos_ratio) + neg_ratio * (1.0 - neg_ratio)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fisher_scores = np.divide(numerator, denominator)
+        fisher_scores[np.isnan(fisher_scores)] = 0.0
+
+    return fisher_scores
+
+
 def compute_fisher_score(pf_vectors: ndarray, nf_vectors: ndarray):
     """
     Computes the Fisher score for each blocking key.
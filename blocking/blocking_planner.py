@@ -0,0 +1,272 @@
+""" Module with functionalities to estimate the cost of a blocking scheme
+    before the candidate record pairs are compared.
+
+    The number of record pairs compared by comparison.compare_blocks is the
+    sum of |A_b| x |B_b| over all blocks b that occur in both data sets. From
+    this number, the cost of comparing one record pair (measured on a sample
+    of record pairs) and the memory needed per entry of the similarity vector
+    dictionary, the runtime and peak memory of the comparison step are
+    estimated. The number of pairs can be computed from the block
+    dictionaries, or estimated from a random sample of the records when only
+    the blocking keys are given, so that alternative blocking schemes can be
+    ranked without building their full blocking indexes.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import random
+import sys
+import time
+
+from blocking.blocking import conjunctive_block_vectorised, \
+    disjunctive_block_vectorised
+from comparison.comparison import compare_record
+
+# Number of bytes of one entry of a dictionary (hash table slot and index)
+#
+DICT_ENTRY_BYTES = sys.getsizeof(dict.fromkeys(range(2 ** 16))) / 2 ** 16
+
+
+# =============================================================================
+
+def count_block_pairs(blockA_dict, blockB_dict):
+    """Return the number of record pairs compare_blocks compares for the given
+     block dictionaries, the largest number of record pairs of a single block
+     and the number of blocks that occur in both data sets.
+  """
+
+    num_pairs = 0
+    max_block_pairs = 0
+    num_blocks = 0
+
+    for (block_bkv, rec_idA_list) in blockA_dict.items():
+        rec_idB_list = blockB_dict.get(block_bkv)
+        if rec_idB_list is None:
+            continue
+
+        block_pairs = len(rec_idA_list) * len(rec_idB_list)
+        num_pairs += block_pairs
+        max_block_pairs = max(max_block_pairs, block_pairs)
+        num_blocks += 1
+
+    return num_pairs, max_block_pairs, num_blocks
+
+
+def measure_pair_cost(recA_dict, recB_dict, attr_comp_list, num_pairs=1000,
+                      seed=42):
+    """Measure the average time in seconds to compare one record pair with
+     compare_record, using num_pairs random pairs of records.
+  """
+
+    rnd = random.Random(seed)
+    rec_idA_list = list(recA_dict.keys())
+    rec_idB_list = list(recB_dict.keys())
+    if len(rec_idA_list) == 0 or len(rec_idB_list) == 0:
+        return 0.0
+
+    rec_pair_list = [(recA_dict[rnd.choice(rec_idA_list)],
+                      recB_dict[rnd.choice(rec_idB_list)])
+                     for _ in range(num_pairs)]
+
+    start_time = time.perf_counter()
+    for (recA, recB) in rec_pair_list:
+        compare_record(recA, recB, attr_comp_list)
+
+    return (time.perf_counter() - start_time) / num_pairs
+
+
+def estimate_sim_vec_memory(num_pairs, num_sims):
+    """Estimate the number of bytes of a similarity vector dictionary (see
+     comparison.compare_blocks) with num_pairs entries of num_sims
+     similarities each. The record identifiers are shared with the record
+     dictionaries and not counted.
+  """
+
+    pair_bytes = sys.getsizeof((None, None))
+    sim_vec_bytes = sys.getsizeof([0.0] * num_sims) + num_sims * sys.getsizeof(0.0)
+
+    return int(num_pairs * (DICT_ENTRY_BYTES + pair_bytes + sim_vec_bytes))
+
+
+# -----------------------------------------------------------------------------
+
+def estimate_blocks_cost(blockA_dict, blockB_dict, pair_cost=0.0, num_sims=1):
+    """Estimate the cost of comparing the record pairs of the given block
+     dictionaries.
+
+     Parameters
+     ----------
+       blockA_dict :
+          Dictionary of blocks from dataset A
+       blockB_dict :
+          Dictionary of blocks from dataset B
+       pair_cost   :
+          Time in seconds to compare one record pair (see measure_pair_cost)
+       num_sims    :
+          Number of similarities per record pair (length of attr_comp_list)
+
+     Returns
+     -------
+     cost_dict:
+         dictionary with the estimated number of record pairs ('num_pairs'),
+         the largest number of record pairs of a block ('max_block_pairs'),
+         the number of blocks in both data sets ('num_blocks'), the runtime in
+         seconds ('runtime') and the memory in bytes of the similarity vector
+         dictionary ('memory')
+  """
+
+    num_pairs, max_block_pairs, num_blocks = count_block_pairs(blockA_dict,
+                                                               blockB_dict)
+
+    return {'num_pairs': num_pairs,
+            'max_block_pairs': max_block_pairs,
+            'num_blocks': num_blocks,
+            'runtime': num_pairs * pair_cost,
+            'memory': estimate_sim_vec_memory(num_pairs, num_sims)}
+
+
+def sample_records(rec_dict, sample_size, seed=42):
+    """Return a dictionary with a random sample of sample_size records of
+     rec_dict (or all records if there are not more).
+  """
+
+    rec_id_list = list(rec_dict.keys())
+    if sample_size is not None and sample_size < len(rec_id_list):
+        rec_id_list = random.Random(seed).sample(rec_id_list, sample_size)
+
+    return {rec_id: rec_dict[rec_id] for rec_id in rec_id_list}
+
+
+def estimate_blocking_keys_cost(recA_dict, recB_dict, blocking_keys,
+                                conjunctive=True, sample_size=None,
+                                pair_cost=0.0, num_sims=1, seed=42):
+    """Estimate the cost of a blocking scheme from its blocking keys.
+
+     The records of a random sample of each data set are blocked, and the
+     numbers of record pairs are scaled by the inverse of the product of the
+     two sampling ratios. As the samples of the two data sets are drawn
+     independently, this gives an unbiased estimate of the number of record
+     pairs. The largest block is scaled in the same way, which is accurate for
+     large blocks but can underestimate small ones.
+
+     Parameters
+     ----------
+       recA_dict     :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict     :
+          Dictionary (or RecordStore) of records from dataset B
+       blocking_keys :
+          List of tuples consisting of the blocking key function and the
+          attribute where the function is applied
+       conjunctive   :
+          If True a conjunctive blocking scheme is used, otherwise a
+          disjunctive one
+       sample_size   :
+          Number of records sampled per data set (default: all records)
+       pair_cost     :
+          Time in seconds to compare one record pair (see measure_pair_cost)
+       num_sims      :
+          Number of similarities per record pair
+       seed          :
+          Seed for the random samples
+
+     Returns
+     -------
+     cost_dict:
+         dictionary as returned by estimate_blocks_cost, with the additional
+         estimated reduction ratio ('reduction_ratio')
+  """
+
+    sampleA_dict = sample_records(recA_dict, sample_size, seed)
+    sampleB_dict = sample_records(recB_dict, sample_size, seed + 1)
+
+    if conjunctive:
+        blockA_dict = conjunctive_block_vectorised(sampleA_dict, blocking_keys)
+        blockB_dict = conjunctive_block_vectorised(sampleB_dict, blocking_keys)
+    else:
+        blockA_dict = disjunctive_block_vectorised(sampleA_dict, blocking_keys)
+        blockB_dict = disjunctive_block_vectorised(sampleB_dict, blocking_keys)
+
+    scale = 1.0
+    if len(sampleA_dict) > 0 and len(sampleB_dict) > 0:
+        scale = (len(recA_dict) / len(sampleA_dict)) * \
+                (len(recB_dict) / len(sampleB_dict))
+
+    num_pairs, max_block_pairs, num_blocks = count_block_pairs(blockA_dict,
+                                                               blockB_dict)
+    num_pairs = int(round(num_pairs * scale))
+    all_pairs = len(recA_dict) * len(recB_dict)
+
+    return {'num_pairs': num_pairs,
+            'max_block_pairs': int(round(max_block_pairs * scale)),
+            'num_blocks': num_blocks,
+            'runtime': num_pairs * pair_cost,
+            'memory': estimate_sim_vec_memory(num_pairs, num_sims),
+            'reduction_ratio': 1.0 - float(num_pairs) / all_pairs if all_pairs > 0 else 0.0}
+
+
+# -----------------------------------------------------------------------------
+
+def rank_blocking_schemes(recA_dict, recB_dict, scheme_dict, attr_comp_list,
+                          sample_size=1000, seed=42):
+    """Estimate the costs of alternative blocking schemes and rank them from
+     the cheapest to the most expensive one.
+
+     Parameters
+     ----------
+       recA_dict      :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict      :
+          Dictionary (or RecordStore) of records from dataset B
+       scheme_dict    :
+          Dictionary with scheme names as keys and (blocking_keys,
+          conjunctive) tuples as values
+       attr_comp_list :
+          List of comparison methods (see comparison.compare_blocks), used to
+          measure the cost of comparing a record pair
+       sample_size    :
+          Number of records sampled per data set (None for all records)
+       seed           :
+          Seed for the random samples
+
+     Returns
+     -------
+     ranked_list:
+         list of (scheme name, cost_dict) tuples sorted by the estimated
+         number of record pairs (see estimate_blocking_keys_cost)
+  """
+
+    print('Estimate the cost of %d blocking schemes:' % (len(scheme_dict)))
+
+    pair_cost = measure_pair_cost(recA_dict, recB_dict, attr_comp_list, seed=seed)
+
+    print('  Measured comparison cost per record pair: %.2f microseconds' % \
+          (pair_cost * 1e6))
+    print('')
+
+    ranked_list = []
+    for (scheme_name, (blocking_keys, conjunctive)) in scheme_dict.items():
+        cost_dict = estimate_blocking_keys_cost(recA_dict, recB_dict,
+                                                blocking_keys, conjunctive,
+                                                sample_size, pair_cost,
+                                                len(attr_comp_list), seed)
+        ranked_list.append((scheme_name, cost_dict))
+
+    ranked_list.sort(key=lambda scheme_cost: scheme_cost[1]['num_pairs'])
+
+    print('Estimated cost of the blocking schemes:')
+    for (scheme_name, cost_dict) in ranked_list:
+        print('  %s:' % (scheme_name))
+        print('    Number of record pairs: %d (reduction ratio %.4f)' % \
+              (cost_dict['num_pairs'], cost_dict['reduction_ratio']))
+        print('    Largest block: %d record pairs' % (cost_dict['max_block_pairs']))
+        print('    Runtime: %.1f sec' % (cost_dict['runtime']))
+        print('    Memory: %.1f MB' % (cost_dict['memory'] / 2 ** 20))
+    print('')
+
+    return ranked_list
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,183 @@
+""" Module to profile many candidate blocking keys over two data sets in one
+    pass, without building a block dictionary per key and data set.
+
+    For every candidate key the blocking key values of all records are
+    computed once (with the batch blocking functions, which encode each
+    distinct attribute value only once), mapped to integer codes that are
+    shared by the two data sets, and the block sizes are counted with
+    np.bincount. The same codes are used by blocking_key_selection to compare
+    the key values of record pairs. From the block sizes of both data sets
+    follow the number of record pairs a conjunctive blocking on the key would
+    compare and its reduction ratio.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from blocking.blocking import get_blocking_attributes
+from blocking.blocking_functions import apply_blocking_function
+from data.record_store import as_record_store
+
+
+# =============================================================================
+
+def get_key_codes(bkvA_array, bkvB_array):
+    """Map two arrays of blocking key values to integer codes, where equal
+     values of both arrays get the same code (in the order of their first
+     occurrence in A, then B).
+
+     Returns the two int64 code arrays and the number of distinct values.
+  """
+
+    code_of = {}
+    codesA = np.fromiter((code_of.setdefault(bkv, len(code_of)) for bkv in bkvA_array),
+                         dtype=np.int64, count=len(bkvA_array))
+    codesB = np.fromiter((code_of.setdefault(bkv, len(code_of)) for bkv in bkvB_array),
+                         dtype=np.int64, count=len(bkvB_array))
+
+    return codesA, codesB, len(code_of)
+
+
+def count_block_sizes(codesA, codesB, num_codes):
+    """Count the block sizes of two arrays of blocking key codes (see
+     get_key_codes).
+
+     Returns two int64 arrays with the number of records of data set A resp.
+     B per blocking key value, where the same position refers to the same
+     value in both arrays.
+  """
+
+    sizeA_array = np.bincount(codesA, minlength=num_codes)
+    sizeB_array = np.bincount(codesB, minlength=num_codes)
+
+    return sizeA_array, sizeB_array
+
+
+def encode_blocking_keys(recA_dict, recB_dict, blocking_key_candidates):
+    """Compute the blocking key values of all records of both data sets for
+     each candidate key once, and encode them as integer codes that are
+     shared by the two data sets (see get_key_codes).
+
+     Returns the RecordStore of each data set (whose rows are the rows of the
+     code matrices), the int64 code matrices of shape (number of records,
+     number of candidates) of A and B, and the number of distinct values per
+     candidate.
+  """
+
+    attr_list = get_blocking_attributes(blocking_key_candidates)
+    recA_store = as_record_store(recA_dict, attr_list)
+    recB_store = as_record_store(recB_dict, attr_list)
+
+    num_keys = len(blocking_key_candidates)
+    codesA_matrix = np.zeros((len(recA_store), num_keys), dtype=np.int64)
+    codesB_matrix = np.zeros((len(recB_store), num_keys), dtype=np.int64)
+    num_codes_list = []
+
+    for (key_num, (bf, attr)) in enumerate(blocking_key_candidates):
+        codesA, codesB, num_codes = get_key_codes(
+            apply_blocking_function(bf, recA_store, attr),
+            apply_blocking_function(bf, recB_store, attr))
+        codesA_matrix[:, key_num] = codesA
+        codesB_matrix[:, key_num] = codesB
+        num_codes_list.append(num_codes)
+
+    return recA_store, recB_store, codesA_matrix, codesB_matrix, num_codes_list
+
+
+def get_key_profile(sizeA_array, sizeB_array):
+    """Return the profile dictionary (see profile_blocking_keys) of one
+     blocking key from the block sizes of both data sets.
+  """
+
+    block_pairs_array = sizeA_array * sizeB_array
+    all_pairs = int(sizeA_array.sum()) * int(sizeB_array.sum())
+    num_pairs = int(block_pairs_array.sum())
+
+    profile_dict = {'num_pairs': num_pairs,
+                    'max_block_pairs': int(block_pairs_array.max(initial=0)),
+                    'reduction_ratio': 1.0 - float(num_pairs) / all_pairs
+                    if all_pairs > 0 else 0.0}
+
+    for (data_set, size_array) in (('A', sizeA_array), ('B', sizeB_array)):
+        block_size_array = np.sort(size_array[size_array > 0])
+        profile_dict['num_blocks' + data_set] = len(block_size_array)
+        profile_dict['block_sizes' + data_set] = block_size_array
+        profile_dict['min_block_size' + data_set] = \
+            int(block_size_array[0]) if len(block_size_array) > 0 else 0
+        profile_dict['avg_block_size' + data_set] = \
+            float(block_size_array.mean()) if len(block_size_array) > 0 else 0.0
+        profile_dict['max_block_size' + data_set] = int(block_size_array.max(initial=0))
+
+    return profile_dict
+
+
+# -----------------------------------------------------------------------------
+
+def profile_blocking_keys(recA_dict, recB_dict, blocking_key_candidates):
+    """Profile each candidate blocking key as the only key of a conjunctive
+     blocking scheme on both data sets.
+
+     Parameters
+     ----------
+       recA_dict               :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict               :
+          Dictionary (or RecordStore) of records from dataset B
+       blocking_key_candidates :
+          List of tuples consisting of the blocking key function and the
+          attribute where the function is applied
+
+     Returns
+     -------
+     profile_list:
+         list with one dictionary per candidate key (in the same order) with
+         the number of blocks ('num_blocksA', 'num_blocksB'), the sorted
+         block sizes ('block_sizesA', 'block_sizesB'), the minimum, average
+         and maximum block sizes ('min_block_sizeA', 'avg_block_sizeA',
+         'max_block_sizeA' and the same for B), the number of record pairs
+         ('num_pairs'), the largest number of record pairs of a block
+         ('max_block_pairs') and the reduction ratio ('reduction_ratio')
+  """
+
+    print('Profile blocking keys:')
+    print('  Number of candidate blocking keys: ' + str(len(blocking_key_candidates)))
+    print('  Number of records: %d / %d' % (len(recA_dict), len(recB_dict)))
+    print('')
+
+    recA_store, recB_store, codesA_matrix, codesB_matrix, num_codes_list = \
+        encode_blocking_keys(recA_dict, recB_dict, blocking_key_candidates)
+
+    profile_list = []
+    for (key_num, num_codes) in enumerate(num_codes_list):
+        sizeA_array, sizeB_array = count_block_sizes(codesA_matrix[:, key_num],
+                                                     codesB_matrix[:, key_num],
+                                                     num_codes)
+        profile_list.append(get_key_profile(sizeA_array, sizeB_array))
+
+    return profile_list
+
+
+def print_blocking_profile(blocking_key_candidates, profile_list):
+    """Print the profiles of the candidate blocking keys as returned by
+     profile_blocking_keys, one line per key.
+  """
+
+    print('Profile of the candidate blocking keys:')
+    print('  %-32s %8s %8s %8s %8s %12s %12s %8s' % \
+          ('Blocking key', 'Blocks A', 'Blocks B', 'Max A', 'Max B',
+           'Pairs', 'Max pairs', 'RR'))
+
+    for ((bf, attr), profile_dict) in zip(blocking_key_candidates, profile_list):
+        key_name = '%s(%s)' % (bf.__name__, attr)
+        print('  %-32s %8d %8d %8d %8d %12d %12d %8.4f' % \
+              (key_name, profile_dict['num_blocksA'], profile_dict['num_blocksB'],
+               profile_dict['max_block_sizeA'], profile_dict['max_block_sizeB'],
+               profile_dict['num_pairs'], profile_dict['max_block_pairs'],
+               profile_dict['reduction_ratio']))
+    print('')
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,189 @@
+""" Module with a canopy clustering blocking technique based on TF-IDF
+    weighted character q-grams.
+
+    The values of the selected attributes of the records of both data sets
+    are converted into sparse, L2-normalised TF-IDF vectors of their q-grams,
+    so that the dot product of two vectors is their cosine similarity.
+    Canopies are then formed by repeatedly selecting a record from the pool
+    of remaining records as canopy centre: all records of the pool with a
+    similarity of at least loose_thres to the centre form the canopy, and the
+    records with a similarity of at least tight_thres are removed from the
+    pool. As records can be in several canopies, the canopies overlap.
+
+    Each canopy becomes a block in the returned block dictionaries of the two
+    data sets, which can be passed to comparison.compare_blocks.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from data.record_store import as_record_store
+
+CENTRE_BATCH_SIZE = 256  # Number of candidate centres compared at once
+
+
+# =============================================================================
+
+def get_attribute_text(rec_dict, attr_list):
+    """Return the record identifiers and the concatenated values (separated by
+     a space) of the given attributes of all records as two lists.
+  """
+
+    rec_store = as_record_store(rec_dict, attr_list)
+
+    text_array = np.full(len(rec_store), '', dtype=object)
+    for (i, attr) in enumerate(attr_list):
+        if i > 0:
+            text_array = text_array + ' '
+        text_array = text_array + rec_store.column(attr)
+
+    return rec_store.rec_id_list, [text.strip() for text in text_array.tolist()]
+
+
+def canopy_block(recA_dict, recB_dict, attr_list, loose_thres, tight_thres,
+                 q=2, max_df=1.0, seed=42):
+    """Build the blocking indexes of both data sets with canopy clustering.
+
+     The similarities between a batch of candidate centres and all records
+     are computed as one sparse matrix product. The centres of a batch are
+     then processed one after the other, skipping candidates that have been
+     removed from the pool by an earlier centre, so the result is the same as
+     when the centres are compared one at a time.
+
+     Frequent q-grams make almost all pairs of records similar to some degree,
+     so that the similarity matrices become dense. With max_df smaller than
+     1.0 the q-grams that occur in more than this ratio of records are not
+     used, which keeps the matrix products sparse on large data sets.
+
+     Parameters
+     ----------
+       recA_dict   :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict   :
+          Dictionary (or RecordStore) of records from dataset B
+       attr_list   :
+          List of attribute indices whose values are used
+       loose_thres :
+          Minimum cosine similarity of a record to a centre to be added to its
+          canopy
+       tight_thres :
+          Minimum cosine similarity of a record to a centre to be removed from
+          the pool of records (must not be smaller than loose_thres)
+       q           :
+          Length of the character q-grams
+       max_df      :
+          Maximum ratio of records a q-gram can occur in to be used
+       seed        :
+          Seed for the random order in which centres are selected
+
+     Returns
+     -------
+     blockA_dict, blockB_dict:
+         dictionaries with canopy identifiers as key and lists of record
+         identifiers of data set A resp. B
+  """
+
+    assert 0.0 <= loose_thres <= tight_thres <= 1.0, (loose_thres, tight_thres)
+    assert 0.0 < max_df <= 1.0, max_df
+
+    print('Run canopy clustering blocking:')
+    print('  Attributes: ' + str(attr_list))
+    print('  Loose and tight similarity thresholds: %.3f / %.3f' % \
+          (loose_thres, tight_thres))
+    print('  Length of q-grams: %d' % (q))
+    print('  Number of records to be blocked: %d / %d' % \
+          (len(recA_dict), len(recB_dict)))
+
+    rec_idA_list, textA_list = get_attribute_text(recA_dict, attr_list)
+    rec_idB_list, textB_list = get_attribute_text(recB_dict, attr_list)
+
+    rec_id_list = rec_idA_list + rec_idB_list
+    num_recsA = len(rec_idA_list)
+
+    # Sparse TF-IDF vectors of the q-grams, normalised to unit length. The
+    # maximum ratio of records is converted into a number of records (at
+    # least one), so that it cannot conflict with the minimum number of one
+    # record on small data sets
+    #
+    max_doc_count = max(1, int(max_df * len(rec_id_list)))
+    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(q, q),
+                                 lowercase=False, norm='l2',
+                                 max_df=max_doc_count, dtype=np.float32)
+    try:
+        tfidf_matrix = vectorizer.fit_transform(textA_list + textB_list).tocsr()
+    except ValueError:
+
+        # No q-gram is left (all values are empty or shorter than q, or all
+        # q-grams are too frequent), so no record can be in a canopy
+        #
+        print('  No q-grams to compare, number of canopies: 0')
+        print('')
+
+        return {}, {}
+
+    tfidf_matrix_t = tfidf_matrix.T.tocsr()  # q-grams x records
+
+    # Records without any q-gram cannot be similar to any centre
+    #
+    in_pool = np.diff(tfidf_matrix.indptr) > 0
+
+    rng = np.random.default_rng(seed)
+    centre_order = rng.permutation(np.flatnonzero(in_pool))
+
+    blockA_dict = {}
+    blockB_dict = {}
+    num_canopies = 0
+
+    for batch_start in range(0, len(centre_order), CENTRE_BATCH_SIZE):
+        batch_centres = centre_order[batch_start:batch_start + CENTRE_BATCH_SIZE]
+        batch_centres = batch_centres[in_pool[batch_centres]]
+        if len(batch_centres) == 0:
+            continue
+
+        # Cosine similarities of the candidate centres (rows) to all records,
+        # only similarities of at least the loose threshold are kept
+        #
+        sim_matrix = tfidf_matrix[batch_centres] @ tfidf_matrix_t
+        sim_matrix.data[sim_matrix.data < loose_thres] = 0.0
+        sim_matrix.eliminate_zeros()
+
+        for (sim_row, centre) in enumerate(batch_centres.tolist()):
+            if not in_pool[centre]:  # Removed by an earlier centre
+                continue
+
+            row_start = sim_matrix.indptr[sim_row]
+            row_end = sim_matrix.indptr[sim_row + 1]
+            row_array = sim_matrix.indices[row_start:row_end]
+            sim_array = sim_matrix.data[row_start:row_end]
+
+            is_member = in_pool[row_array]
+            member_array = row_array[is_member]
+            member_array = np.union1d(member_array, [centre])
+
+            # Remove the records close to the centre (and the centre itself)
+            # from the pool
+            #
+            in_pool[row_array[is_member & (sim_array >= tight_thres)]] = False
+            in_pool[centre] = False
+
+            canopy_id = 'canopy_%d' % (num_canopies)
+            num_canopies += 1
+
+            memberA_array = member_array[member_array < num_recsA]
+            memberB_array = member_array[member_array >= num_recsA]
+            if len(memberA_array) > 0:
+                blockA_dict[canopy_id] = [rec_id_list[i] for i in memberA_array.tolist()]
+            if len(memberB_array) > 0:
+                blockB_dict[canopy_id] = [rec_id_list[i] for i in memberB_array.tolist()]
+
+    print('  Number of canopies: %d' % (num_canopies))
+    print('')
+
+    return blockA_dict, blockB_dict
+
+# -----------------------------------------------------------------------------
+
+# End of program.
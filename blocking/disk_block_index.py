@@ -0,0 +1,205 @@
+""" Module with a persistent on-disk format for block dictionaries.
+
+    A block index is stored in a directory with the sorted blocking key
+    values, the record identifiers, and the blocks as posting lists in CSR
+    form: one int32 array with the rows (positions in the record identifier
+    list) of the records of all blocks one after the other, and one int64
+    array with the start offset of each block. The arrays, and the UTF-8
+    encoded blocking key values and record identifiers with their offsets,
+    are opened as read-only memory maps, so that an index built once for a
+    large data set can be shared by several processes through the page
+    cache, opening it does not depend on its size, and only the blocks (and
+    strings) that are accessed are read from disk.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import json
+import os
+import shutil
+import tempfile
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import numpy as np
+
+from blocking.blocking import conjunctive_block_vectorised, \
+    disjunctive_block_vectorised, get_blocking_attributes
+from data.dataset_cache import MappedStringArray, save_string_array
+from data.record_store import as_record_store
+
+BLOCK_INDEX_FORMAT_VERSION = 1  # Increase if the format of an index changes
+
+
+# =============================================================================
+
+def save_block_index(block_dict, index_dir, rec_id_list=None):
+    """Save a block dictionary in the given directory. The directory is first
+     written under a temporary name and then renamed, so that an index is
+     either complete or not existing.
+
+     Parameters
+     ----------
+       block_dict  :
+          Dictionary with blocking key values as keys and lists of record
+          identifiers as values. The blocking key values must be strings, so
+          the tuple keys of block_splitting.size_bounded_block cannot be
+          saved
+       index_dir   :
+          Directory of the index (replaced if it exists)
+       rec_id_list :
+          List of all record identifiers, whose positions are the rows used
+          in the posting lists (default: the record identifiers in the order
+          of their first occurrence in the blocks)
+  """
+
+    if rec_id_list is None:
+        rec_id_list = list(dict.fromkeys(rec_id for rec_id_block in block_dict.values()
+                                         for rec_id in rec_id_block))
+    row_of = {rec_id: row for (row, rec_id) in enumerate(rec_id_list)}
+
+    assert all(isinstance(bkv, str) for bkv in block_dict), \
+        'a block index can only store string blocking key values'
+
+    bkv_list = sorted(block_dict)
+
+    offsets = np.zeros(len(bkv_list) + 1, dtype=np.int64)
+    np.cumsum([len(block_dict[bkv]) for bkv in bkv_list], out=offsets[1:])
+
+    postings = np.fromiter((row_of[rec_id] for bkv in bkv_list
+                            for rec_id in block_dict[bkv]),
+                           dtype=np.int32, count=int(offsets[-1]))
+
+    parent_dir = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix='.tmp-')
+
+    try:
+        save_string_array(os.path.join(tmp_dir, 'bkvs'), bkv_list)
+        save_string_array(os.path.join(tmp_dir, 'rec_ids'), rec_id_list)
+        np.save(os.path.join(tmp_dir, 'block_offsets.npy'), offsets)
+        np.save(os.path.join(tmp_dir, 'postings.npy'), postings)
+
+        meta_dict = {'version': BLOCK_INDEX_FORMAT_VERSION,
+                     'num_blocks': len(bkv_list),
+                     'num_recs': len(rec_id_list),
+                     'num_postings': len(postings)}
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as out_f:
+            json.dump(meta_dict, out_f)
+
+        if os.path.isdir(index_dir):  # Replace an existing index
+            shutil.rmtree(index_dir)
+        os.replace(tmp_dir, index_dir)
+
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def build_block_index(rec_dict, blocking_keys, index_dir, conjunctive=True):
+    """Block the records of rec_dict (see conjunctive_block_vectorised and
+     disjunctive_block_vectorised) and save the blocks as block index in
+     index_dir. Returns the opened DiskBlockIndex.
+  """
+
+    rec_store = as_record_store(rec_dict, get_blocking_attributes(blocking_keys))
+
+    if conjunctive:
+        block_dict = conjunctive_block_vectorised(rec_store, blocking_keys)
+    else:
+        block_dict = disjunctive_block_vectorised(rec_store, blocking_keys)
+
+    save_block_index(block_dict, index_dir, rec_store.rec_id_list)
+
+    return DiskBlockIndex(index_dir)
+
+
+# -----------------------------------------------------------------------------
+
+class DiskBlockIndex(Mapping):
+    """Read-only block dictionary backed by a block index directory written
+     with save_block_index.
+
+     The index can be used wherever a block dictionary is read, for example
+     as blockA_dict or blockB_dict of comparison.compare_blocks: the blocking
+     key values are iterated in sorted order, and a block is looked up by
+     binary search and returned as a list of record identifiers. The posting
+     lists, blocking key values and record identifiers are memory mapped, and
+     a blocking key value or record identifier is only decoded when it is
+     compared, iterated or returned in a block. A pickled
+     index only stores its directory, so it can be passed to worker processes
+     cheaply.
+
+     Parameters
+     ----------
+       index_dir :
+          Directory of the index
+  """
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, 'meta.json')) as in_f:
+            meta_dict = json.load(in_f)
+
+        assert meta_dict['version'] == BLOCK_INDEX_FORMAT_VERSION, \
+            meta_dict['version']
+
+        self.index_dir = index_dir
+        self.bkv_list = MappedStringArray(os.path.join(index_dir, 'bkvs'))
+        self.rec_id_list = MappedStringArray(os.path.join(index_dir, 'rec_ids'))
+        self.block_offsets = np.load(os.path.join(index_dir, 'block_offsets.npy'),
+                                     mmap_mode='r')
+        self.postings = np.load(os.path.join(index_dir, 'postings.npy'),
+                                mmap_mode='r')
+
+        assert len(self.bkv_list) == meta_dict['num_blocks'], len(self.bkv_list)
+        assert len(self.postings) == meta_dict['num_postings'], len(self.postings)
+
+    def __reduce__(self):
+        return (DiskBlockIndex, (self.index_dir,))
+
+    def __len__(self):
+        return len(self.bkv_list)
+
+    def __iter__(self):
+        return iter(self.bkv_list)
+
+    def _find_block(self, bkv):
+        """Return the position of the block with the given blocking key value,
+         or -1 if there is no such block (always for values that are not
+         strings, as only strings are stored).
+      """
+        if not isinstance(bkv, str):
+            return -1
+
+        pos = bisect_left(self.bkv_list, bkv)
+        if pos < len(self.bkv_list) and self.bkv_list[pos] == bkv:
+            return pos
+        return -1
+
+    def __contains__(self, bkv):
+        return self._find_block(bkv) >= 0
+
+    def __getitem__(self, bkv):
+        return [self.rec_id_list[row] for row in self.rows(bkv).tolist()]
+
+    def rows(self, bkv):
+        """Return the rows of the records of a block as int32 array (a view of
+         the memory mapped posting lists).
+      """
+        pos = self._find_block(bkv)
+        if pos < 0:
+            raise KeyError(bkv)
+
+        return self.postings[self.block_offsets[pos]:self.block_offsets[pos + 1]]
+
+    def block_sizes(self):
+        """Return the int64 array of the number of records per block, in the
+         order of the sorted blocking key values.
+      """
+        return np.diff(self.block_offsets)
+
+# -----------------------------------------------------------------------------
+
+# End of program.
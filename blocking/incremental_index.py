@@ -0,0 +1,238 @@
+""" Module with a blocking index that can be updated with new and removed
+    records, instead of being rebuilt from all records in every run.
+
+    The index keeps the blocks of one data set (for example the data set
+    whose records arrive in daily batches) and remembers which records were
+    added or removed since the last commit. The delta block dictionary
+    contains only the added records, so that comparison.compare_blocks with
+    the blocks of the other data set compares only the new record pairs.
+    The index can be saved to and loaded from a file between runs.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import os
+import pickle
+
+import numpy as np
+
+from blocking.blocking import get_blocking_attributes
+from blocking.blocking_functions import apply_blocking_function, \
+    blocking_key_prefix
+from data.record_store import as_record_store
+
+
+# =============================================================================
+
+class IncrementalBlockIndex:
+    """Blocking index of one data set that supports adding and removing
+     records.
+
+     The blocks are stored in block_dict, with the blocking key values as
+     keys and dictionaries of record identifiers (used as ordered sets) as
+     values. Iterating over a block gives its record identifiers, so that
+     block_dict can be passed to comparison.compare_blocks like the block
+     dictionaries of the blocking module.
+
+     Parameters
+     ----------
+       blocking_keys :
+          List of tuples consisting of the blocking key function and the
+          attribute where the function is applied
+       conjunctive   :
+          If True the blocking key values are built as in conjunctive_block,
+          otherwise as in disjunctive_block
+  """
+
+    def __init__(self, blocking_keys, conjunctive=True):
+        self.blocking_keys = blocking_keys
+        self.conjunctive = conjunctive
+
+        self.block_dict = {}  # Blocking key value -> {record identifier: None}
+        self.rec_bkv_dict = {}  # Record identifier -> list of blocking key values
+
+        # Changes since the last commit
+        #
+        self.added_rec_id_dict = {}  # Added record identifiers (ordered set)
+        self.removed_rec_id_set = set()
+
+    def __len__(self):
+        return len(self.rec_bkv_dict)
+
+    def __contains__(self, rec_id):
+        return rec_id in self.rec_bkv_dict
+
+    def get_bkv_lists(self, rec_dict):
+        """Return the record identifiers and the lists of blocking key values
+         of all records of rec_dict (a dictionary or RecordStore).
+      """
+
+        rec_store = as_record_store(rec_dict,
+                                    get_blocking_attributes(self.blocking_keys))
+
+        bkv_matrix = np.empty((len(rec_store), len(self.blocking_keys)), dtype=object)
+        for (key_num, (bf, attr)) in enumerate(self.blocking_keys):
+            bkv_matrix[:, key_num] = apply_blocking_function(bf, rec_store, attr)
+
+        if self.conjunctive:
+            bkv_list = [[''.join(row_bkvs)] for row_bkvs in bkv_matrix.tolist()]
+        else:
+            attr_prefix_list = [blocking_key_prefix(bf, attr)
+                                for (bf, attr) in self.blocking_keys]
+            bkv_list = [[prefix + bkv for (prefix, bkv) in zip(attr_prefix_list, row_bkvs)]
+                        for row_bkvs in bkv_matrix.tolist()]
+
+        return rec_store.rec_id_list, bkv_list
+
+    # -------------------------------------------------------------------------
+
+    def add(self, rec_dict):
+        """Add the records of rec_dict to the index. A record whose identifier
+         is already in the index replaces the old record; if the old record
+         was committed, its identifier is also reported as removed, as the
+         record pairs compared with the old record are no longer valid.
+      """
+
+        rec_id_list, bkv_list = self.get_bkv_lists(rec_dict)
+
+        for (rec_id, rec_bkvs) in zip(rec_id_list, bkv_list):
+            if rec_id in self.rec_bkv_dict:
+                self._remove_record(rec_id)
+                if rec_id not in self.added_rec_id_dict:
+                    self.removed_rec_id_set.add(rec_id)
+
+            # Keys of a disjunctive scheme can give the same blocking key
+            # value, the record is only inserted once into its block
+            #
+            rec_bkvs = list(dict.fromkeys(rec_bkvs))
+
+            self.rec_bkv_dict[rec_id] = rec_bkvs
+            for rec_bkv in rec_bkvs:
+                block = self.block_dict.get(rec_bkv)
+                if block is None:
+                    block = self.block_dict[rec_bkv] = {}
+                block[rec_id] = None
+
+            self.added_rec_id_dict[rec_id] = None
+
+    def remove(self, rec_id_list):
+        """Remove the records with the given identifiers from the index.
+         Identifiers that are not in the index are ignored.
+      """
+
+        for rec_id in rec_id_list:
+            if rec_id not in self.rec_bkv_dict:
+                continue
+
+            self._remove_record(rec_id)
+
+            # A record added and removed again since the last commit has not
+            # been compared yet
+            #
+            if rec_id in self.added_rec_id_dict:
+                del self.added_rec_id_dict[rec_id]
+            else:
+                self.removed_rec_id_set.add(rec_id)
+
+    def _remove_record(self, rec_id):
+        """Remove a record from its blocks, and remove blocks that become
+         empty.
+      """
+
+        for rec_bkv in dict.fromkeys(self.rec_bkv_dict.pop(rec_id)):
+            block = self.block_dict[rec_bkv]
+            block.pop(rec_id, None)
+            if len(block) == 0:
+                del self.block_dict[rec_bkv]
+
+    # -------------------------------------------------------------------------
+
+    def candidates_for(self, rec_values):
+        """Return the list of identifiers of the records in the index that
+         share at least one block with the given record (a list of values).
+      """
+
+        if self.conjunctive:
+            rec_bkv_list = [''.join([bf(rec_values, attr) for (bf, attr) in self.blocking_keys])]
+        else:
+            rec_bkv_list = [blocking_key_prefix(bf, attr) + bf(rec_values, attr)
+                            for (bf, attr) in self.blocking_keys]
+
+        candidate_dict = {}
+        for rec_bkv in rec_bkv_list:
+            candidate_dict.update(self.block_dict.get(rec_bkv, {}))
+
+        return list(candidate_dict)
+
+    def delta_block_dict(self):
+        """Return a block dictionary (blocking key values as keys and lists of
+         record identifiers as values) with only the records added since the
+         last commit, for comparing them with the blocks of another data set.
+      """
+
+        delta_block_dict = {}
+        for rec_id in self.added_rec_id_dict:
+            for rec_bkv in self.rec_bkv_dict[rec_id]:
+                rec_id_list = delta_block_dict.get(rec_bkv)
+                if rec_id_list is None:
+                    rec_id_list = delta_block_dict[rec_bkv] = []
+                rec_id_list.append(rec_id)
+
+        return delta_block_dict
+
+    def changed_blocks(self):
+        """Return the set of blocking key values of the blocks that had records
+         added since the last commit.
+      """
+
+        return {rec_bkv for rec_id in self.added_rec_id_dict
+                for rec_bkv in self.rec_bkv_dict[rec_id]}
+
+    def removed_rec_ids(self):
+        """Return the set of identifiers of the records removed since the last
+         commit (whose compared record pairs are no longer valid).
+      """
+
+        return set(self.removed_rec_id_set)
+
+    def commit(self):
+        """Mark all changes as processed, so that the next delta block
+         dictionary only contains records added after this call.
+      """
+
+        self.added_rec_id_dict = {}
+        self.removed_rec_id_set = set()
+
+    # -------------------------------------------------------------------------
+
+    def save(self, file_name):
+        """Save the index (including the changes not committed yet) to a file.
+         The blocking functions are stored by reference, so they must be
+         importable when the index is loaded.
+      """
+
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as out_file:
+            pickle.dump(self, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_name, file_name)
+
+
+# -----------------------------------------------------------------------------
+
+def load_block_index(file_name):
+    """Load an IncrementalBlockIndex saved with IncrementalBlockIndex.save."""
+
+    with open(file_name, 'rb') as in_file:
+        block_index = pickle.load(in_file)
+
+    print('Loaded block index from file: ' + file_name)
+    print('  Number of records and blocks: %d / %d' % \
+          (len(block_index), len(block_index.block_dict)))
+    print('')
+
+    return block_index
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,189 @@
+""" Module with a locality sensitive hashing (LSH) blocking technique based on
+    MinHash signatures of q-gram sets.
+
+    For each record the q-grams of the values of the selected attributes are
+    hashed with num_bands * num_rows hash functions, and the minimum hash
+    value per function forms the MinHash signature of the record. The
+    signature is split into num_bands bands of num_rows values, and records
+    that agree in all values of a band are put into the same block. Two
+    records with q-gram set Jaccard similarity s share at least one block
+    with probability 1 - (1 - s^num_rows)^num_bands, so more bands increase
+    pairs completeness and more rows per band reduce the number of candidate
+    pairs.
+
+    The returned block dictionaries have the same form as those of the
+    blocking module. As long as the same parameters (including the seed) are
+    used for both data sets, their blocking key values can be matched by
+    comparison.compare_blocks.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from blocking.blocking import group_block_keys
+from data.record_store import as_record_store
+
+MAX_Q = 8  # A q-gram of up to 8 bytes is stored as one 64 bit integer
+
+
+# =============================================================================
+
+def get_qgram_values(value_list, q):
+    """Compute the q-grams of the UTF-8 encoded values as 64 bit integers,
+     with one vectorised pass over the concatenation of all values.
+
+     Returns the array of q-gram integers and the int64 array of the number of
+     q-grams per value. Values shorter than q contribute their whole value as
+     a single (shorter) q-gram, and empty values contribute no q-grams.
+  """
+
+    assert 1 <= q <= MAX_Q, q
+
+    # Pad values shorter than q with zero bytes (which do not occur in UTF-8
+    # encoded text otherwise) so that they form one q-gram
+    #
+    encoded_list = []
+    for val in value_list:
+        encoded_val = val.encode('utf-8')
+        if 0 < len(encoded_val) < q:
+            encoded_val = encoded_val.ljust(q, b'\0')
+        encoded_list.append(encoded_val)
+
+    len_array = np.fromiter((len(val) for val in encoded_list), dtype=np.int64,
+                            count=len(encoded_list))
+    byte_array = np.frombuffer(b''.join(encoded_list), dtype=np.uint8)
+
+    num_qgram_array = np.maximum(len_array - q + 1, 0)
+    if len(byte_array) < q:
+        return np.zeros(0, dtype=np.uint64), num_qgram_array
+
+    # The q-gram starting at each byte position, as integer of q bytes
+    #
+    qgram_array = np.zeros(len(byte_array) - q + 1, dtype=np.uint64)
+    for i in range(q):
+        qgram_array = (qgram_array << np.uint64(8)) | \
+                      byte_array[i:len(byte_array) - q + 1 + i].astype(np.uint64)
+
+    # Only keep the q-grams that start and end within the same value: the
+    # k-th q-gram of a value starts k bytes after the start of the value
+    #
+    value_starts = np.cumsum(len_array) - len_array
+    qgram_starts = np.cumsum(num_qgram_array) - num_qgram_array
+    pos_array = np.arange(int(num_qgram_array.sum())) + \
+                np.repeat(value_starts - qgram_starts, num_qgram_array)
+
+    return qgram_array[pos_array], num_qgram_array
+
+
+def minhash_signatures(value_list, num_hashes, q=2, seed=42):
+    """Compute the MinHash signatures of the q-gram sets of the given values.
+
+     The hash functions are multiply-shift hash functions h(x) = (a * x + b)
+     >> 32 over 64 bit integers, with the parameters a and b drawn from a
+     random number generator initialised with seed.
+
+     Returns an uint32 array of shape (number of values, num_hashes) and a
+     boolean array that is False for values without any q-gram (their
+     signature is not defined).
+  """
+
+    qgram_array, num_qgram_array = get_qgram_values(value_list, q)
+
+    has_qgrams = num_qgram_array > 0
+    segment_starts = (np.cumsum(num_qgram_array) - num_qgram_array)[has_qgrams]
+
+    rng = np.random.default_rng(seed)
+    a_array = rng.integers(1, 2 ** 63, size=num_hashes, dtype=np.uint64) | np.uint64(1)
+    b_array = rng.integers(0, 2 ** 63, size=num_hashes, dtype=np.uint64)
+
+    signature_array = np.zeros((len(value_list), num_hashes), dtype=np.uint32)
+    if len(qgram_array) == 0:
+        return signature_array, has_qgrams
+
+    for k in range(num_hashes):  # One hash function at a time to bound memory
+        hash_array = ((a_array[k] * qgram_array + b_array[k]) >> np.uint64(32)).astype(np.uint32)
+        signature_array[has_qgrams, k] = np.minimum.reduceat(hash_array, segment_starts)
+
+    return signature_array, has_qgrams
+
+
+# -----------------------------------------------------------------------------
+
+def minhash_lsh_block(rec_dict, attr_list, num_bands, num_rows, q=2, seed=42):
+    """Build a blocking index with MinHash LSH over the q-grams of the given
+     attributes.
+
+     The values of the attributes of a record are concatenated (separated by
+     a space) and the q-grams of the result are used. Each band of the MinHash
+     signature gives one blocking key value per record, so every record is
+     in num_bands blocks. Records with no q-grams (all values empty) are not
+     added to any block.
+
+     Parameters
+     ----------
+       rec_dict  :
+          Dictionary (or RecordStore) that holds the record identifiers as keys
+          and corresponding list of record values
+       attr_list :
+          List of attribute indices whose values are used
+       num_bands :
+          Number of bands of the signatures
+       num_rows  :
+          Number of signature values per band
+       q         :
+          Length of the q-grams (in bytes, at most 8)
+       seed      :
+          Seed for the hash functions, must be the same for both data sets
+
+     Returns
+     -------
+     block_dict:
+         dictionary with blocking key values as key and a list of record identifiers
+  """
+
+    assert num_bands > 0 and num_rows > 0, (num_bands, num_rows)
+
+    print('Run MinHash LSH blocking:')
+    print('  Attributes: ' + str(attr_list))
+    print('  Number of bands and rows per band: %d / %d' % (num_bands, num_rows))
+    print('  Length of q-grams: %d' % (q))
+    print('  Number of records to be blocked: ' + str(len(rec_dict)))
+    print('')
+
+    rec_store = as_record_store(rec_dict, attr_list)
+
+    value_array = np.full(len(rec_store), '', dtype=object)
+    for (i, attr) in enumerate(attr_list):
+        if i > 0:
+            value_array = value_array + ' '
+        value_array = value_array + rec_store.column(attr)
+    value_list = [val.strip() for val in value_array.tolist()]
+
+    signature_array, has_qgrams = minhash_signatures(value_list,
+                                                     num_bands * num_rows, q, seed)
+
+    rec_id_array = np.empty(len(rec_store), dtype=object)
+    rec_id_array[:] = rec_store.rec_id_list
+    rec_id_array = rec_id_array[has_qgrams]
+    signature_array = signature_array[has_qgrams]
+
+    # Hash the values of each band into a 64 bit bucket number
+    #
+    bkv_list = []
+    for band in range(num_bands):
+        band_array = signature_array[:, band * num_rows:(band + 1) * num_rows]
+        bucket_array = np.zeros(len(band_array), dtype=np.uint64)
+        for row in range(num_rows):
+            bucket_array = (bucket_array * np.uint64(0x100000001b3)) ^ \
+                           band_array[:, row].astype(np.uint64)
+        bkv_list.extend('%d_%x' % (band, bucket) for bucket in bucket_array.tolist())
+
+    block_dict = group_block_keys(bkv_list, np.tile(rec_id_array, num_bands))
+
+    return block_dict
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,262 @@
+""" Module with meta-blocking functionalities that restructure the blocks of
+    two data sets into a deduplicated list of candidate record pairs.
+
+    The blocking graph has one node per record and an edge between a record
+    of data set A and a record of data set B if they share at least one
+    block. Each edge is weighted by a weighting scheme based on the blocks
+    the two records share, and edges with low weights are pruned. Every
+    remaining edge is one candidate record pair, which is compared only once
+    (see comparison.compare_pairs), however many blocks the two records
+    share.
+
+    Weighting schemes:
+      'cbs'     : number of common blocks
+      'jaccard' : number of common blocks divided by the number of blocks
+                  that contain at least one of the two records
+      'arcs'    : sum of 1 / (number of pairs of the block) over the common
+                  blocks, so that pairs sharing small blocks get high weights
+
+    Pruning schemes:
+      'wep' : weighted edge pruning, keeps the edges with a weight of at
+              least the average edge weight
+      'cep' : cardinality edge pruning, keeps the k edges with the highest
+              weights
+      'wnp' : weighted node pruning, keeps an edge if its weight is at least
+              the average weight of the edges of one of its two records
+      'cnp' : cardinality node pruning, keeps an edge if it is among the k
+              edges with the highest weights of one of its two records
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from data.interning import pack_pairs, unpack_pairs
+
+WEIGHTING_SCHEMES = ('cbs', 'jaccard', 'arcs')
+PRUNING_SCHEMES = ('wep', 'cep', 'wnp', 'cnp')
+
+
+# =============================================================================
+
+def build_blocking_graph(blockA_dict, blockB_dict, weighting='jaccard',
+                         max_block_pairs=None):
+    """Build the weighted blocking graph of two block dictionaries.
+
+     Parameters
+     ----------
+       blockA_dict     :
+          Dictionary of blocks from dataset A
+       blockB_dict     :
+          Dictionary of blocks from dataset B
+       weighting       :
+          Edge weighting scheme ('cbs', 'jaccard' or 'arcs')
+       max_block_pairs :
+          If given, blocks with more record pairs are not used (block
+          purging)
+
+     Returns
+     -------
+     edge_keys, edge_weights, rec_idA_list, rec_idB_list:
+         int64 array of edges as packed (rowA, rowB) keys (see
+         data/interning.py), float64 array of the edge weights, and the
+         record identifiers of the rows of A and B
+  """
+
+    assert weighting in WEIGHTING_SCHEMES, weighting
+
+    rowA_of = {}
+    rowB_of = {}
+
+    block_rowsA_list = []
+    block_rowsB_list = []
+    num_purged = 0
+
+    for (block_bkv, rec_idA_list) in blockA_dict.items():
+        rec_idB_list = blockB_dict.get(block_bkv)
+        if not rec_idB_list or len(rec_idA_list) == 0:
+            continue
+
+        if max_block_pairs is not None and \
+                len(rec_idA_list) * len(rec_idB_list) > max_block_pairs:
+            num_purged += 1
+            continue
+
+        # A record that occurs twice in a block only counts once
+        #
+        block_rowsA_list.append(np.unique(np.fromiter(
+            (rowA_of.setdefault(rec_id, len(rowA_of)) for rec_id in rec_idA_list),
+            dtype=np.int64, count=len(rec_idA_list))))
+        block_rowsB_list.append(np.unique(np.fromiter(
+            (rowB_of.setdefault(rec_id, len(rowB_of)) for rec_id in rec_idB_list),
+            dtype=np.int64, count=len(rec_idB_list))))
+
+    if num_purged > 0:
+        print('  Purged %d blocks with more than %d record pairs' % \
+              (num_purged, max_block_pairs))
+
+    if len(block_rowsA_list) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), list(rowA_of), list(rowB_of)
+
+    block_sizeA_array = np.array([len(rows) for rows in block_rowsA_list])
+    block_sizeB_array = np.array([len(rows) for rows in block_rowsB_list])
+    block_pairs_array = block_sizeA_array * block_sizeB_array
+
+    # All record pairs of all blocks, each block contributing the cartesian
+    # product of its A and B records
+    #
+    pair_keys = np.concatenate([
+        pack_pairs(np.repeat(rowsA, len(rowsB)), np.tile(rowsB, len(rowsA)))
+        for (rowsA, rowsB) in zip(block_rowsA_list, block_rowsB_list)])
+
+    edge_keys, edge_index = np.unique(pair_keys, return_inverse=True)
+    num_common_blocks = np.bincount(edge_index, minlength=len(edge_keys))
+
+    if weighting == 'cbs':
+        edge_weights = num_common_blocks.astype(np.float64)
+
+    elif weighting == 'arcs':
+        pair_weights = np.repeat(1.0 / block_pairs_array, block_pairs_array)
+        edge_weights = np.bincount(edge_index, weights=pair_weights,
+                                   minlength=len(edge_keys))
+
+    else:  # Jaccard similarity of the block sets of the two records
+        num_blocksA = np.bincount(np.concatenate(block_rowsA_list),
+                                  minlength=len(rowA_of))
+        num_blocksB = np.bincount(np.concatenate(block_rowsB_list),
+                                  minlength=len(rowB_of))
+        rowA_array, rowB_array = unpack_pairs(edge_keys)
+        edge_weights = num_common_blocks / \
+                       (num_blocksA[rowA_array] + num_blocksB[rowB_array] -
+                        num_common_blocks)
+
+    print('  Blocking graph with %d edges built from %d record pairs' % \
+          (len(edge_keys), len(pair_keys)))
+
+    return edge_keys, edge_weights, list(rowA_of), list(rowB_of)
+
+
+# -----------------------------------------------------------------------------
+
+def _top_k_per_node(node_array, edge_weights, k):
+    """Return a boolean mask of the edges that are among the k edges with the
+     highest weights of their node.
+  """
+
+    order = np.lexsort((-edge_weights, node_array))
+    sorted_nodes = node_array[order]
+
+    # Rank of each edge within the edges of its node
+    #
+    group_starts = np.flatnonzero(np.r_[True, sorted_nodes[1:] != sorted_nodes[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(sorted_nodes)])
+    rank_array = np.arange(len(sorted_nodes)) - np.repeat(group_starts, group_sizes)
+
+    is_top = np.zeros(len(node_array), dtype=bool)
+    is_top[order] = rank_array < k
+
+    return is_top
+
+
+def prune_edges(edge_keys, edge_weights, pruning='wep', k=None):
+    """Prune the edges of a blocking graph and return the packed keys of the
+     remaining edges.
+
+     Parameters
+     ----------
+       edge_keys    :
+          int64 array of edges as packed (rowA, rowB) keys
+       edge_weights :
+          Array of the edge weights
+       pruning      :
+          Pruning scheme ('wep', 'cep', 'wnp' or 'cnp')
+       k            :
+          Number of edges kept for 'cep' (default: half the number of edges)
+          or per record for 'cnp' (default: 1)
+  """
+
+    assert pruning in PRUNING_SCHEMES, pruning
+
+    if len(edge_keys) == 0:
+        return edge_keys
+
+    if pruning == 'wep':
+        keep_edge = edge_weights >= edge_weights.mean()
+
+    elif pruning == 'cep':
+        if k is None:
+            k = max(1, len(edge_keys) // 2)
+        keep_edge = np.zeros(len(edge_keys), dtype=bool)
+        keep_edge[np.argsort(-edge_weights, kind='stable')[:k]] = True
+
+    else:
+        rowA_array, rowB_array = unpack_pairs(edge_keys)
+
+        if pruning == 'wnp':
+            keep_edge = np.zeros(len(edge_keys), dtype=bool)
+            for row_array in (rowA_array, rowB_array):
+                node_weight_sum = np.bincount(row_array, weights=edge_weights)
+                node_num_edges = np.bincount(row_array)
+                node_mean = node_weight_sum[row_array] / node_num_edges[row_array]
+                keep_edge |= edge_weights >= node_mean
+
+        else:  # 'cnp'
+            if k is None:
+                k = 1
+            keep_edge = _top_k_per_node(rowA_array, edge_weights, k) | \
+                        _top_k_per_node(rowB_array, edge_weights, k)
+
+    return edge_keys[keep_edge]
+
+
+# -----------------------------------------------------------------------------
+
+def meta_block(blockA_dict, blockB_dict, weighting='jaccard', pruning='wep',
+               k=None, max_block_pairs=None):
+    """Apply meta-blocking to the blocks of two data sets and return the
+     deduplicated list of candidate record pairs of the pruned blocking graph.
+
+     Parameters
+     ----------
+       blockA_dict     :
+          Dictionary of blocks from dataset A
+       blockB_dict     :
+          Dictionary of blocks from dataset B
+       weighting       :
+          Edge weighting scheme ('cbs', 'jaccard' or 'arcs')
+       pruning         :
+          Pruning scheme ('wep', 'cep', 'wnp' or 'cnp')
+       k               :
+          Number of kept edges for 'cep' and 'cnp' (see prune_edges)
+       max_block_pairs :
+          If given, blocks with more record pairs are not used
+
+     Returns
+     -------
+     cand_rec_id_pair_list:
+         list of candidate (record identifier A, record identifier B) pairs
+  """
+
+    print('Run meta-blocking:')
+    print('  Weighting scheme: ' + weighting)
+    print('  Pruning scheme: ' + pruning)
+
+    edge_keys, edge_weights, rec_idA_list, rec_idB_list = \
+        build_blocking_graph(blockA_dict, blockB_dict, weighting, max_block_pairs)
+
+    kept_edge_keys = prune_edges(edge_keys, edge_weights, pruning, k)
+
+    rowA_array, rowB_array = unpack_pairs(kept_edge_keys)
+    cand_rec_id_pair_list = list(zip([rec_idA_list[row] for row in rowA_array.tolist()],
+                                     [rec_idB_list[row] for row in rowB_array.tolist()]))
+
+    print('  Number of candidate record pairs after pruning: %d' % \
+          (len(cand_rec_id_pair_list)))
+    print('')
+
+    return cand_rec_id_pair_list
+
+# -----------------------------------------------------------------------------
+
+# End of program.
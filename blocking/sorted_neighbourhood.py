@@ -0,0 +1,264 @@
+""" Module with the sorted neighbourhood technique for generating candidate
+    record pairs.
+
+    The records of both data sets are sorted together on a sorting key value,
+    and only records from different data sets whose positions in the sorted
+    list are within a sliding window are paired. Instead of a block
+    dictionary, the functions return the list of candidate record pairs,
+    which can be compared with comparison.compare_pairs.
+
+    With a fixed window of size w, at most (w - 1) pairs are generated per
+    record, independent of how often a key value occurs. The adaptive window
+    grows as long as the sorting key values in the window are similar, and
+    can also shrink below its minimum size when they are very different.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from blocking.blocking import get_blocking_attributes
+from blocking.blocking_functions import apply_blocking_function
+from comparison.string_functions import jaro_comp
+from data.record_store import as_record_store
+
+
+# =============================================================================
+
+def get_sorting_key_values(rec_dict, sorting_keys):
+    """Return the record identifiers and the sorting key values of all records
+     as two aligned numpy arrays. A sorting key value is the concatenation of
+     the values of the given sorting keys, which are (blocking function,
+     attribute) tuples as used for conjunctive blocking.
+  """
+
+    rec_store = as_record_store(rec_dict, get_blocking_attributes(sorting_keys))
+
+    skv_array = np.full(len(rec_store), '', dtype=object)
+    for bf, attr in sorting_keys:
+        skv_array = skv_array + apply_blocking_function(bf, rec_store, attr)
+
+    rec_id_array = np.empty(len(rec_store), dtype=object)
+    rec_id_array[:] = rec_store.rec_id_list
+
+    return rec_id_array, skv_array
+
+
+def sort_records(recA_dict, recB_dict, sorting_keys):
+    """Sort the records of both data sets together on their sorting key
+     values. Returns the aligned arrays of record identifiers, sorting key
+     values and a boolean array that is True for records from data set A.
+  """
+
+    rec_idA_array, skvA_array = get_sorting_key_values(recA_dict, sorting_keys)
+    rec_idB_array, skvB_array = get_sorting_key_values(recB_dict, sorting_keys)
+
+    rec_id_array = np.concatenate([rec_idA_array, rec_idB_array])
+    skv_array = np.concatenate([skvA_array, skvB_array])
+    is_a_array = np.zeros(len(rec_id_array), dtype=bool)
+    is_a_array[:len(rec_idA_array)] = True
+
+    order = np.argsort(skv_array, kind='stable')
+
+    return rec_id_array[order], skv_array[order], is_a_array[order]
+
+
+def _window_pairs(rec_id_array, is_a_array, pos_array, offset):
+    """Return the list of (rec_idA, rec_idB) pairs formed by the records at the
+     given positions and the records offset positions further in the sorted
+     list, where both records are from different data sets.
+  """
+
+    other_pos_array = pos_array + offset
+    is_pair = is_a_array[pos_array] != is_a_array[other_pos_array]
+    pos_array = pos_array[is_pair]
+    other_pos_array = other_pos_array[is_pair]
+
+    # Orientate each pair as (record from A, record from B)
+    #
+    first_is_a = is_a_array[pos_array]
+    posA_array = np.where(first_is_a, pos_array, other_pos_array)
+    posB_array = np.where(first_is_a, other_pos_array, pos_array)
+
+    return list(zip(rec_id_array[posA_array].tolist(),
+                    rec_id_array[posB_array].tolist()))
+
+
+# -----------------------------------------------------------------------------
+
+def sorted_neighbourhood_pairs(recA_dict, recB_dict, sorting_keys, window_size):
+    """Generate candidate record pairs with the sorted neighbourhood technique
+     using a fixed window size.
+
+     All records are sorted on their sorting key values, and each record is
+     paired with the records of the other data set among the next
+     window_size - 1 records in the sorted list. Every pair is generated only
+     once.
+
+     Parameters
+     ----------
+       recA_dict    :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict    :
+          Dictionary (or RecordStore) of records from dataset B
+       sorting_keys :
+          List of tuples consisting of a blocking key function and the
+          attribute where the function is applied, whose concatenated values
+          are used as sorting key
+       window_size  :
+          Number of records in the sliding window (at least 2)
+
+     Returns
+     -------
+     cand_rec_id_pair_list:
+         list of candidate (record identifier A, record identifier B) pairs
+  """
+
+    assert window_size >= 2, window_size
+
+    print('Run sorted neighbourhood:')
+    print('  Number of sorting keys: ' + str(len(sorting_keys)))
+    print('  Window size: %d' % (window_size))
+    print('  Number of records to be sorted: %d' % (len(recA_dict) + len(recB_dict)))
+
+    rec_id_array, skv_array, is_a_array = sort_records(recA_dict, recB_dict,
+                                                        sorting_keys)
+    num_recs = len(rec_id_array)
+
+    cand_rec_id_pair_list = []
+    for offset in range(1, min(window_size, num_recs)):
+        pos_array = np.arange(num_recs - offset)
+        cand_rec_id_pair_list.extend(_window_pairs(rec_id_array, is_a_array,
+                                                   pos_array, offset))
+
+    print('  Number of candidate record pairs: %d' % (len(cand_rec_id_pair_list)))
+    print('')
+
+    return cand_rec_id_pair_list
+
+
+# -----------------------------------------------------------------------------
+
+def _similar_key_mask(skv_array, pos_array, offset, sim_thres, sim_funct):
+    """Return a boolean array that is True for the positions whose sorting key
+     value has a similarity of at least sim_thres with the sorting key value
+     offset positions further. Each distinct pair of key values is compared
+     once per call, so the cache is bounded by the number of positions.
+  """
+
+    sim_cache_dict = {}  # Similarities of already compared key value pairs
+
+    is_similar = np.zeros(len(pos_array), dtype=bool)
+    for (i, pos) in enumerate(pos_array.tolist()):
+        skv_pair = (skv_array[pos], skv_array[pos + offset])
+        sim = sim_cache_dict.get(skv_pair)
+        if sim is None:
+            sim = sim_funct(skv_pair[0], skv_pair[1])
+            sim_cache_dict[skv_pair] = sim
+        is_similar[i] = sim >= sim_thres
+
+    return is_similar
+
+
+def adaptive_sorted_neighbourhood_pairs(recA_dict, recB_dict, sorting_keys,
+                                        min_window_size, max_window_size,
+                                        sim_thres, sim_funct=jaro_comp,
+                                        shrink_sim_thres=None):
+    """Generate candidate record pairs with the sorted neighbourhood technique
+     using an adaptive window size.
+
+     As with sorted_neighbourhood_pairs all records are sorted on their
+     sorting key values. The window of a record contains at least the next
+     min_window_size - 1 records (unless it shrinks, see below). It is then
+     extended one record at a time, as long as the similarity between the
+     sorting key value of the record and that of the next record is at least
+     sim_thres, up to max_window_size - 1 records. Long runs of similar key values therefore
+     get large windows, while records with a unique key value only get the
+     minimum window.
+
+     If shrink_sim_thres is given the windows also shrink: a window ends
+     before min_window_size records at the first record whose sorting key
+     value has a similarity below shrink_sim_thres with that of the record,
+     so that records with a clearly different key value get fewer pairs.
+
+     Parameters
+     ----------
+       recA_dict       :
+          Dictionary (or RecordStore) of records from dataset A
+       recB_dict       :
+          Dictionary (or RecordStore) of records from dataset B
+       sorting_keys    :
+          List of (blocking function, attribute) tuples for the sorting key
+       min_window_size :
+          Minimum number of records in a window (at least 1)
+       max_window_size :
+          Maximum number of records in a window
+       sim_thres       :
+          Minimum similarity of the sorting key values to extend a window
+       sim_funct       :
+          Function to compare two sorting key values (default: jaro_comp)
+       shrink_sim_thres :
+          Minimum similarity of the sorting key values to keep a window
+          within the minimum window size (default: None, no shrinking)
+
+     Returns
+     -------
+     cand_rec_id_pair_list:
+         list of candidate (record identifier A, record identifier B) pairs
+  """
+
+    assert 1 <= min_window_size <= max_window_size, \
+        (min_window_size, max_window_size)
+    assert 0.0 <= sim_thres <= 1.0, sim_thres
+    assert shrink_sim_thres is None or 0.0 <= shrink_sim_thres <= sim_thres, \
+        (shrink_sim_thres, sim_thres)
+
+    print('Run adaptive sorted neighbourhood:')
+    print('  Number of sorting keys: ' + str(len(sorting_keys)))
+    print('  Window size: %d to %d' % (min_window_size, max_window_size))
+    print('  Sorting key similarity threshold: %.3f' % (sim_thres))
+    if shrink_sim_thres is not None:
+        print('  Sorting key similarity threshold to shrink: %.3f' % (shrink_sim_thres))
+    print('  Number of records to be sorted: %d' % (len(recA_dict) + len(recB_dict)))
+
+    rec_id_array, skv_array, is_a_array = sort_records(recA_dict, recB_dict,
+                                                        sorting_keys)
+    num_recs = len(rec_id_array)
+
+    # Positions of the records whose windows are still growing
+    #
+    active_pos_array = np.arange(num_recs)
+
+    cand_rec_id_pair_list = []
+    for offset in range(1, min(max_window_size, num_recs)):
+        active_pos_array = active_pos_array[active_pos_array + offset < num_recs]
+
+        if offset >= min_window_size:
+
+            # Only extend the windows where the next key value is similar
+            #
+            active_pos_array = active_pos_array[_similar_key_mask(
+                skv_array, active_pos_array, offset, sim_thres, sim_funct)]
+
+        elif shrink_sim_thres is not None:
+
+            # End the windows where the next key value is very different
+            #
+            active_pos_array = active_pos_array[_similar_key_mask(
+                skv_array, active_pos_array, offset, shrink_sim_thres, sim_funct)]
+
+        if len(active_pos_array) == 0:
+            break
+
+        cand_rec_id_pair_list.extend(_window_pairs(rec_id_array, is_a_array,
+                                                   active_pos_array, offset))
+
+    print('  Number of candidate record pairs: %d' % (len(cand_rec_id_pair_list)))
+    print('')
+
+    return cand_rec_id_pair_list
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,236 @@
+""" Module with blocking techniques for free-text attributes, such as street
+    addresses or email addresses, that are too long and too variable to be
+    used as exact blocking key values.
+
+    Suffix array blocking puts each record into one block per suffix (of at
+    least a minimum length) of its value, and q-gram index blocking puts each
+    record into one block per q-gram of its value. In both cases the blocks
+    of very common suffixes or q-grams are removed, which bounds the block
+    sizes and keeps the number of record pairs close to linear.
+
+    Both functions return a block dictionary like the functions of the
+    blocking module, so that the blocks of two data sets can be passed to
+    comparison.compare_blocks. As records with the same value always get the
+    same blocks, the suffixes and q-grams are computed once per distinct
+    value, and the records are expanded into the blocks with array
+    operations.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from blocking.lsh_blocking import get_qgram_values
+from data.record_store import as_record_store
+
+
+# =============================================================================
+
+def get_value_codes(rec_dict, attr_list):
+    """Return the record identifiers, the int64 array of the codes of the
+     values of the records (the concatenated values of the given attributes)
+     and the list of distinct values, where code i refers to the i-th value.
+  """
+
+    rec_store = as_record_store(rec_dict, attr_list)
+
+    if len(attr_list) == 1:
+        return rec_store.rec_id_list, np.asarray(rec_store.codes(attr_list[0]),
+                                                 dtype=np.int64), \
+               rec_store.distinct_values(attr_list[0])
+
+    value_array = np.full(len(rec_store), '', dtype=object)
+    for attr in attr_list:
+        value_array = value_array + rec_store.column(attr)
+
+    code_of = {}
+    value_codes = np.fromiter((code_of.setdefault(val, len(code_of))
+                               for val in value_array.tolist()),
+                              dtype=np.int64, count=len(value_array))
+
+    return rec_store.rec_id_list, value_codes, list(code_of)
+
+
+def expand_value_blocks(rec_id_list, value_codes, num_values, pair_value_array,
+                        pair_key_array, key_list, max_block_size):
+    """Build a block dictionary from (distinct value, block key) pairs.
+
+     Each pair (pair_value_array[i], pair_key_array[i]) puts all records with
+     the value into the block with key key_list[pair_key_array[i]]. Blocks with
+     more than max_block_size records are removed before the records are
+     expanded.
+  """
+
+    # Number of records per distinct value, and the rows of the records
+    # grouped by value
+    #
+    value_count = np.bincount(value_codes, minlength=num_values)
+    value_start = np.cumsum(value_count) - value_count
+    rows_by_value = np.argsort(value_codes, kind='stable')
+
+    block_size = np.bincount(pair_key_array, weights=value_count[pair_value_array],
+                             minlength=len(key_list))
+    keep_pair = block_size[pair_key_array] <= max_block_size
+    pair_value_array = pair_value_array[keep_pair]
+    pair_key_array = pair_key_array[keep_pair]
+
+    # One entry per (record, block key) pair
+    #
+    rep = value_count[pair_value_array]
+    rep_start = np.cumsum(rep) - rep
+    pos_array = np.repeat(value_start[pair_value_array] - rep_start, rep) + \
+                np.arange(int(rep.sum()))
+    row_array = rows_by_value[pos_array]
+    key_array = np.repeat(pair_key_array, rep)
+
+    order = np.lexsort((row_array, key_array))
+    row_array = row_array[order]
+    key_array = key_array[order]
+
+    block_starts = np.flatnonzero(np.r_[True, key_array[1:] != key_array[:-1]]) \
+        if len(key_array) > 0 else np.zeros(0, dtype=np.int64)
+    block_ends = np.r_[block_starts[1:], len(key_array)]
+
+    row_list = row_array.tolist()
+    block_dict = {}
+    for (start, end) in zip(block_starts.tolist(), block_ends.tolist()):
+        block_dict[key_list[key_array[start]]] = [rec_id_list[row] for row
+                                                  in row_list[start:end]]
+
+    return block_dict
+
+
+# -----------------------------------------------------------------------------
+
+def suffix_array_block(rec_dict, attr_list, min_suffix_len=4, max_block_size=100):
+    """Build the blocking index data structure (dictionary) with suffix array
+     blocking.
+
+     The value of a record is the concatenation of the values of the given
+     attributes. Every suffix of the value with at least min_suffix_len
+     characters is a blocking key value of the record (a value shorter than
+     min_suffix_len is its only suffix). Blocks with more than max_block_size
+     records are removed, as their suffixes are too common to distinguish
+     records.
+
+     Examples:
+       With min_suffix_len = 4 the value 'peter' is in the blocks 'peter' and
+       'eter', and the value 'pete' only in the block 'pete'.
+
+     Parameters
+     ----------
+       rec_dict       :
+          Dictionary (or RecordStore) that holds the record identifiers as keys
+          and corresponding list of record values
+       attr_list      :
+          List of attribute indices whose values are concatenated
+       min_suffix_len :
+          Minimum number of characters of a suffix
+       max_block_size :
+          Maximum number of records of a block
+
+     Returns
+     -------
+     block_dict:
+         dictionary with blocking key values as key and a list of record identifiers
+  """
+
+    assert min_suffix_len >= 1, min_suffix_len
+
+    print('Run suffix array blocking:')
+    print('  Attributes: ' + str(attr_list))
+    print('  Minimum suffix length: %d' % (min_suffix_len))
+    print('  Maximum block size: %d' % (max_block_size))
+    print('  Number of records to be blocked: ' + str(len(rec_dict)))
+
+    rec_id_list, value_codes, value_list = get_value_codes(rec_dict, attr_list)
+
+    suffix_code_of = {}
+    pair_value_list = []
+    pair_key_list = []
+    for (value_code, val) in enumerate(value_list):
+        if len(val) == 0:
+            continue
+        for start in range(max(1, len(val) - min_suffix_len + 1)):
+            pair_value_list.append(value_code)
+            pair_key_list.append(suffix_code_of.setdefault(val[start:], len(suffix_code_of)))
+
+    block_dict = expand_value_blocks(rec_id_list, value_codes, len(value_list),
+                                     np.array(pair_value_list, dtype=np.int64),
+                                     np.array(pair_key_list, dtype=np.int64),
+                                     list(suffix_code_of), max_block_size)
+
+    print('  Number of blocks: %d (%d removed as too large)' % \
+          (len(block_dict), len(suffix_code_of) - len(block_dict)))
+    print('')
+
+    return block_dict
+
+
+def qgram_index_block(rec_dict, attr_list, q=3, max_posting_len=100):
+    """Build the blocking index data structure (dictionary) as an inverted
+     index of the q-grams of the values.
+
+     The value of a record is the concatenation of the values of the given
+     attributes, and each distinct q-gram (of UTF-8 bytes, see
+     lsh_blocking.get_qgram_values) of the value is a blocking key value of the
+     record. The q-grams whose posting list (block) has more than
+     max_posting_len records are stop-grams and are removed.
+
+     The q-grams of all distinct values are computed in one vectorised pass,
+     and the posting lists are built by sorting the (q-gram, record) pairs,
+     without a Python list per q-gram.
+
+     Parameters
+     ----------
+       rec_dict        :
+          Dictionary (or RecordStore) that holds the record identifiers as keys
+          and corresponding list of record values
+       attr_list       :
+          List of attribute indices whose values are concatenated
+       q               :
+          Length of the q-grams (in bytes, at most 8)
+       max_posting_len :
+          Maximum number of records of a block
+
+     Returns
+     -------
+     block_dict:
+         dictionary with blocking key values (the q-grams as hexadecimal
+         numbers) as key and a list of record identifiers
+  """
+
+    print('Run q-gram index blocking:')
+    print('  Attributes: ' + str(attr_list))
+    print('  Length of q-grams: %d' % (q))
+    print('  Maximum posting list length: %d' % (max_posting_len))
+    print('  Number of records to be blocked: ' + str(len(rec_dict)))
+
+    rec_id_list, value_codes, value_list = get_value_codes(rec_dict, attr_list)
+
+    qgram_array, num_qgram_array = get_qgram_values(value_list, q)
+    value_array = np.repeat(np.arange(len(value_list), dtype=np.int64), num_qgram_array)
+
+    # A q-gram that occurs several times in a value only counts once
+    #
+    qgram_list, qgram_codes = np.unique(qgram_array, return_inverse=True)
+    value_qgram_pairs = np.unique(value_array * len(qgram_list) + qgram_codes)
+    pair_value_array = value_qgram_pairs // max(1, len(qgram_list))
+    pair_key_array = value_qgram_pairs % max(1, len(qgram_list))
+
+    key_list = ['%x' % (qgram) for qgram in qgram_list.tolist()]
+
+    block_dict = expand_value_blocks(rec_id_list, value_codes, len(value_list),
+                                     pair_value_array, pair_key_array, key_list,
+                                     max_posting_len)
+
+    print('  Number of blocks: %d (%d stop-grams removed)' % \
+          (len(block_dict), len(key_list) - len(block_dict)))
+    print('')
+
+    return block_dict
+
+# -----------------------------------------------------------------------------
+
+# End of program.
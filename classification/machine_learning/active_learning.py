@@ -2,6 +2,8 @@ import operator
 import numpy as np
 import sklearn.tree
 
+from comparison.similarity_matrix import as_similarity_matrix
+
 
 class ActiveLearning:
 
@@ -31,7 +33,7 @@ class ActiveLearning:
         Parameters
         ------------
         sim_vec_dict:
-          dictionary of record pairs with lists of similarity values as value
+          dictionary of record pairs with lists of similarity values as value, or SimilarityMatrix
         true_match_set:
           set of matches used as oracle
 
@@ -41,36 +43,23 @@ class ActiveLearning:
             trained decision tree
 
         """
-        num_train_rec = len(sim_vec_dict)
-        num_features = len(list(sim_vec_dict.values())[0])
+        sim_matrix = as_similarity_matrix(sim_vec_dict)
+        num_train_rec = len(sim_matrix)
+        num_features = sim_matrix.num_attrs
 
         print('  Number of training records and features: %d / %d' % \
               (num_train_rec, num_features))
 
         # all similarity vectors
-        all_data = np.zeros([num_train_rec, num_features])
-        # class label 0 and 1 for each vector in all_train_data
-        all_train_class = np.zeros(num_train_rec)
-
-        rec_pair_id_list = []
-
-        num_pos = 0
-        num_neg = 0
-        i = 0
-        # initialization of numpy arrays representing the similarity vectors and the corresponding classes
-        for (rec_id1, rec_id2) in sim_vec_dict:
-            rec_pair_id_list.append((rec_id1, rec_id2))
-            sim_vec = sim_vec_dict[(rec_id1, rec_id2)]
-
-            all_data[:][i] = sim_vec
-
-            if (rec_id1, rec_id2) in true_match_set:
-                all_train_class[i] = 1.0
-                num_pos += 1
-            else:
-                all_train_class[i] = 0.0
-                num_neg += 1
-            i += 1
+        all_data = sim_matrix.sim_array
+
+        # class label 0 and 1 for each vector in all_train_data (vectorised
+        # lookup if true_match_set is a TruthIndex)
+        is_match_array = sim_matrix.labels(true_match_set)
+        all_train_class = is_match_array.astype(float)
+
+        num_pos = int(np.count_nonzero(is_match_array))
+        num_neg = num_train_rec - num_pos
 
         num_all = num_pos + num_neg
         print('  Number of positive and negative records: %d / %d' % \
@@ -1,6 +1,8 @@
 import numpy
 from sklearn.tree import DecisionTreeClassifier, BaseDecisionTree
 
+from comparison.similarity_matrix import as_similarity_matrix
+
 
 def train_supervised(sim_vec_dict, true_match_set) -> BaseDecisionTree:
     """
@@ -13,7 +15,7 @@ def train_supervised(sim_vec_dict, true_match_set) -> BaseDecisionTree:
     sim_vec_dict  :
         Dictionary of record pairs with their identifiers as
                        as keys and their corresponding similarity vectors as
-                       values.
+                       values, or SimilarityMatrix.
     true_match_set :
           Set of true matches (record identifier pairs)
 
@@ -30,33 +32,22 @@ def train_supervised(sim_vec_dict, true_match_set) -> BaseDecisionTree:
     # Generate the training data sets (similarity vectors plus class labels
     # (match or non-match)
     #
-    num_train_rec = len(sim_vec_dict)
-    num_features = len(list(sim_vec_dict.values())[0])
+    sim_matrix = as_similarity_matrix(sim_vec_dict)
+    num_train_rec = len(sim_matrix)
+    num_features = sim_matrix.num_attrs
 
     print('  Number of training records and features: %d / %d' % \
           (num_train_rec, num_features))
 
-    all_train_data = numpy.zeros([num_train_rec, num_features])
-    all_train_class = numpy.zeros(num_train_rec)
-
-    rec_pair_id_list = []
-
-    num_pos = 0
-    num_neg = 0
-    i = 0
-    for (rec_id1, rec_id2) in sim_vec_dict:
-        rec_pair_id_list.append((rec_id1, rec_id2))
-        sim_vec = sim_vec_dict[(rec_id1, rec_id2)]
+    all_train_data = sim_matrix.sim_array
 
-        all_train_data[:][i] = sim_vec
+    # Label all pairs at once (vectorised if true_match_set is a TruthIndex)
+    #
+    is_match_array = sim_matrix.labels(true_match_set, symmetric=True)
+    all_train_class = is_match_array.astype(float)
 
-        if (rec_id1, rec_id2) in true_match_set or (rec_id2, rec_id1) in true_match_set:
-            all_train_class[i] = 1.0
-            num_pos += 1
-        else:
-            all_train_class[i] = 0.0
-            num_neg += 1
-        i += 1
+    num_pos = int(numpy.count_nonzero(is_match_array))
+    num_neg = num_train_rec - num_pos
     print('Number of positive and negative training records: %d / %d' % \
           (num_pos, num_neg))
     decision_tree = DecisionTreeClassifier()
@@ -69,27 +60,30 @@ def classify_record_pairs(sim_vec_dict, decision_tree: BaseDecisionTree):
     Predicts for each record pair with its similarity vector of the dictionary the class match or non-match
     :param sim_vec_dict: Dictionary of record pairs with their identifiers as
                        as keys and their corresponding similarity vectors as
-                       values.
+                       values, or SimilarityMatrix.
     :param decision_tree: trained model
     :return: set of matches, set of non-matches
     """
+    sim_matrix = as_similarity_matrix(sim_vec_dict)
+    is_match_array = predict_matches(sim_matrix.sim_array, decision_tree)
     class_match_set = set()
     class_nonmatch_set = set()
-    num_test_rec = len(sim_vec_dict)
-    num_features = len(list(sim_vec_dict.values())[0])
-    test_data = numpy.zeros([num_test_rec, num_features])
-    rec_pair_id_list = []
-    i = 0
-    for (rec_id1, rec_id2) in sim_vec_dict:
-        rec_pair_id_list.append((rec_id1, rec_id2))
-        sim_vec = sim_vec_dict[(rec_id1, rec_id2)]
-        test_data[:][i] = sim_vec
-        i += 1
-    class_predict = decision_tree.predict(test_data)
-    for i in range(len(rec_pair_id_list)):
-        rec_id_pair = rec_pair_id_list[i]
-        if class_predict[i] == 1:
+    for (rec_id_pair, is_match) in zip(sim_matrix.pair_list(), is_match_array.tolist()):
+        if is_match:
             class_match_set.add(rec_id_pair)
         else:
             class_nonmatch_set.add(rec_id_pair)
     return class_match_set, class_nonmatch_set
+
+
+def predict_matches(sim_matrix, decision_tree: BaseDecisionTree):
+    """
+    Predicts for each row (similarity vector) of the numpy array sim_matrix whether the record pair is a match
+    :param sim_matrix: numpy array with one similarity vector per row, for example a chunk of
+                       comparison.compare_blocks_chunked
+    :param decision_tree: trained model
+    :return: boolean array that is True for the rows predicted as matches
+    """
+    if len(sim_matrix) == 0:
+        return numpy.zeros(0, dtype=bool)
+    return decision_tree.predict(sim_matrix) == 1
@@ -1,17 +1,29 @@
 import random
-from collections import defaultdict
+
+import numpy as np
+
+from comparison.similarity_matrix import SimilarityMatrix, as_similarity_matrix
+from data.interning import unpack_pairs
+from data.truth_index import TruthIndex
+
+TRUTH_INDEX_ID_ERROR = 'a TruthIndex holds rows of records, the record identifiers of the record pairs ' \
+                       'must be mapped to rows first (see interning.intern_sim_vec_dict)'
 
 
 def kfold_split(sim_vec_dict: dict[(str, str):list[float]], true_match_set: set, k: int, seed=37) -> list[
     tuple[dict, dict, set, int]]:
     """
-    Generate k-fold splits from a dictionary, returning a list of tuples containing
+    Generate k-fold splits from a dictionary or SimilarityMatrix, returning a list of tuples containing
     training and test dictionaries for each fold.
 
+    The true matches are distributed over the folds first (in random order), then the other record pairs.
+    If a SimilarityMatrix is given, the training and test sets are SimilarityMatrix objects instead of
+    dictionaries, and each test matrix is a slice of one matrix holding the record pairs ordered by fold.
+
     Parameters
     ------------
     sim_vec_dict:
-            Input dictionary to be split into folds
+            Input dictionary (or SimilarityMatrix) to be split into folds
     true_match_set:
         set of true matches
     k:
@@ -22,35 +34,90 @@ def kfold_split(sim_vec_dict: dict[(str, str):list[float]], true_match_set: set,
     Returns
     --------
     train_test_folds:
-        List of (train_dict, test_dict, ground_truth_subset, all_comparisons) tuples for each fold
+        List of (train_dict, test_dict, ground_truth_subset, all_comparisons) tuples for each fold, with
+        SimilarityMatrix objects instead of dictionaries if sim_vec_dict is a SimilarityMatrix
     """
     random.seed(seed)
-    non_matching_pairs = dict(sim_vec_dict)
-    folds = [defaultdict(list) for i in range(k)]
+    sim_matrix = as_similarity_matrix(sim_vec_dict)
+    if isinstance(true_match_set, TruthIndex) and sim_matrix.id_mapA is not None:
+        raise ValueError(TRUTH_INDEX_ID_ERROR)
     true_match_list = list(true_match_set)
     random.shuffle(true_match_list)
-    index = 0
-    for p in true_match_list:
-        if p in non_matching_pairs:
-            folds[index % k][p] = non_matching_pairs[p]
-            index += 1
-            del non_matching_pairs[p]
-    for i, p in enumerate(list(non_matching_pairs.keys())):
-        folds[i % k][p] = non_matching_pairs[p]
+    # positions of the compared true matches (in random order) and of all other record pairs
+    match_pos_array = sim_matrix.positions(true_match_list)
+    match_pos_array = match_pos_array[match_pos_array >= 0]
+    is_match_array = np.zeros(len(sim_matrix), dtype=bool)
+    is_match_array[match_pos_array] = True
+    nonmatch_pos_array = np.flatnonzero(~is_match_array)
+    order = np.concatenate([match_pos_array, nonmatch_pos_array])
+    fold_array = np.concatenate([np.arange(len(match_pos_array)) % k,
+                                 np.arange(len(nonmatch_pos_array)) % k])
+    fold_matrix, test_matrix_list = sim_matrix.select(order).folds(fold_array, k)
+    if not isinstance(sim_vec_dict, SimilarityMatrix):
+        # record pairs ordered by fold, to build dictionaries with the original similarity vectors
+        pair_list = list(sim_vec_dict)
+        fold_pair_list = [pair_list[pos] for pos in order[np.argsort(fold_array, kind='stable')].tolist()]
     train_test_folds = []
+    fold_start = 0
     for i in range(k):
-        test_dict = dict(folds[i])
-        gt_subset, all_comparisons = generate_subset(true_match_set, list(test_dict.items()))
-        train_dict = {k: v for rest, d in enumerate(folds) if rest != i for k, v in d.items()}
-        train_test_folds.append((train_dict, test_dict, gt_subset, all_comparisons))
+        test_matrix = test_matrix_list[i]
+        fold_end = fold_start + len(test_matrix)
+        if isinstance(sim_vec_dict, SimilarityMatrix):
+            gt_subset, all_comparisons = generate_subset(true_match_set, test_matrix)
+            train_matrix = fold_matrix.select(np.r_[0:fold_start, fold_end:len(fold_matrix)])
+            train_test_folds.append((train_matrix, test_matrix, gt_subset, all_comparisons))
+        else:
+            test_dict = {p: sim_vec_dict[p] for p in fold_pair_list[fold_start:fold_end]}
+            gt_subset, all_comparisons = generate_subset(true_match_set, list(test_dict.items()))
+            train_dict = {p: sim_vec_dict[p] for p in fold_pair_list[:fold_start] + fold_pair_list[fold_end:]}
+            train_test_folds.append((train_dict, test_dict, gt_subset, all_comparisons))
+        fold_start = fold_end
     return train_test_folds
 
 
-def generate_subset(true_matches, test_pairs: list):
+def generate_subset(true_matches, test_pairs, id_map_a=None, id_map_b=None):
+    """
+    Select the true matches between the records of the test record pairs, given as SimilarityMatrix or
+    as list of (record pair, similarity vector) items. Returns the subset and the number of all record pairs
+    between these records.
+
+    A TruthIndex holds rows of records, so record identifiers in a list of items are mapped to rows with the
+    RecordIdMap objects id_map_a and id_map_b (the maps the index was built with), which are only needed
+    if the record pairs are not already rows (see interning.intern_sim_vec_dict).
+    """
+    if isinstance(test_pairs, SimilarityMatrix):
+        rows_a = np.unique(test_pairs.rowA_array)
+        rows_b = np.unique(test_pairs.rowB_array)
+        if isinstance(true_matches, TruthIndex):
+            return _truth_index_subset(true_matches, rows_a, rows_b), len(rows_a) * len(rows_b)
+        if test_pairs.id_mapA is None:
+            recs_a = set(rows_a.tolist())
+            recs_b = set(rows_b.tolist())
+        else:
+            recs_a = set(test_pairs.id_mapA.rec_ids(rows_a))
+            recs_b = set(test_pairs.id_mapB.rec_ids(rows_b))
+    else:
+        recs_a = set([item[0][0] for item in test_pairs])
+        recs_b = set([item[0][1] for item in test_pairs])
+        if isinstance(true_matches, TruthIndex):
+            if id_map_a is not None:
+                rows_a = id_map_a.rows(list(recs_a))
+                rows_b = id_map_b.rows(list(recs_b))
+            elif all(isinstance(rec, (int, np.integer)) for rec in recs_a | recs_b):
+                rows_a = np.fromiter(recs_a, dtype=np.int64, count=len(recs_a))
+                rows_b = np.fromiter(recs_b, dtype=np.int64, count=len(recs_b))
+            else:
+                raise ValueError(TRUTH_INDEX_ID_ERROR)
+            return _truth_index_subset(true_matches, rows_a, rows_b), len(recs_a) * len(recs_b)
     gt_subset = set()
-    recs_a = set([item[0][0] for item in test_pairs])
-    recs_b = set([item[0][1] for item in test_pairs])
     for p in true_matches:
         if p[0] in recs_a and p[1] in recs_b:
             gt_subset.add(p)
     return gt_subset, len(recs_a) * len(recs_b)
+
+
+def _truth_index_subset(true_matches, rows_a, rows_b):
+    # vectorised selection of the true matches between the test records
+    true_rows_a, true_rows_b = unpack_pairs(true_matches.pair_keys)
+    subset_mask = np.isin(true_rows_a, rows_a) & np.isin(true_rows_b, rows_b)
+    return TruthIndex(true_matches.pair_keys[subset_mask])
@@ -11,6 +11,8 @@
 import math
 from typing import Tuple, List
 
+import numpy as np
+
 
 def exact_classify(sim_vec_dict: dict[(str, str):list]) -> Tuple[set, set]:
     """
@@ -59,6 +61,63 @@ def exact_classify(sim_vec_dict: dict[(str, str):list]) -> Tuple[set, set]:
     return class_match_set, class_nonmatch_set
 
 
+# -----------------------------------------------------------------------------
+
+def exact_classify_matrix(sim_matrix: np.ndarray) -> np.ndarray:
+    """
+    Vectorised version of the exact classification (see exact_classify) for a
+    numpy array with one similarity vector per row.
+
+    Returns
+    -------
+    is_match_array:
+        boolean array that is True for the rows with all similarities 1.0
+  """
+
+    return sim_matrix.sum(axis=1) == sim_matrix.shape[1]
+
+
+def classify_chunks(chunk_iter, classify_matrix_funct):
+    """
+    Classify the chunks of record pairs yielded by
+    comparison.compare_blocks_chunked one after the other, so that the
+    classification needs no similarity dictionary of all record pairs.
+
+    Parameters
+    ----------
+    chunk_iter:
+        iterable of (pair_list, sim_matrix) chunks
+    classify_matrix_funct:
+        function that returns for a similarity matrix a boolean array that is
+        True for the rows classified as matches, for example
+        exact_classify_matrix or supervised.predict_matches with a trained
+        model
+
+    Yields
+    -------
+    pair_list, sim_matrix, is_match_array:
+        the record pairs and similarities of a chunk and their classification
+  """
+
+    print('Classification of chunks of record pairs')
+
+    num_matches = 0
+    num_nonmatches = 0
+
+    for (pair_list, sim_matrix) in chunk_iter:
+        is_match_array = np.asarray(classify_matrix_funct(sim_matrix), dtype=bool)
+
+        num_chunk_matches = int(np.count_nonzero(is_match_array))
+        num_matches += num_chunk_matches
+        num_nonmatches += len(pair_list) - num_chunk_matches
+
+        yield pair_list, sim_matrix, is_match_array
+
+    print('  Classified %d record pairs as matches and %d as non-matches' % \
+          (num_matches, num_nonmatches))
+    print('')
+
+
 # -----------------------------------------------------------------------------
 # TODO Implement the threshold classification
 def threshold_classify(sim_vec_dict: dict[(str, str):list], sim_thres: float) -> Tuple[set, set]:
@@ -3,9 +3,14 @@
     of the compared pairs consisting of a list with similarity values.
 """
 
+import numpy as np
+
+from comparison.string_functions import apply_comparison_function
+from data.record_store import RecordStore
+
 
 def compare_blocks(blockA_dict, blockB_dict, recA_dict, recB_dict,
-                  attr_comp_list):
+                  attr_comp_list, chunk_size=100000):
     """
     Build a similarity dictionary with pairs of records from the two given
     block dictionaries. Candidate pairs are generated by pairing each record
@@ -13,7 +18,11 @@ def compare_blocks(blockA_dict, blockB_dict, recA_dict, recB_dict,
     from dataset B.
 
     For each candidate pair, a similarity vector is computed by comparing
-    attribute values using the specified similarity method.
+    attribute values using the specified similarity method. The candidate
+    pairs are collected over the blocks and compared in chunks of at most
+    chunk_size pairs with compare_record_pairs, so that comparison functions
+    with a batch version compare all pairs of a chunk at once, and only the
+    others are applied one value pair after the other.
 
 
     Example: sim_vec_dict = {
@@ -39,6 +48,8 @@ def compare_blocks(blockA_dict, blockB_dict, recA_dict, recB_dict,
                        where each tuple contains: (comparison function,
                        attribute number in record A, attribute number in
                        record B).
+      chunk_size     :
+         Maximum number of record pairs compared at once
     Returns
     -----------
      sim_dict : dictionary of record pairs
@@ -52,6 +63,8 @@ def compare_blocks(blockA_dict, blockB_dict, recA_dict, recB_dict,
     sim_vec_dict = {}  # A dictionary where keys are record pairs and values
     # lists of similarity values
 
+    pair_list = []  # Candidate record pairs not compared yet
+
     # Iterate through each block in block dictionary from dataset A
     #
     for (block_bkv, rec_idA_list) in blockA_dict.items():
@@ -64,23 +77,183 @@ def compare_blocks(blockA_dict, blockB_dict, recA_dict, recB_dict,
             #
             rec_idB_list = blockB_dict[block_bkv]
 
-            # Compare each record in rec_id_listA with each record from rec_id_listB
+            # Pair each record in rec_id_listA with each record from rec_id_listB
             #
             for rec_idA in rec_idA_list:
+                pair_list.extend([(rec_idA, rec_idB) for rec_idB in rec_idB_list])
+
+            # Generate the similarity vectors of the collected pairs and add
+            # them to the similarity vector dictionary
+            #
+            if len(pair_list) >= chunk_size:
+                add_compared_pairs(sim_vec_dict, pair_list, recA_dict, recB_dict,
+                                   attr_comp_list)
+                pair_list = []
+
+    add_compared_pairs(sim_vec_dict, pair_list, recA_dict, recB_dict,
+                       attr_comp_list)
+
+    print('  Compared %d record pairs' % (len(sim_vec_dict)))
+    print('')
+
+    return sim_vec_dict
+
+
+def add_compared_pairs(sim_vec_dict, pair_list, recA_dict, recB_dict,
+                       attr_comp_list):
+    """Compare the record pairs of pair_list with compare_record_pairs and add
+     their similarity vectors (as lists) to sim_vec_dict.
+  """
+
+    if len(pair_list) > 0:
+        sim_matrix = compare_record_pairs(pair_list, recA_dict, recB_dict,
+                                          attr_comp_list)
+        sim_vec_dict.update(zip(pair_list, sim_matrix.tolist()))
+
+
+# -----------------------------------------------------------------------------
+
+def compare_blocks_chunked(blockA_dict, blockB_dict, recA_dict, recB_dict,
+                           attr_comp_list, chunk_size=100000):
+    """
+    Compare the same record pairs as compare_blocks, but instead of building
+    one similarity dictionary, yield the results in chunks of at most
+    chunk_size record pairs while walking the blocks, so that the memory
+    needed depends on the chunk size and not on the number of record pairs.
 
-                recA = recA_dict[rec_idA]  # Get the actual record A
+    A record pair that occurs in several blocks (as with disjunctive
+    blocking) is only compared in the first block both records share, in the
+    order of blockA_dict. To find it, the blocks of every record that occurs
+    in more than one block are kept, which needs memory linear in the number
+    of records.
+
+    Parameters
+    ----------
+      blockA_dict    :
+          Dictionary of blocks from dataset A
+      blockB_dict    :
+          Dictionary of blocks from dataset B
+      recA_dict      :
+         Dictionary of records from dataset A
+      recB_dict      :
+         Dictionary of records from dataset B
+      attr_comp_list :
+         List of comparison methods (see compare_blocks)
+      chunk_size     :
+         Maximum number of record pairs per chunk
+    Yields
+    -----------
+     pair_list, sim_matrix :
+        list of (record identifier A, record identifier B) pairs and a float64
+        numpy array with one row of similarities per pair (see
+        compare_record_pairs), with the same values as compare_blocks
+    """
+    print('Compare %d blocks from dataset A with %d blocks from dataset B ' % \
+          (len(blockA_dict), len(blockB_dict)) + 'in chunks of %d record pairs' % \
+          (chunk_size))
+
+    # Positions (in the order of blockA_dict) of the blocks in both data sets
+    # of the records that occur in more than one of them
+    #
+    shared_bkv_list = [block_bkv for block_bkv in blockA_dict
+                       if block_bkv in blockB_dict]
+    multi_blockA_dict = get_multi_block_positions(
+        (blockA_dict[block_bkv] for block_bkv in shared_bkv_list))
+    multi_blockB_dict = get_multi_block_positions(
+        (blockB_dict[block_bkv] for block_bkv in shared_bkv_list))
+
+    pair_list = []
+    num_compared = 0
+
+    for (block_pos, block_bkv) in enumerate(shared_bkv_list):
+        rec_idB_list = blockB_dict[block_bkv]
+
+        for rec_idA in blockA_dict[block_bkv]:
+            block_posA_set = multi_blockA_dict.get(rec_idA)
+
+            for rec_idB in rec_idB_list:
+
+                # Skip pairs already compared in an earlier shared block
+                #
+                if block_posA_set is not None:
+                    block_posB_set = multi_blockB_dict.get(rec_idB)
+                    if block_posB_set is not None and \
+                            block_pos != min(block_posA_set & block_posB_set):
+                        continue
+
+                pair_list.append((rec_idA, rec_idB))
+
+                if len(pair_list) >= chunk_size:
+                    num_compared += len(pair_list)
+                    yield pair_list, compare_record_pairs(pair_list, recA_dict, recB_dict,
+                                                          attr_comp_list)
+                    pair_list = []
+
+    if len(pair_list) > 0:
+        num_compared += len(pair_list)
+        yield pair_list, compare_record_pairs(pair_list, recA_dict, recB_dict,
+                                              attr_comp_list)
+
+    print('  Compared %d record pairs' % (num_compared))
+    print('')
+
+
+def get_multi_block_positions(block_iter):
+    """Return a dictionary with the record identifiers that occur in more than
+     one of the given blocks as keys and the sets of the positions of their
+     blocks as values.
+  """
 
-                for rec_idB in rec_idB_list:
-                    recB = recB_dict[rec_idB]  # Get the actual record B
+    block_pos_dict = {}
+    for (block_pos, rec_id_list) in enumerate(block_iter):
+        for rec_id in rec_id_list:
+            block_pos_list = block_pos_dict.get(rec_id)
+            if block_pos_list is None:
+                block_pos_dict[rec_id] = [block_pos]
+            elif block_pos_list[-1] != block_pos:
+                block_pos_list.append(block_pos)
 
-                    # generate the similarity vector
-                    #
-                    sim_vec = compare_record(recA, recB, attr_comp_list)
+    return {rec_id: set(block_pos_list) for (rec_id, block_pos_list)
+            in block_pos_dict.items() if len(block_pos_list) > 1}
 
-                    # Add the similarity vector of the compared pair to the similarity
-                    # vector dictionary
-                    #
-                    sim_vec_dict[(rec_idA, rec_idB)] = sim_vec
+
+# -----------------------------------------------------------------------------
+
+def compare_pairs(rec_pair_iter, recA_dict, recB_dict, attr_comp_list):
+    """
+    Build a similarity dictionary (see compare_blocks) for candidate record
+    pairs that are given directly instead of as blocks, for example by the
+    sorted neighbourhood technique. Each pair is compared once, even if it
+    occurs several times.
+
+    Parameters
+    ----------
+      rec_pair_iter  :
+          Iterable of (record identifier A, record identifier B) tuples
+      recA_dict      :
+         Dictionary of records from dataset A
+      recB_dict      :
+         Dictionary of records from dataset B
+      attr_comp_list :
+         List of comparison methods (see compare_blocks)
+    Returns
+    -----------
+     sim_dict : dictionary of record pairs
+        dictionary of record pairs with a list of similarities as value
+    """
+    print('Compare candidate record pairs')
+
+    sim_vec_dict = {}
+
+    for rec_id_pair in rec_pair_iter:
+        if rec_id_pair in sim_vec_dict:  # Pair was already compared
+            continue
+
+        (rec_idA, rec_idB) = rec_id_pair
+
+        sim_vec_dict[rec_id_pair] = compare_record(recA_dict[rec_idA],
+                                                   recB_dict[rec_idB],
+                                                   attr_comp_list)
 
     print('  Compared %d record pairs' % (len(sim_vec_dict)))
     print('')
@@ -130,6 +303,72 @@ def compare_record(recA, recB, attr_comp_list):
     return sim_vec
 
 
+def compare_record_pairs(pair_list, recA_dict, recB_dict, attr_comp_list):
+    """This method generates the similarity vectors of many record pairs at
+     once. For each comparison function the values of all pairs are
+     collected into two aligned arrays, which are compared with the batch
+     version of the function (see string_functions.BATCH_COMPARATORS), or,
+     if the function has no batch version, one value pair after the other.
+
+     Parameters
+     --------------
+       pair_list :
+            list of (record identifier A, record identifier B) pairs
+       recA_dict :
+            Dictionary of records from dataset A
+       recB_dict :
+            Dictionary of records from dataset B
+       attr_comp_list :
+                        list of comparison methods (see compare_record)
+      :returns float64 numpy array with the similarity vector of each pair
+               as row (the same values as compare_record)
+
+  """
+
+    valA_dict = get_value_columns(recA_dict, [rec_idA for (rec_idA, rec_idB) in pair_list],
+                                  [attr_numA for (comp_funct, attr_numA, attr_numB) in attr_comp_list])
+    valB_dict = get_value_columns(recB_dict, [rec_idB for (rec_idA, rec_idB) in pair_list],
+                                  [attr_numB for (comp_funct, attr_numA, attr_numB) in attr_comp_list])
+
+    sim_matrix = np.zeros((len(pair_list), len(attr_comp_list)), dtype=np.float64)
+
+    for (attr_pos, (comp_funct, attr_numA, attr_numB)) in enumerate(attr_comp_list):
+        sim_matrix[:, attr_pos] = apply_comparison_function(comp_funct, valA_dict[attr_numA],
+                                                            valB_dict[attr_numB])
+
+    return sim_matrix
+
+
+def get_value_columns(rec_dict, rec_id_list, attr_num_list):
+    """Return a dictionary with the given attribute numbers as keys and object
+     arrays of the values of the given records as values (the empty string
+     for records without a value for the attribute). The values of a
+     RecordStore are looked up with the codes of the rows of the records, so
+     the cost depends on the number of records, not the size of the store.
+  """
+
+    if isinstance(rec_dict, RecordStore):
+        row_array = rec_dict.rows_of(rec_id_list)
+        return {attr_num: rec_dict.column_rows(attr_num, row_array)
+                for attr_num in set(attr_num_list)}
+
+    # The values of each distinct record are only collected once, and then
+    # repeated for the pairs of the record
+    #
+    code_of = {}
+    code_array = np.fromiter((code_of.setdefault(rec_id, len(code_of)) for rec_id in rec_id_list),
+                             dtype=np.int64, count=len(rec_id_list))
+    rec_list = [rec_dict[rec_id] for rec_id in code_of]
+
+    val_dict = {}
+    for attr_num in set(attr_num_list):
+        val_array = np.empty(len(rec_list), dtype=object)
+        val_array[:] = [rec[attr_num] if attr_num < len(rec) else '' for rec in rec_list]
+        val_dict[attr_num] = val_array[code_array]
+
+    return val_dict
+
+
 # -----------------------------------------------------------------------------
 
 
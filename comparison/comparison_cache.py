@@ -0,0 +1,123 @@
+""" Module with a cache for the similarities of attribute value pairs.
+
+    Names, suburbs and states repeat heavily across the candidate record
+    pairs, so that the same two values are compared again and again. A
+    CachedComparison wraps a comparison function (see string_functions) with
+    a bounded LRU cache of the similarities of the value pairs it has seen,
+    and counts the cache hits and misses.
+
+    Each entry of an attribute comparison list gets its own cache, keyed by
+    the comparison function and the attributes it compares, so that the
+    values of different attributes do not displace each other.
+
+    Example:
+      cached_comp_list = cache_attr_comp_list(attr_comp_list)
+      sim_vec_dict = comparison.compare_blocks(blockA_dict, blockB_dict,
+                                               recA_dict, recB_dict,
+                                               cached_comp_list)
+      print_cache_statistics(cached_comp_list)
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import functools
+
+COMP_CACHE_SIZE = 2 ** 18  # Maximum number of cached value pairs per attribute
+
+
+# =============================================================================
+
+class CachedComparison:
+    """Comparison function with an LRU cache of the similarities of value
+     pairs. An instance is called like the wrapped function.
+
+     A pickled instance (for example when passed to the worker processes of
+     parallel_comparison) only stores the wrapped function and the cache
+     size, and starts with an empty cache.
+
+     Parameters
+     ----------
+       comp_funct :
+          Comparison function with two attribute values as arguments
+       maxsize    :
+          Maximum number of cached value pairs (None for no limit)
+  """
+
+    def __init__(self, comp_funct, maxsize=COMP_CACHE_SIZE):
+        self.comp_funct = comp_funct
+        self.maxsize = maxsize
+        self.__name__ = comp_funct.__name__
+
+        self._cached_funct = functools.lru_cache(maxsize=maxsize)(comp_funct)
+
+    def __call__(self, val1, val2):
+        return self._cached_funct(val1, val2)
+
+    def __reduce__(self):
+        return (CachedComparison, (self.comp_funct, self.maxsize))
+
+    def cache_info(self):
+        """Return the (hits, misses, maxsize, currsize) tuple of the cache."""
+        return self._cached_funct.cache_info()
+
+    def cache_clear(self):
+        """Remove all value pairs from the cache and reset the statistics."""
+        self._cached_funct.cache_clear()
+
+
+# -----------------------------------------------------------------------------
+
+def cache_attr_comp_list(attr_comp_list, maxsize=COMP_CACHE_SIZE):
+    """Return a copy of the attribute comparison list (see
+     comparison.compare_blocks) where every comparison function is wrapped in
+     its own CachedComparison. Functions that are already cached are kept.
+  """
+
+    cached_comp_list = []
+    for (comp_funct, attr_numA, attr_numB) in attr_comp_list:
+        if not isinstance(comp_funct, CachedComparison):
+            comp_funct = CachedComparison(comp_funct, maxsize)
+        cached_comp_list.append((comp_funct, attr_numA, attr_numB))
+
+    return cached_comp_list
+
+
+def get_cache_statistics(attr_comp_list):
+    """Return a list with one (function name, attribute in A, attribute in B,
+     hits, misses, number of cached value pairs) tuple per cached comparison
+     function of the attribute comparison list.
+  """
+
+    stat_list = []
+    for (comp_funct, attr_numA, attr_numB) in attr_comp_list:
+        if isinstance(comp_funct, CachedComparison):
+            cache_info = comp_funct.cache_info()
+            stat_list.append((comp_funct.__name__, attr_numA, attr_numB,
+                              cache_info.hits, cache_info.misses,
+                              cache_info.currsize))
+
+    return stat_list
+
+
+def print_cache_statistics(attr_comp_list):
+    """Print the hits and misses of the cached comparison functions of the
+     attribute comparison list.
+  """
+
+    print('Comparison cache statistics:')
+    print('  %-24s %6s %10s %10s %8s %10s' % \
+          ('Comparison', 'Attrs', 'Hits', 'Misses', 'Hit rate', 'Cached'))
+
+    for (funct_name, attr_numA, attr_numB, num_hits, num_misses, num_cached) in \
+            get_cache_statistics(attr_comp_list):
+        num_calls = num_hits + num_misses
+        hit_rate = float(num_hits) / num_calls if num_calls > 0 else 0.0
+        print('  %-24s %6s %10d %10d %8.3f %10d' % \
+              (funct_name, '%d/%d' % (attr_numA, attr_numB), num_hits,
+               num_misses, hit_rate, num_cached))
+    print('')
+
+# -----------------------------------------------------------------------------
+
+# End of program.
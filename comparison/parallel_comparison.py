@@ -0,0 +1,266 @@
+""" Module to compare the record pairs of two block dictionaries with several
+    processes.
+
+    The blocks are split into shards of about the same number of record
+    pairs: small blocks are grouped into one shard, and a block with more
+    record pairs than a shard is split into slices of its records of data
+    set A (and, if a single record of A has more record pairs than a shard,
+    also of its records of data set B), so that a single large block cannot
+    keep one process busy while the others are idle. The shards are compared in a ProcessPoolExecutor.
+
+    The records, blocks and comparison functions are passed to the worker
+    processes once, when they are started. Where processes are started by
+    forking (the default on Linux) they share these data with the calling
+    process copy-on-write, without pickling; otherwise they are pickled once
+    per process. A shard is only a list of (block position, startA, stopA,
+    startB, stopB) tuples, and a worker returns the compared record pairs and a numpy array
+    of their similarities.
+
+    Example:
+      sim_vec_dict = compare_blocks_parallel(blockA_dict, blockB_dict,
+                                             recA_dict, recB_dict,
+                                             attr_comp_list, num_workers=8)
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from comparison.comparison import compare_record, get_multi_block_positions
+
+_worker_state = {}  # Data of a worker process, set by _init_worker
+
+
+# =============================================================================
+
+def plan_comparison_shards(block_list, num_shards):
+    """Split the blocks into shards of about the same number of record pairs.
+
+     Parameters
+     ----------
+       block_list :
+          List of (record identifiers of A, record identifiers of B) tuples of
+          the blocks that occur in both data sets
+       num_shards :
+          Number of shards to aim for
+
+     Returns
+     -------
+     shard_list:
+         list of shards, where a shard is a list of (block position, startA,
+         stopA, startB, stopB) tuples that select the record pairs of the
+         records startA to stopA - 1 of data set A and startB to stopB - 1 of
+         data set B of a block
+  """
+
+    num_pairs = sum(len(rec_idA_list) * len(rec_idB_list)
+                    for (rec_idA_list, rec_idB_list) in block_list)
+    max_shard_pairs = max(1, math.ceil(num_pairs / max(1, num_shards)))
+
+    shard_list = []
+    shard = []
+    shard_pairs = 0
+
+    for (block_pos, (rec_idA_list, rec_idB_list)) in enumerate(block_list):
+        sizeA = len(rec_idA_list)
+        sizeB = len(rec_idB_list)
+        if sizeA == 0 or sizeB == 0:
+            continue
+
+        # Split a block with more record pairs than a shard into slices of
+        # its A records, each of which becomes a shard of its own. If one A
+        # record has more record pairs than a shard, its B records are split
+        # as well. The slices are in the order of the record pairs of the
+        # block (A records first, then B records)
+        #
+        if sizeA * sizeB > max_shard_pairs:
+            if len(shard) > 0:
+                shard_list.append(shard)
+                shard = []
+                shard_pairs = 0
+            sliceA_size = max(1, max_shard_pairs // sizeB)
+            sliceB_size = min(sizeB, max_shard_pairs)
+            for startA in range(0, sizeA, sliceA_size):
+                stopA = min(startA + sliceA_size, sizeA)
+                for startB in range(0, sizeB, sliceB_size):
+                    shard_list.append([(block_pos, startA, stopA, startB,
+                                        min(startB + sliceB_size, sizeB))])
+            continue
+
+        shard.append((block_pos, 0, sizeA, 0, sizeB))
+        shard_pairs += sizeA * sizeB
+        if shard_pairs >= max_shard_pairs:
+            shard_list.append(shard)
+            shard = []
+            shard_pairs = 0
+
+    if len(shard) > 0:
+        shard_list.append(shard)
+
+    return shard_list
+
+
+# -----------------------------------------------------------------------------
+
+def _init_worker(block_list, recA_dict, recB_dict, attr_comp_list,
+                 multi_blockA_dict, multi_blockB_dict):
+    """Store the data needed to compare shards in the worker process."""
+
+    _worker_state['block_list'] = block_list
+    _worker_state['recA_dict'] = recA_dict
+    _worker_state['recB_dict'] = recB_dict
+    _worker_state['attr_comp_list'] = attr_comp_list
+    _worker_state['multi_blockA_dict'] = multi_blockA_dict
+    _worker_state['multi_blockB_dict'] = multi_blockB_dict
+
+
+def _compare_shard(shard):
+    """Compare the record pairs of a shard (see plan_comparison_shards).
+
+     A record pair that occurs in several blocks is only compared in the
+     first block both records share (as in compare_blocks_chunked).
+
+     Returns the list of compared record pairs and the list of their
+     similarity vectors.
+  """
+
+    block_list = _worker_state['block_list']
+    recA_dict = _worker_state['recA_dict']
+    recB_dict = _worker_state['recB_dict']
+    attr_comp_list = _worker_state['attr_comp_list']
+    multi_blockA_dict = _worker_state['multi_blockA_dict']
+    multi_blockB_dict = _worker_state['multi_blockB_dict']
+
+    pair_list = []
+    sim_vec_list = []
+
+    for (block_pos, startA, stopA, startB, stopB) in shard:
+        rec_idA_list, rec_idB_list = block_list[block_pos]
+        rec_idB_list = rec_idB_list[startB:stopB]
+
+        for rec_idA in rec_idA_list[startA:stopA]:
+            recA = recA_dict[rec_idA]
+            block_posA_set = multi_blockA_dict.get(rec_idA)
+
+            for rec_idB in rec_idB_list:
+                if block_posA_set is not None:
+                    block_posB_set = multi_blockB_dict.get(rec_idB)
+                    if block_posB_set is not None and \
+                            block_pos != min(block_posA_set & block_posB_set):
+                        continue
+
+                pair_list.append((rec_idA, rec_idB))
+                sim_vec_list.append(compare_record(recA, recB_dict[rec_idB],
+                                                   attr_comp_list))
+
+    return pair_list, sim_vec_list
+
+
+def _compare_shard_array(shard):
+    """Compare the record pairs of a shard in a worker process, and return
+     the similarity vectors as numpy array, which is sent back to the
+     calling process much faster than a list of lists.
+  """
+
+    pair_list, sim_vec_list = _compare_shard(shard)
+
+    return pair_list, np.array(sim_vec_list, dtype=np.float64).reshape(
+        len(pair_list), len(_worker_state['attr_comp_list']))
+
+
+# -----------------------------------------------------------------------------
+
+def compare_blocks_parallel(blockA_dict, blockB_dict, recA_dict, recB_dict,
+                            attr_comp_list, num_workers=None, shards_per_worker=8):
+    """Build the same similarity dictionary as compare_blocks (with the
+     record pairs in the same order), comparing the record pairs with
+     several processes.
+
+     Parameters
+     ----------
+       blockA_dict       :
+          Dictionary of blocks from dataset A
+       blockB_dict       :
+          Dictionary of blocks from dataset B
+       recA_dict         :
+          Dictionary of records from dataset A
+       recB_dict         :
+          Dictionary of records from dataset B
+       attr_comp_list    :
+          List of comparison methods (see compare_blocks); the functions
+          must be importable by the worker processes
+       num_workers       :
+          Number of processes (default: number of CPU cores)
+       shards_per_worker :
+          Number of shards per process; more shards balance the work better
+          when the comparison of some record pairs takes longer
+
+     Returns
+     -------
+     sim_vec_dict:
+         dictionary of record pairs with a list of similarities as value
+  """
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    assert num_workers > 0, num_workers
+
+    print('Compare %d blocks from dataset A with %d blocks from dataset B ' % \
+          (len(blockA_dict), len(blockB_dict)) + 'in parallel')
+    print('  Number of processes: %d' % (num_workers))
+
+    block_list = [(list(blockA_dict[block_bkv]), list(blockB_dict[block_bkv]))
+                  for block_bkv in blockA_dict if block_bkv in blockB_dict]
+
+    multi_blockA_dict = get_multi_block_positions(
+        (rec_idA_list for (rec_idA_list, rec_idB_list) in block_list))
+    multi_blockB_dict = get_multi_block_positions(
+        (rec_idB_list for (rec_idA_list, rec_idB_list) in block_list))
+
+    shard_list = plan_comparison_shards(block_list, num_workers * shards_per_worker)
+    print('  Number of shards: %d' % (len(shard_list)))
+
+    init_args = (block_list, recA_dict, recB_dict, attr_comp_list,
+                 multi_blockA_dict, multi_blockB_dict)
+
+    sim_vec_dict = {}
+
+    if num_workers == 1:
+        _init_worker(*init_args)
+        try:
+            for shard in shard_list:
+                pair_list, sim_vec_list = _compare_shard(shard)
+                sim_vec_dict.update(zip(pair_list, sim_vec_list))
+        finally:
+            _worker_state.clear()
+
+    else:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        else:
+            mp_context = None
+
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context,
+                                 initializer=_init_worker,
+                                 initargs=init_args) as executor:
+
+            # The results are merged in shard order, which is the order of
+            # the record pairs in compare_blocks
+            #
+            for (pair_list, sim_matrix) in executor.map(_compare_shard_array, shard_list):
+                sim_vec_dict.update(zip(pair_list, sim_matrix.tolist()))
+
+    print('  Compared %d record pairs' % (len(sim_vec_dict)))
+    print('')
+
+    return sim_vec_dict
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,285 @@
+""" Module with a compact representation of the compared record pairs and
+    their similarity vectors.
+
+    A SimilarityMatrix holds the similarities of all record pairs in one
+    float32 array of shape (number of pairs, number of attributes), and the
+    record pairs in two aligned int32 arrays with the rows of the records of
+    data set A and B (see interning.py). Compared to a similarity vector
+    dictionary of tuples and lists this needs about a tenth of the memory,
+    and the classifiers can use the array directly instead of copying the
+    similarity vectors row by row.
+
+    Example:
+      sim_matrix = SimilarityMatrix.from_sim_vec_dict(sim_vec_dict)
+
+      decision_tree = supervised.train_supervised(sim_matrix, true_match_set)
+      for (train_matrix, test_matrix, gt_subset, all_comparisons) in \
+              util.kfold_split(sim_matrix, true_match_set, 5):
+          ...
+
+    A SimilarityMatrix is also a read-only mapping from record pairs to
+    lists of similarities, so it can be passed to code written for a
+    similarity vector dictionary.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from data.interning import RecordIdMap, pack_pairs
+from data.truth_index import TruthIndex, label_pairs
+
+SIM_DTYPE = np.float32  # Data type of the similarities
+
+
+# =============================================================================
+
+class SimilarityMatrix(Mapping):
+    """Similarity vectors of record pairs as arrays.
+
+     The record pairs are the tuples (rowA, rowB) of the two row arrays, or,
+     if the RecordIdMap objects of the two data sets are given, the tuples of
+     the record identifiers of these rows.
+
+     Slices (see slice and folds) are views that share the arrays of the
+     matrix they are taken from, while selections with a mask or positions
+     (see select) copy the selected rows, as with numpy arrays.
+
+     Parameters
+     ----------
+       sim_array  :
+          Array of shape (number of pairs, number of attributes) with the
+          similarities
+       rowA_array :
+          Array with the row in data set A of the record of each pair
+       rowB_array :
+          Array with the row in data set B of the record of each pair
+       id_mapA    :
+          RecordIdMap of data set A (None if the pairs are rows)
+       id_mapB    :
+          RecordIdMap of data set B (None if the pairs are rows)
+  """
+
+    def __init__(self, sim_array, rowA_array, rowB_array, id_mapA=None,
+                 id_mapB=None):
+        self.sim_array = np.asarray(sim_array, dtype=SIM_DTYPE)
+        self.rowA_array = np.asarray(rowA_array, dtype=np.int32)
+        self.rowB_array = np.asarray(rowB_array, dtype=np.int32)
+        self.id_mapA = id_mapA
+        self.id_mapB = id_mapB
+
+        assert self.sim_array.ndim == 2, self.sim_array.shape
+        assert len(self.rowA_array) == len(self.sim_array) == len(self.rowB_array)
+        assert (id_mapA is None) == (id_mapB is None)
+
+        self._sorted_keys = None  # Created on the first lookup of a pair
+        self._sorted_pos = None
+
+    @classmethod
+    def from_sim_vec_dict(cls, sim_vec_dict, id_mapA=None, id_mapB=None):
+        """Create the matrix from a similarity vector dictionary, keeping the
+         order of its record pairs.
+
+         If no RecordIdMap objects are given and the pairs are integer rows
+         (see interning.intern_sim_vec_dict) they are used as they are,
+         otherwise the record identifiers are mapped to rows in the order of
+         their first occurrence.
+      """
+
+        pair_list = list(sim_vec_dict)
+        num_pairs = len(pair_list)
+        num_attrs = len(sim_vec_dict[pair_list[0]]) if num_pairs > 0 else 0
+
+        sim_array = np.array(list(sim_vec_dict.values()), dtype=SIM_DTYPE)
+        sim_array = sim_array.reshape(num_pairs, num_attrs)
+
+        if id_mapA is None and num_pairs > 0 and \
+                not isinstance(pair_list[0][0], (int, np.integer)):
+            id_mapA = RecordIdMap(dict.fromkeys(pair[0] for pair in pair_list))
+            id_mapB = RecordIdMap(dict.fromkeys(pair[1] for pair in pair_list))
+
+        if id_mapA is None:
+            rowA_array = np.fromiter((pair[0] for pair in pair_list),
+                                     dtype=np.int32, count=num_pairs)
+            rowB_array = np.fromiter((pair[1] for pair in pair_list),
+                                     dtype=np.int32, count=num_pairs)
+        else:
+            rowA_array = id_mapA.rows([pair[0] for pair in pair_list])
+            rowB_array = id_mapB.rows([pair[1] for pair in pair_list])
+
+        return cls(sim_array, rowA_array, rowB_array, id_mapA, id_mapB)
+
+    @classmethod
+    def from_chunks(cls, chunk_iter, id_mapA, id_mapB):
+        """Create the matrix from the (pair_list, sim_matrix) chunks of
+         comparison.compare_blocks_chunked, whose record identifiers are
+         mapped to rows with the given RecordIdMap objects.
+      """
+
+        sim_array_list = []
+        rowA_array_list = []
+        rowB_array_list = []
+
+        for (pair_list, sim_matrix) in chunk_iter:
+            sim_array_list.append(np.asarray(sim_matrix, dtype=SIM_DTYPE))
+            rowA_array_list.append(id_mapA.rows([pair[0] for pair in pair_list]))
+            rowB_array_list.append(id_mapB.rows([pair[1] for pair in pair_list]))
+
+        if len(sim_array_list) == 0:
+            return cls(np.zeros((0, 0), dtype=SIM_DTYPE), [], [], id_mapA, id_mapB)
+
+        return cls(np.concatenate(sim_array_list), np.concatenate(rowA_array_list),
+                   np.concatenate(rowB_array_list), id_mapA, id_mapB)
+
+    # -------------------------------------------------------------------------
+
+    @property
+    def num_attrs(self):
+        return self.sim_array.shape[1]
+
+    def pair_keys(self):
+        """Return the int64 array of the packed (rowA, rowB) keys of the
+         record pairs.
+      """
+        return pack_pairs(self.rowA_array, self.rowB_array)
+
+    def pair_list(self):
+        """Return the list of the record pairs, in the order of the rows of
+         sim_array.
+      """
+        if self.id_mapA is None:
+            return list(zip(self.rowA_array.tolist(), self.rowB_array.tolist()))
+
+        return list(zip(self.id_mapA.rec_ids(self.rowA_array),
+                        self.id_mapB.rec_ids(self.rowB_array)))
+
+    def labels(self, true_match_set, symmetric=False):
+        """Return a boolean array that is True for each record pair that is
+         in true_match_set (see truth_index.label_pairs). A TruthIndex is
+         looked up with the row arrays directly.
+      """
+        if isinstance(true_match_set, TruthIndex):
+            return true_match_set.contains_rows(self.rowA_array, self.rowB_array)
+
+        return label_pairs(self.pair_list(), true_match_set, symmetric)
+
+    def positions(self, pair_list):
+        """Return an int64 array with the position of each of the given record
+         pairs in the matrix, or -1 for pairs that are not in the matrix.
+      """
+
+        if self._sorted_keys is None:
+            pair_keys = self.pair_keys()
+            self._sorted_pos = np.argsort(pair_keys, kind='stable')
+            self._sorted_keys = pair_keys[self._sorted_pos]
+
+        num_pairs = len(pair_list)
+        if self.id_mapA is None:
+            rowA_array = np.fromiter((pair[0] for pair in pair_list),
+                                     dtype=np.int64, count=num_pairs)
+            rowB_array = np.fromiter((pair[1] for pair in pair_list),
+                                     dtype=np.int64, count=num_pairs)
+        else:
+            row_ofA = self.id_mapA.row_of
+            row_ofB = self.id_mapB.row_of
+            rowA_array = np.fromiter((row_ofA.get(pair[0], -1) for pair in pair_list),
+                                     dtype=np.int64, count=num_pairs)
+            rowB_array = np.fromiter((row_ofB.get(pair[1], -1) for pair in pair_list),
+                                     dtype=np.int64, count=num_pairs)
+
+        pos_array = np.full(num_pairs, -1, dtype=np.int64)
+        if len(self._sorted_keys) == 0:
+            return pos_array
+
+        known_mask = (rowA_array >= 0) & (rowB_array >= 0)
+        pair_keys = pack_pairs(rowA_array[known_mask], rowB_array[known_mask])
+
+        sorted_pos_array = np.searchsorted(self._sorted_keys, pair_keys)
+        sorted_pos_array[sorted_pos_array == len(self._sorted_keys)] = 0
+        found_mask = self._sorted_keys[sorted_pos_array] == pair_keys
+
+        pos_array[np.flatnonzero(known_mask)[found_mask]] = \
+            self._sorted_pos[sorted_pos_array[found_mask]]
+
+        return pos_array
+
+    # -------------------------------------------------------------------------
+
+    def slice(self, start, stop):
+        """Return the record pairs at the positions start to stop - 1 as a
+         SimilarityMatrix that shares the arrays of this matrix.
+      """
+        return SimilarityMatrix(self.sim_array[start:stop], self.rowA_array[start:stop],
+                                self.rowB_array[start:stop], self.id_mapA, self.id_mapB)
+
+    def select(self, index):
+        """Return the record pairs selected by a boolean mask or an array of
+         positions as a new SimilarityMatrix.
+      """
+        return SimilarityMatrix(self.sim_array[index], self.rowA_array[index],
+                                self.rowB_array[index], self.id_mapA, self.id_mapB)
+
+    def folds(self, fold_array, k):
+        """Split the matrix into k folds, where fold_array gives the fold of
+         each record pair. The record pairs are reordered by fold once
+         (keeping their order within a fold), and each fold is a slice of
+         the reordered matrix.
+
+         Returns the reordered matrix and the list of the k folds.
+      """
+
+        fold_array = np.asarray(fold_array, dtype=np.int64)
+        order = np.argsort(fold_array, kind='stable')
+        fold_matrix = self.select(order)
+
+        fold_starts = np.searchsorted(fold_array[order], np.arange(k + 1))
+
+        return fold_matrix, [fold_matrix.slice(fold_starts[i], fold_starts[i + 1])
+                             for i in range(k)]
+
+    # -------------------------------------------------------------------------
+    # Read-only mapping of record pairs to lists of similarities
+
+    def __len__(self):
+        return len(self.sim_array)
+
+    def __iter__(self):
+        return iter(self.pair_list())
+
+    def __contains__(self, pair):
+        return self.positions([pair])[0] >= 0
+
+    def __getitem__(self, pair):
+        pos = self.positions([pair])[0]
+        if pos < 0:
+            raise KeyError(pair)
+
+        return self.sim_array[pos].tolist()
+
+    def items(self):
+        return zip(self.pair_list(), self.sim_array.tolist())
+
+    def values(self):
+        return self.sim_array.tolist()
+
+    def to_sim_vec_dict(self):
+        """Return the record pairs as similarity vector dictionary."""
+        return dict(self.items())
+
+
+# -----------------------------------------------------------------------------
+
+def as_similarity_matrix(sim_vec_dict):
+    """Return sim_vec_dict if it is a SimilarityMatrix, otherwise convert the
+     similarity vector dictionary into one.
+  """
+    if isinstance(sim_vec_dict, SimilarityMatrix):
+        return sim_vec_dict
+    return SimilarityMatrix.from_sim_vec_dict(sim_vec_dict)
+
+# -----------------------------------------------------------------------------
+
+# End of program.
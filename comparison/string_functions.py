@@ -1,5 +1,12 @@
 """ Module consists of similarity functions for comparing two strings or precomputed token sets.
+
+Some comparison functions also have a batch version that compares two aligned arrays of values of many record
+pairs at once and returns a float64 array of similarities (see BATCH_COMPARATORS).
 """
+import datetime
+import functools
+
+import numpy as np
 
 Q = 2  # Value length of q-grams for Jaccard and Dice comparison function
 is_efficient = False
@@ -255,3 +262,149 @@ def edit_dist_sim_comp(s1, s2):
 
     assert 0.0 <= edit_sim <= 1.0
     return edit_sim
+
+
+# =============================================================================
+# Comparison functions for numbers and dates
+
+AGE_MAX_DIFF = 10.0  # Age difference (in years) with similarity 0
+POSTCODE_MAX_DIFF = 100.0  # Postcode difference with similarity 0
+DATE_MAX_DAYS = 365.0  # Difference of dates (in days) with similarity 0
+
+PARSE_CACHE_SIZE = 2 ** 16  # Maximum number of memoised parsed values
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_number(val):
+    """Return the value as float, or None if it is not a number."""
+    try:
+        return float(val)
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_date(val):
+    """Return the day number (see datetime.date.toordinal) of a date given as
+     day/month/year, or None if the value is not a valid date.
+  """
+    try:
+        (day, month, year) = val.split('/')
+        return datetime.date(int(year), int(month), int(day)).toordinal()
+    except ValueError:
+        return None
+
+
+def numeric_diff_sim(num1, num2, max_diff):
+    """Return the similarity 1 - |num1 - num2| / max_diff (at least 0.0) of two
+     numbers, or 0.0 if one of them is None.
+  """
+    if (num1 is None) or (num2 is None):
+        return 0.0
+
+    return max(0.0, 1.0 - abs(num1 - num2) / max_diff)
+
+
+def age_comp(val1, val2):
+    """Compare two ages by their difference, where ages that differ by
+     AGE_MAX_DIFF years or more have similarity 0.
+
+     Returns a value between 0.0 and 1.0.
+  """
+    return numeric_diff_sim(parse_number(val1), parse_number(val2), AGE_MAX_DIFF)
+
+
+def postcode_comp(val1, val2):
+    """Compare two postcodes by their numeric difference, as postcodes with
+     close numbers refer to close areas. Postcodes that differ by
+     POSTCODE_MAX_DIFF or more have similarity 0.
+
+     Returns a value between 0.0 and 1.0.
+  """
+    return numeric_diff_sim(parse_number(val1), parse_number(val2), POSTCODE_MAX_DIFF)
+
+
+def date_comp(val1, val2):
+    """Compare two dates (day/month/year, for example birth dates) by the
+     number of days between them, where dates DATE_MAX_DAYS or more days apart
+     have similarity 0.
+
+     Returns a value between 0.0 and 1.0.
+  """
+    return numeric_diff_sim(parse_date(val1), parse_date(val2), DATE_MAX_DAYS)
+
+
+# =============================================================================
+# Batch versions of the comparison functions. Each compares the values valA_array[i] and valB_array[i] of the
+# record pairs i = 0, 1, ... and returns a float64 array of similarities, with the same values as the
+# comparison function.
+
+def encode_values(encode_funct, val_array):
+    """Apply the function encode_funct(value) once to each distinct value of the array and return the float64
+     array of the encoded values, with NaN where encode_funct returns None.
+  """
+    code_of = {}
+    codes = np.fromiter((code_of.setdefault(val, len(code_of)) for val in val_array),
+                        dtype=np.int64, count=len(val_array))
+
+    encoded_array = np.array([encode_funct(val) for val in code_of], dtype=float)
+
+    return encoded_array[codes] if len(codes) > 0 else np.zeros(0)
+
+
+def numeric_diff_sim_batch(num1_array, num2_array, max_diff):
+    """Batch version of numeric_diff_sim for float arrays with NaN for missing numbers."""
+    sim_array = np.maximum(0.0, 1.0 - np.abs(num1_array - num2_array) / max_diff)
+
+    return np.nan_to_num(sim_array, nan=0.0)
+
+
+def exact_comp_batch(valA_array, valB_array):
+    """Batch version of exact_comp. The object arrays of values are compared element-wise by numpy, without a
+     Python function call per value pair.
+  """
+    valA_array = np.asarray(valA_array, dtype=object)
+    valB_array = np.asarray(valB_array, dtype=object)
+
+    return ((valA_array == valB_array) & (valA_array != '')).astype(np.float64)
+
+
+def age_comp_batch(valA_array, valB_array):
+    """Batch version of age_comp."""
+    return numeric_diff_sim_batch(encode_values(parse_number, valA_array),
+                                  encode_values(parse_number, valB_array), AGE_MAX_DIFF)
+
+
+def postcode_comp_batch(valA_array, valB_array):
+    """Batch version of postcode_comp."""
+    return numeric_diff_sim_batch(encode_values(parse_number, valA_array),
+                                  encode_values(parse_number, valB_array), POSTCODE_MAX_DIFF)
+
+
+def date_comp_batch(valA_array, valB_array):
+    """Batch version of date_comp."""
+    return numeric_diff_sim_batch(encode_values(parse_date, valA_array),
+                                  encode_values(parse_date, valB_array), DATE_MAX_DAYS)
+
+
+def apply_comparison_function(comp_funct, valA_array, valB_array):
+    """Compare the aligned arrays of values with the comparison function comp_funct and return a float64 array of
+     similarities. The batch version of comp_funct is used if there is one, otherwise comp_funct is applied to one
+     value pair after the other.
+  """
+    comp_batch = BATCH_COMPARATORS.get(comp_funct)
+    if comp_batch is not None:
+        return comp_batch(valA_array, valB_array)
+
+    return np.fromiter((comp_funct(valA, valB) for (valA, valB) in zip(valA_array, valB_array)),
+                       dtype=np.float64, count=len(valA_array))
+
+
+# Comparison functions and their batch versions
+#
+BATCH_COMPARATORS = {
+    exact_comp: exact_comp_batch,
+    age_comp: age_comp_batch,
+    postcode_comp: postcode_comp_batch,
+    date_comp: date_comp_batch,
+}
@@ -0,0 +1,242 @@
+""" Module with functionalities for caching parsed data sets on disk.
+
+    A data set loaded into a RecordStore is saved in a binary format (numpy
+    .npy files) in a cache directory. The cache entry is identified by the
+    data file (path, modification time and size, optionally a hash of its
+    content) and the loading parameters. Later runs reload the integer code
+    arrays through memory mapping instead of parsing the CSV file again.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Sequence
+
+import numpy as np
+
+from data.loadDataset import load_record_store
+from data.record_store import RecordStore
+
+CACHE_DIR = '.dataset_cache'  # Default directory for cached data sets
+CACHE_FORMAT_VERSION = 1  # Increase if the format of a cache entry changes
+
+
+# -----------------------------------------------------------------------------
+
+def save_string_array(file_name, str_list):
+    """Save a list of strings as two .npy files: the concatenated UTF-8
+     encoded strings (file_name + '.npy') and the start offsets of the
+     strings (file_name + '_offsets.npy').
+  """
+
+    encoded_list = [val.encode('utf-8') for val in str_list]
+
+    offsets = np.zeros(len(encoded_list) + 1, dtype=np.int64)
+    np.cumsum([len(val) for val in encoded_list], out=offsets[1:])
+
+    blob = np.frombuffer(b''.join(encoded_list), dtype=np.uint8)
+
+    np.save(file_name + '.npy', blob)
+    np.save(file_name + '_offsets.npy', offsets)
+
+
+def load_string_array(file_name):
+    """Load a list of strings saved with save_string_array."""
+
+    blob = np.load(file_name + '.npy', mmap_mode='r').tobytes()
+    offsets = np.load(file_name + '_offsets.npy').tolist()
+
+    return [blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in range(len(offsets) - 1)]
+
+
+class MappedStringArray(Sequence):
+    """Read-only sequence of the strings saved with save_string_array.
+
+     Both files are opened as memory maps and a string is only decoded when
+     it is accessed, so opening the array takes the same time whatever its
+     length, and only the accessed strings are read from disk.
+
+     Parameters
+     ----------
+       file_name :
+          File name given to save_string_array
+  """
+
+    def __init__(self, file_name):
+        self.blob = np.load(file_name + '.npy', mmap_mode='r')
+        self.offsets = np.load(file_name + '_offsets.npy', mmap_mode='r')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+# -----------------------------------------------------------------------------
+
+def get_cache_key(file_name, rec_id_col, use_attr_list, header_line,
+                  use_hash=False):
+    """Compute the key of the cache entry of a data file and the parameters
+     used to load it.
+
+     By default the modification time and size of the file identify its
+     content. If use_hash is True the SHA-1 hash of the file content is used
+     instead, which also detects changes that keep modification time and
+     size.
+  """
+
+    file_stat = os.stat(file_name)
+
+    key_dict = {'version': CACHE_FORMAT_VERSION,
+                'file_name': os.path.abspath(file_name),
+                'rec_id_col': rec_id_col,
+                'use_attr_list': sorted(use_attr_list),
+                'header_line': bool(header_line)}
+
+    if use_hash:
+        file_hash = hashlib.sha1()
+        with open(file_name, 'rb') as in_f:
+            for chunk in iter(lambda: in_f.read(1 << 20), b''):
+                file_hash.update(chunk)
+        key_dict['content_hash'] = file_hash.hexdigest()
+    else:
+        key_dict['mtime_ns'] = file_stat.st_mtime_ns
+        key_dict['size'] = file_stat.st_size
+
+    key_str = json.dumps(key_dict, sort_keys=True)
+
+    return hashlib.sha1(key_str.encode('utf-8')).hexdigest()
+
+
+# -----------------------------------------------------------------------------
+
+def save_record_store(rec_store, cache_entry_dir):
+    """Save a RecordStore in the given directory. The directory is first
+     written under a temporary name and then renamed, so that a cache entry
+     is either complete or not existing.
+  """
+
+    parent_dir = os.path.dirname(os.path.abspath(cache_entry_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix='.tmp-')
+
+    try:
+        save_string_array(os.path.join(tmp_dir, 'rec_ids'),
+                          rec_store.rec_id_list)
+
+        for attr in rec_store.attributes:
+            np.save(os.path.join(tmp_dir, 'attr_%d_codes.npy' % attr),
+                    rec_store.codes(attr))
+            save_string_array(os.path.join(tmp_dir, 'attr_%d_values' % attr),
+                              rec_store.distinct_values(attr))
+
+        meta_dict = {'version': CACHE_FORMAT_VERSION,
+                     'num_recs': len(rec_store),
+                     'num_attrs': rec_store.num_attrs,
+                     'attributes': rec_store.attributes}
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as out_f:
+            json.dump(meta_dict, out_f)
+
+        if os.path.isdir(cache_entry_dir):  # Replace an outdated entry
+            shutil.rmtree(cache_entry_dir)
+        os.replace(tmp_dir, cache_entry_dir)
+
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def open_record_store(cache_entry_dir):
+    """Load a RecordStore saved with save_record_store. The code arrays are
+     memory mapped (read-only), only the record identifiers and the distinct
+     attribute values are decoded into Python strings.
+  """
+
+    with open(os.path.join(cache_entry_dir, 'meta.json')) as in_f:
+        meta_dict = json.load(in_f)
+
+    assert meta_dict['version'] == CACHE_FORMAT_VERSION, meta_dict['version']
+
+    rec_id_list = load_string_array(os.path.join(cache_entry_dir, 'rec_ids'))
+    assert len(rec_id_list) == meta_dict['num_recs'], len(rec_id_list)
+
+    columns = {}
+    for attr in meta_dict['attributes']:
+        codes = np.load(os.path.join(cache_entry_dir, 'attr_%d_codes.npy' % attr),
+                        mmap_mode='r')
+        values = load_string_array(os.path.join(cache_entry_dir,
+                                                'attr_%d_values' % attr))
+        columns[attr] = (codes, values)
+
+    return RecordStore(rec_id_list, columns, meta_dict['num_attrs'])
+
+
+# -----------------------------------------------------------------------------
+
+def load_data_set_cached(file_name, rec_id_col, use_attr_list, header_line,
+                         cache_dir=CACHE_DIR, use_hash=False):
+    """Load the data set as RecordStore (see loadDataset.load_record_store)
+     using a binary on-disk cache.
+
+     If the cache directory contains an entry for the file and the loading
+     parameters, the store is reloaded from it through memory mapping.
+     Otherwise the CSV file is parsed and the resulting store is saved in the
+     cache for later runs.
+
+     Parameter Description:
+       file_name      : Name of the data file to be read (CSV or CSV.GZ file)
+       rec_id_col     : Record identifier column of the data file
+       use_attr_list  : List of attributes to extract from the file
+       header_line    : Availability of the header line (True of False)
+       cache_dir      : Directory where cache entries are stored
+       use_hash       : Identify the file content by its hash instead of the
+                        modification time and size of the file
+  """
+
+    cache_key = get_cache_key(file_name, rec_id_col, use_attr_list,
+                              header_line, use_hash)
+    cache_entry_dir = os.path.join(cache_dir, cache_key)
+
+    if os.path.isfile(os.path.join(cache_entry_dir, 'meta.json')):
+        print('Load data set from cache: ' + file_name)
+        print('  Cache entry: ' + cache_entry_dir)
+
+        rec_store = open_record_store(cache_entry_dir)
+
+        print('  Loaded %d records' % (len(rec_store)))
+        print('')
+
+        return rec_store
+
+    rec_store = load_record_store(file_name, rec_id_col, use_attr_list,
+                                  header_line)
+    save_record_store(rec_store, cache_entry_dir)
+
+    print('  Saved data set to cache entry: ' + cache_entry_dir)
+    print('')
+
+    return rec_store
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,224 @@
+""" Module with functionalities to replace record identifiers by dense
+    integer row numbers.
+
+    Record identifiers of a data set are mapped to the rows 0..n-1 (int32),
+    and a record pair (row in A, row in B) can be packed into a single int64
+    key. Blocks, similarity vector dictionaries and sets of true matches can
+    be converted into these integer forms once after loading, and converted
+    back to record identifiers only for the output.
+
+    Example:
+      id_map_a = RecordIdMap.from_rec_dict(recA_dict)
+      id_map_b = RecordIdMap.from_rec_dict(recB_dict)
+
+      blockA_rows = intern_block_dict(blockA_dict, id_map_a)
+      blockB_rows = intern_block_dict(blockB_dict, id_map_b)
+
+      sim_vec_dict = comparison.compare_blocks(blockA_rows, blockB_rows,
+                                               records_by_row(recA_dict, id_map_a),
+                                               records_by_row(recB_dict, id_map_b),
+                                               attr_comp_list)
+      true_match_set = intern_pair_set(true_match_set, id_map_a, id_map_b)
+
+    The resulting sim_vec_dict and true_match_set hold pairs of Python int
+    rows instead of record identifiers. They can be passed to the functions
+    that only compare or hash record pairs, such as the threshold and
+    supervised classifiers, util.kfold_split and the evaluation functions,
+    and the classified pairs are converted back with extern_pairs. The
+    interning is optional: recordLinkage.py and the other modules still work
+    on record identifiers.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from data.record_store import RecordStore
+
+PAIR_SHIFT = 32  # Bit position of the A-side row in a packed pair key
+ROW_MASK = (1 << PAIR_SHIFT) - 1
+
+
+# =============================================================================
+
+class RecordIdMap:
+    """Bidirectional mapping between the record identifiers of a data set and
+     dense integer row numbers.
+  """
+
+    def __init__(self, rec_id_list, row_of=None):
+        self.rec_id_list = list(rec_id_list)
+        if row_of is None:
+            row_of = {rec_id: row for (row, rec_id) in enumerate(self.rec_id_list)}
+        self.row_of = row_of
+
+        assert len(self.row_of) == len(self.rec_id_list), 'duplicate identifiers'
+
+    @classmethod
+    def from_rec_dict(cls, rec_dict):
+        """Create the mapping for a record dictionary or RecordStore. For a
+         RecordStore its own row numbers are used.
+      """
+        if isinstance(rec_dict, RecordStore):
+            return cls(rec_dict.rec_id_list, rec_dict.row_of)
+        return cls(rec_dict.keys())
+
+    def __len__(self):
+        return len(self.rec_id_list)
+
+    def row(self, rec_id):
+        return self.row_of[rec_id]
+
+    def rec_id(self, row):
+        return self.rec_id_list[row]
+
+    def rows(self, rec_id_list):
+        """Return an int32 array with the rows of the given identifiers."""
+        return np.fromiter((self.row_of[rec_id] for rec_id in rec_id_list),
+                           dtype=np.int32, count=len(rec_id_list))
+
+    def rec_ids(self, row_array):
+        """Return the list of identifiers of the given rows."""
+        rec_id_list = self.rec_id_list
+        return [rec_id_list[row] for row in np.asarray(row_array).tolist()]
+
+
+# -----------------------------------------------------------------------------
+
+def pack_pair(rowA, rowB):
+    """Pack a pair of rows into a single integer key."""
+    return (int(rowA) << PAIR_SHIFT) | int(rowB)
+
+
+def unpack_pair(pair_key):
+    """Return the tuple (rowA, rowB) of a packed pair key."""
+    pair_key = int(pair_key)
+    return (pair_key >> PAIR_SHIFT, pair_key & ROW_MASK)
+
+
+def pack_pairs(rowA_array, rowB_array):
+    """Pack aligned arrays of A and B rows into an int64 array of keys."""
+    rowA_array = np.asarray(rowA_array, dtype=np.int64)
+    rowB_array = np.asarray(rowB_array, dtype=np.int64)
+
+    return (rowA_array << PAIR_SHIFT) | rowB_array
+
+
+def unpack_pairs(pair_keys):
+    """Return two int32 arrays with the A and B rows of packed pair keys."""
+    pair_keys = np.asarray(pair_keys, dtype=np.int64)
+
+    rowA_array = (pair_keys >> PAIR_SHIFT).astype(np.int32)
+    rowB_array = (pair_keys & ROW_MASK).astype(np.int32)
+
+    return rowA_array, rowB_array
+
+
+def pack_pair_tuples(row_pairs):
+    """Pack an iterable of (rowA, rowB) tuples into an int64 array of keys."""
+    row_pair_list = list(row_pairs)
+    if len(row_pair_list) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    row_pair_array = np.array(row_pair_list, dtype=np.int64)
+
+    return pack_pairs(row_pair_array[:, 0], row_pair_array[:, 1])
+
+
+# -----------------------------------------------------------------------------
+
+def records_by_row(rec_dict, id_map):
+    """Return the records of a record dictionary or RecordStore as a sequence
+     indexed by the rows of the given RecordIdMap.
+  """
+    if isinstance(rec_dict, RecordStore) and rec_dict.row_of is id_map.row_of:
+        return rec_dict.row_records()
+    return [rec_dict[rec_id] for rec_id in id_map.rec_id_list]
+
+
+def intern_block_dict(block_dict, id_map):
+    """Convert a block dictionary {bkv: [rec_ids]} into a block dictionary
+     {bkv: [rows]}. The rows are Python ints (not numpy integers), so that
+     the record pairs built from the blocks are plain (int, int) tuples.
+  """
+    return {bkv: id_map.rows(rec_id_list).tolist()
+            for (bkv, rec_id_list) in block_dict.items()}
+
+
+def intern_pair_set(pair_set, id_mapA, id_mapB):
+    """Convert a set of record identifier pairs (for example the true
+     matches) into a set of (rowA, rowB) tuples. Pairs where one of the
+     identifiers is not in the data sets cannot be compared and are dropped.
+  """
+
+    row_ofA = id_mapA.row_of
+    row_ofB = id_mapB.row_of
+
+    row_pair_set = set()
+    for (rec_idA, rec_idB) in pair_set:
+        rowA = row_ofA.get(rec_idA)
+        rowB = row_ofB.get(rec_idB)
+        if rowA is not None and rowB is not None:
+            row_pair_set.add((rowA, rowB))
+
+    if len(row_pair_set) < len(pair_set):
+        print('  %d of %d record pairs refer to unknown records and were ' % \
+              (len(pair_set) - len(row_pair_set), len(pair_set)) + 'dropped')
+
+    return row_pair_set
+
+
+def pack_pair_set(pair_set, id_mapA, id_mapB):
+    """Convert a set of record identifier pairs into a sorted int64 array of
+     packed pair keys (see intern_pair_set for unknown identifiers).
+  """
+
+    pair_keys = pack_pair_tuples(intern_pair_set(pair_set, id_mapA, id_mapB))
+    pair_keys.sort()
+
+    return pair_keys
+
+
+def intern_sim_vec_dict(sim_vec_dict, id_mapA, id_mapB):
+    """Convert the record identifier pairs of a similarity vector dictionary
+     into (rowA, rowB) tuples.
+  """
+    row_ofA = id_mapA.row_of
+    row_ofB = id_mapB.row_of
+
+    return {(row_ofA[rec_idA], row_ofB[rec_idB]): sim_vec
+            for ((rec_idA, rec_idB), sim_vec) in sim_vec_dict.items()}
+
+
+# -----------------------------------------------------------------------------
+
+def extern_pairs(row_pairs, id_mapA, id_mapB):
+    """Convert record pairs given as (rowA, rowB) tuples or as packed int64
+     keys back into a set of record identifier pairs.
+  """
+
+    rec_id_listA = id_mapA.rec_id_list
+    rec_id_listB = id_mapB.rec_id_list
+
+    if isinstance(row_pairs, np.ndarray):
+        rowA_array, rowB_array = unpack_pairs(row_pairs)
+        return set(zip(id_mapA.rec_ids(rowA_array), id_mapB.rec_ids(rowB_array)))
+
+    return {(rec_id_listA[rowA], rec_id_listB[rowB])
+            for (rowA, rowB) in row_pairs}
+
+
+def extern_sim_vec_dict(sim_vec_dict, id_mapA, id_mapB):
+    """Convert a similarity vector dictionary with (rowA, rowB) keys back to
+     record identifier pairs.
+  """
+    rec_id_listA = id_mapA.rec_id_list
+    rec_id_listB = id_mapB.rec_id_list
+
+    return {(rec_id_listA[rowA], rec_id_listB[rowB]): sim_vec
+            for ((rowA, rowB), sim_vec) in sim_vec_dict.items()}
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -2,7 +2,9 @@
     dictionary with record identifiers as keys and a list of attribute values.
 
     Also provides a function to load a truth data set of record pairs that are
-    matches.
+    matches, a loader that parses large files with several processes, and
+    generator versions of both loaders that return the records
+    in batches while the file is read.
 """
 
 # =============================================================================
@@ -10,6 +12,13 @@
 
 import csv
 import gzip
+import io
+import locale
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from data.record_store import RecordStoreBuilder
 
 
 # -----------------------------------------------------------------------------
@@ -45,6 +54,8 @@ def load_data_set(file_name, rec_id_col, use_attr_list, header_line):
     for attr_num in use_attr_list:
         print('    ' + header_list[attr_num])
 
+    use_attr_set = set(use_attr_list)
+
     rec_num = 0
     rec_dict = {}
 
@@ -60,7 +71,7 @@ def load_data_set(file_name, rec_id_col, use_attr_list, header_line):
         rec_val_list = []  # One value list per record
 
         for attr_id in range(len(rec_list)):
-            if attr_id in use_attr_list:
+            if attr_id in use_attr_set:
                 rec_val_list.append(rec_list[attr_id].strip().lower())
             else:
                 rec_val_list.append('')
@@ -81,6 +92,248 @@ def load_data_set(file_name, rec_id_col, use_attr_list, header_line):
     return rec_dict
 
 
+# -----------------------------------------------------------------------------
+
+def _parse_rec_lines(text, rec_id_col, use_attr_set):
+    """Parse a part of a data file (a string of complete CSV lines) and return
+     the list of (record identifier, record value list) tuples in file order.
+     Used by the processes of load_data_set_parallel.
+  """
+
+    rec_tuple_list = []
+
+    for rec_list in csv.reader(io.StringIO(text)):
+        rec_id = rec_list[rec_id_col].strip().lower()
+
+        rec_val_list = []  # One value list per record
+
+        for attr_id in range(len(rec_list)):
+            if attr_id in use_attr_set:
+                rec_val_list.append(rec_list[attr_id].strip().lower())
+            else:
+                rec_val_list.append('')
+
+        rec_tuple_list.append((rec_id, rec_val_list))
+
+    return rec_tuple_list
+
+
+def _parse_file_range(file_name, start_pos, end_pos, encoding, rec_id_col,
+                      use_attr_set):
+    """Parse the lines of an uncompressed data file between the two byte
+     positions, which must be at line boundaries.
+  """
+
+    with open(file_name, 'rb') as in_f:
+        in_f.seek(start_pos)
+        text = in_f.read(end_pos - start_pos).decode(encoding)
+
+    return _parse_rec_lines(text, rec_id_col, use_attr_set)
+
+
+def _get_line_boundaries(in_f, start_pos, end_pos, num_shards):
+    """Split the byte range of a binary file into num_shards parts of about
+     equal size and return the list of part boundaries, each moved forward to
+     the beginning of the next line.
+  """
+
+    boundary_list = [start_pos]
+    shard_size = max(1, (end_pos - start_pos) // num_shards)
+
+    for shard_num in range(1, num_shards):
+        pos = max(start_pos + shard_num * shard_size, boundary_list[-1])
+        if pos >= end_pos:
+            break
+        in_f.seek(pos)
+        in_f.readline()  # Move to the end of the current line
+        pos = min(in_f.tell(), end_pos)
+        if pos > boundary_list[-1]:
+            boundary_list.append(pos)
+
+    if boundary_list[-1] < end_pos or len(boundary_list) == 1:
+        boundary_list.append(end_pos)
+
+    return boundary_list
+
+
+def load_data_set_parallel(file_name, rec_id_col, use_attr_list, header_line,
+                           num_workers=None, lines_per_task=20000):
+    """Load the data set into a dictionary the same way as load_data_set, but
+     parse the file with several processes.
+
+     An uncompressed file is split at line boundaries into one byte range
+     per process, and every process reads and parses its own range. A
+     gzipped file is decompressed by the calling process, which sends blocks
+     of lines_per_task lines to the processes while it continues to
+     decompress. The parsed records are merged in file order, so that
+     duplicate record identifiers are handled and reported as in
+     load_data_set.
+
+     Note that records must not contain line breaks inside quoted values.
+
+     Parameter Description:
+       file_name      : Name of the data file to be read (CSV or CSV.GZ file)
+       rec_id_col     : Record identifier column of the data file
+       use_attr_list  : List of attributes to extract from the file
+       header_line    : Availability of the header line (True of False)
+       num_workers    : Number of processes (default: number of CPU cores)
+       lines_per_task : Number of lines per task for gzipped files
+  """
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    assert num_workers > 0, num_workers
+
+    use_attr_set = set(use_attr_list)
+    encoding = locale.getpreferredencoding(False)
+
+    print('Load data set in parallel from file: ' + file_name)
+    print('  Number of processes: %d' % (num_workers))
+
+    rec_num = 0
+    rec_dict = {}
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+
+        if file_name.endswith('gz'):
+            in_f = gzip.open(file_name, 'rt')
+
+            if header_line:
+                header_list = next(csv.reader([in_f.readline()]))
+                print('  Header line: ' + str(header_list))
+
+            # Decompress in this process and keep a bounded number of parse
+            # tasks running, collecting their results in file order
+            #
+            future_queue = deque()
+            while True:
+                line_list = []
+                for line in in_f:
+                    line_list.append(line)
+                    if len(line_list) == lines_per_task:
+                        break
+                if len(line_list) > 0:
+                    future_queue.append(executor.submit(
+                        _parse_rec_lines, ''.join(line_list), rec_id_col,
+                        use_attr_set))
+
+                if len(future_queue) > 2 * num_workers or \
+                        (len(line_list) == 0 and len(future_queue) > 0):
+                    for (rec_id, rec_val_list) in future_queue.popleft().result():
+                        rec_num += 1
+                        rec_dict[rec_id] = rec_val_list
+
+                if len(line_list) == 0 and len(future_queue) == 0:
+                    break
+
+            in_f.close()
+
+        else:
+            in_f = open(file_name, 'rb')
+
+            start_pos = 0
+            if header_line:
+                header_list = next(csv.reader(
+                    [in_f.readline().decode(encoding)]))
+                print('  Header line: ' + str(header_list))
+                start_pos = in_f.tell()
+
+            end_pos = os.path.getsize(file_name)
+            boundary_list = _get_line_boundaries(in_f, start_pos, end_pos,
+                                                 num_workers)
+            in_f.close()
+
+            future_list = [executor.submit(_parse_file_range, file_name,
+                                           boundary_list[i],
+                                           boundary_list[i + 1], encoding,
+                                           rec_id_col, use_attr_set)
+                           for i in range(len(boundary_list) - 1)]
+
+            for future in future_list:
+                for (rec_id, rec_val_list) in future.result():
+                    rec_num += 1
+                    rec_dict[rec_id] = rec_val_list
+
+    if header_line:
+        print('  Record identifier attribute: ' + str(header_list[rec_id_col]))
+        print('  Attributes to use:')
+        for attr_num in use_attr_list:
+            print('    ' + header_list[attr_num])
+
+    if len(rec_dict) < rec_num:
+        print('  *** Warning, data set contains %d duplicates ***' % \
+              (rec_num - len(rec_dict)))
+        print('       %d unique records' % (len(rec_dict)))
+
+    print('')
+
+    return rec_dict
+
+
+# -----------------------------------------------------------------------------
+
+def load_record_store(file_name, rec_id_col, use_attr_list, header_line):
+    """Load the data set into a column-oriented RecordStore that only holds
+     the values of the attributes to use.
+
+     The returned store can be used in place of the dictionary returned by
+     load_data_set (it maps record identifiers to lists of attribute values),
+     but it needs only one integer code per record and used attribute plus
+     the distinct attribute values.
+
+     Parameter Description:
+       file_name      : Name of the data file to be read (CSV or CSV.GZ file)
+       rec_id_col     : Record identifier column of the data file
+       use_attr_list  : List of attributes to extract from the file
+       header_line    : Availability of the header line (True of False)
+  """
+
+    if file_name.endswith('gz'):
+        in_f = gzip.open(file_name, 'rt')
+    else:
+        in_f = open(file_name)
+
+    csv_reader = csv.reader(in_f)
+
+    print('Load data set from file into record store: ' + file_name)
+
+    if header_line:
+        header_list = next(csv_reader)
+        print('  Header line: ' + str(header_list))
+
+        print('  Record identifier attribute: ' + str(header_list[rec_id_col]))
+        print('  Attributes to use:')
+        for attr_num in use_attr_list:
+            print('    ' + header_list[attr_num])
+
+    store_builder = RecordStoreBuilder(use_attr_list)
+
+    for rec_list in csv_reader:
+        rec_id = rec_list[rec_id_col].strip().lower()
+
+        # Only normalise the values of the attributes to use, all others are
+        # not kept in the store
+        #
+        for attr_id in use_attr_list:
+            if attr_id < len(rec_list):
+                rec_list[attr_id] = rec_list[attr_id].strip().lower()
+
+        store_builder.add(rec_id, rec_list)
+
+    in_f.close()
+
+    rec_store = store_builder.build()
+
+    if len(rec_store) < store_builder.num_added:
+        print('  *** Warning, data set contains %d duplicates ***' % \
+              (store_builder.num_added - len(rec_store)))
+        print('       %d unique records' % (len(rec_store)))
+
+    print('')
+
+    return rec_store
+
+
 # -----------------------------------------------------------------------------
 
 
@@ -120,4 +373,140 @@ def load_truth_data(file_name):
 
 # -----------------------------------------------------------------------------
 
+def iter_data_set(file_name, rec_id_col, use_attr_list, header_line,
+                  batch_size=10000):
+    """Read the data set and yield it in batches of records while the file is
+     parsed, instead of loading the whole file into memory.
+
+     Each batch is a dictionary with the same structure as the dictionary
+     returned by load_data_set (record identifiers as keys and lists of
+     normalised attribute values as values) holding at most batch_size
+     records. As in load_data_set the last record with a given identifier is
+     kept: a record whose identifier already occurred is yielded again, so
+     that it replaces the earlier record when the batches are merged (for
+     example with dict.update, or by blocking.block_batches). The number of
+     duplicates is reported once the whole file has been read.
+
+     Parameter Description:
+       file_name      : Name of the data file to be read (CSV or CSV.GZ file)
+       rec_id_col     : Record identifier column of the data file
+       use_attr_list  : List of attributes to extract from the file
+       header_line    : Availability of the header line (True of False)
+       batch_size     : Maximum number of records per yielded dictionary
+  """
+
+    assert batch_size > 0, batch_size
+
+    if file_name.endswith('gz'):
+        in_f = gzip.open(file_name, 'rt')
+    else:
+        in_f = open(file_name)
+
+    csv_reader = csv.reader(in_f)
+
+    print('Stream data set from file: ' + file_name)
+    print('  Batch size: %d' % (batch_size))
+
+    if header_line:
+        header_list = next(csv_reader)
+        print('  Header line: ' + str(header_list))
+
+        print('  Record identifier attribute: ' + str(header_list[rec_id_col]))
+        print('  Attributes to use:')
+        for attr_num in use_attr_list:
+            print('    ' + header_list[attr_num])
+
+    print('')
+
+    use_attr_set = set(use_attr_list)
+
+    rec_num = 0
+    seen_rec_id_set = set()  # Identifiers of all records read so far
+    rec_dict = {}
+
+    try:
+        for rec_list in csv_reader:
+            rec_num += 1
+
+            rec_id = rec_list[rec_id_col].strip().lower()
+            seen_rec_id_set.add(rec_id)
+
+            rec_val_list = []  # One value list per record
+
+            for attr_id in range(len(rec_list)):
+                if attr_id in use_attr_set:
+                    rec_val_list.append(rec_list[attr_id].strip().lower())
+                else:
+                    rec_val_list.append('')
+
+            rec_dict[rec_id] = rec_val_list  # A duplicate in the same batch is replaced
+
+            if len(rec_dict) == batch_size:
+                yield rec_dict
+                rec_dict = {}
+
+        if len(rec_dict) > 0:
+            yield rec_dict
+
+    finally:
+        in_f.close()
+
+    print('Streamed %d records from file: %s' % (rec_num, file_name))
+    if len(seen_rec_id_set) < rec_num:
+        print('  *** Warning, data set contains %d duplicates ***' % \
+              (rec_num - len(seen_rec_id_set)))
+        print('       %d unique records' % (len(seen_rec_id_set)))
+    print('')
+
+
+# -----------------------------------------------------------------------------
+
+def iter_truth_data(file_name, batch_size=10000):
+    """Read a truth data file (see load_truth_data) and yield sets of at most
+     batch_size true matching record identifier pairs while the file is read.
+     Each distinct pair is yielded once, as in the set of load_truth_data.
+  """
+
+    assert batch_size > 0, batch_size
+
+    if file_name.endswith('gz'):
+        in_f = gzip.open(file_name, 'rt')
+    else:
+        in_f = open(file_name)
+
+    csv_reader = csv.reader(in_f)
+
+    print('Stream truth data from file: ' + file_name)
+    print('')
+
+    seen_pair_set = set()  # All distinct pairs read so far
+    truth_data_set = set()
+
+    try:
+        for rec_list in csv_reader:
+            assert len(rec_list) == 2, rec_list  # Make sure only two identifiers
+
+            rec_id_pair = (rec_list[0].lower(), rec_list[1].lower())
+
+            if rec_id_pair in seen_pair_set:  # Duplicate pair of an earlier batch
+                continue
+            seen_pair_set.add(rec_id_pair)
+
+            truth_data_set.add(rec_id_pair)
+
+            if len(truth_data_set) == batch_size:
+                yield truth_data_set
+                truth_data_set = set()
+
+        if len(truth_data_set) > 0:
+            yield truth_data_set
+
+    finally:
+        in_f.close()
+
+    print('  Streamed %d true matching record pairs' % (len(seen_pair_set)))
+    print('')
+
+# -----------------------------------------------------------------------------
+
 # End of program.
@@ -0,0 +1,297 @@
+""" Module with a column-oriented record store that keeps only the attributes
+    used for linkage.
+
+    Each used attribute is stored as an array of integer codes into a list of
+    distinct (interned) attribute values, and every record identifier is
+    mapped to a dense integer row number. The store can be used wherever a
+    dictionary of records {rec_id: [attribute values]} is expected.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+
+# =============================================================================
+
+class RecordView(Sequence):
+    """Read-only view of a single record of a RecordStore that behaves like
+     the list of attribute values returned by load_data_set. Attributes that
+     were not loaded have the empty string as value.
+  """
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __len__(self):
+        return self._store.num_attrs
+
+    def __getitem__(self, attr):
+        if isinstance(attr, slice):
+            return [self[i] for i in range(*attr.indices(len(self)))]
+        if attr < 0:
+            attr += self._store.num_attrs
+        if attr < 0 or attr >= self._store.num_attrs:
+            raise IndexError('attribute index out of range: %d' % attr)
+        return self._store.value(self._row, attr)
+
+    def __eq__(self, other):
+        if isinstance(other, (RecordView, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# -----------------------------------------------------------------------------
+
+class RecordStore(Mapping):
+    """Column-oriented store of records.
+
+     Attribute values of the used attributes are kept as int32 code arrays
+     (one per attribute) together with the list of distinct values of that
+     attribute. Record identifiers are mapped to dense row numbers 0..n-1.
+
+     The store is a read-only mapping from record identifiers to RecordView
+     objects, so it can be passed to the blocking, comparison and
+     classification functions instead of a record dictionary.
+
+     Parameters
+     ----------
+       rec_id_list :
+          List of record identifiers, the position is the row number
+       columns     :
+          Dictionary with attribute indices as keys and tuples (codes,
+          values) as values, where codes is an integer array with one code
+          per row and values the list of distinct attribute values
+       num_attrs   :
+          Number of attributes of a record (length of a record value list)
+  """
+
+    def __init__(self, rec_id_list, columns, num_attrs):
+        self.rec_id_list = rec_id_list
+        self.row_of = {rec_id: row for (row, rec_id) in enumerate(rec_id_list)}
+        self.num_attrs = num_attrs
+
+        self._codes = {}
+        self._values = {}
+        self._value_arrays = {}
+        for (attr, (codes, values)) in columns.items():
+            codes = np.asarray(codes, dtype=np.int32)
+            assert len(codes) == len(rec_id_list), (attr, len(codes))
+            self._codes[attr] = codes
+            self._values[attr] = values
+
+    # -------------------------------------------------------------------------
+    # Mapping interface (record identifier -> record view)
+
+    def __getitem__(self, rec_id):
+        return RecordView(self, self.row_of[rec_id])
+
+    def __iter__(self):
+        return iter(self.rec_id_list)
+
+    def __len__(self):
+        return len(self.rec_id_list)
+
+    def __contains__(self, rec_id):
+        return rec_id in self.row_of
+
+    # -------------------------------------------------------------------------
+    # Column access
+
+    @property
+    def attributes(self):
+        """Sorted list of the attribute indices held by the store."""
+        return sorted(self._codes)
+
+    def value(self, row, attr):
+        """Return the value of attribute attr of the record in the given row."""
+        codes = self._codes.get(attr)
+        if codes is None:
+            return ''
+        return self._values[attr][codes[row]]
+
+    def codes(self, attr):
+        """Return the int32 code array of the given attribute."""
+        return self._codes[attr]
+
+    def distinct_values(self, attr):
+        """Return the list of distinct values of the given attribute, where
+         the position of a value is its code.
+      """
+        return self._values[attr]
+
+    def _value_array(self, attr):
+        """Return the distinct values of an attribute as numpy array of
+         strings (dtype object), indexed by code.
+      """
+        value_array = self._value_arrays.get(attr)
+        if value_array is None:
+            value_array = np.empty(len(self._values[attr]), dtype=object)
+            value_array[:] = self._values[attr]
+            self._value_arrays[attr] = value_array
+        return value_array
+
+    def column(self, attr):
+        """Return the values of an attribute for all rows as numpy array of
+         strings (dtype object).
+      """
+        if attr not in self._codes:
+            return np.full(len(self), '', dtype=object)
+        return self._value_array(attr)[self._codes[attr]]
+
+    def column_rows(self, attr, row_array):
+        """Return the values of an attribute for the given rows as numpy
+         array of strings (dtype object), without building the whole column.
+      """
+        if attr not in self._codes:
+            return np.full(len(row_array), '', dtype=object)
+        return self._value_array(attr)[self._codes[attr][row_array]]
+
+    def row(self, rec_id):
+        """Return the row number of the given record identifier."""
+        return self.row_of[rec_id]
+
+    def rows_of(self, rec_id_list):
+        """Return an int32 array with the row numbers of the given record
+         identifiers.
+      """
+        return np.fromiter((self.row_of[rec_id] for rec_id in rec_id_list),
+                           dtype=np.int32, count=len(rec_id_list))
+
+    def row_records(self):
+        """Return a sequence of record views indexed by row number instead of
+         record identifier.
+      """
+        return RowRecords(self)
+
+    def to_dict(self):
+        """Convert the store into a record dictionary as returned by
+         load_data_set.
+      """
+        return {rec_id: list(RecordView(self, row))
+                for (row, rec_id) in enumerate(self.rec_id_list)}
+
+
+# -----------------------------------------------------------------------------
+
+class RowRecords(Sequence):
+    """Sequence of the records of a RecordStore indexed by row number, so
+     that blocks and record pairs can refer to records by integer rows.
+  """
+
+    __slots__ = ('_store',)
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [RecordView(self._store, i)
+                    for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self._store)
+        if row < 0 or row >= len(self._store):
+            raise IndexError('row out of range: %d' % row)
+        return RecordView(self._store, int(row))
+
+
+# -----------------------------------------------------------------------------
+
+class RecordStoreBuilder:
+    """Incrementally build a RecordStore from parsed records.
+
+     Records added with an identifier that was already added replace the
+     earlier record (the same as assigning to a dictionary), so the number of
+     duplicates can be computed as the number of added records minus the
+     number of rows.
+  """
+
+    def __init__(self, use_attr_list):
+        self.use_attr_list = list(use_attr_list)
+        self.num_attrs = 0
+        self.num_added = 0
+
+        self._rec_id_list = []
+        self._row_of = {}
+        self._codes = {attr: array('i') for attr in self.use_attr_list}
+        self._values = {attr: [] for attr in self.use_attr_list}
+        self._code_of = {attr: {} for attr in self.use_attr_list}
+
+    def add(self, rec_id, rec_list):
+        """Add a record given as the list of (normalised) attribute values of
+         a line in the data file.
+      """
+        self.num_added += 1
+        self.num_attrs = max(self.num_attrs, len(rec_list))
+
+        row = self._row_of.get(rec_id)
+        if row is None:
+            row = len(self._rec_id_list)
+            self._row_of[rec_id] = row
+            self._rec_id_list.append(sys.intern(rec_id))
+            is_new_row = True
+        else:
+            is_new_row = False
+
+        for attr in self.use_attr_list:
+            if attr < len(rec_list):
+                val = rec_list[attr]
+            else:
+                val = ''
+
+            code_of = self._code_of[attr]
+            code = code_of.get(val)
+            if code is None:
+                code = len(code_of)
+                code_of[val] = code
+                self._values[attr].append(sys.intern(val))
+
+            if is_new_row:
+                self._codes[attr].append(code)
+            else:
+                self._codes[attr][row] = code
+
+    def build(self):
+        """Return the RecordStore with all records added so far."""
+        columns = {}
+        for attr in self.use_attr_list:
+            codes = np.array(self._codes[attr], dtype=np.int32)
+            columns[attr] = (codes, self._values[attr])
+
+        return RecordStore(self._rec_id_list, columns, self.num_attrs)
+
+# -----------------------------------------------------------------------------
+
+def as_record_store(rec_dict, use_attr_list):
+    """Return the given records as RecordStore holding (at least) the given
+     attributes. A RecordStore holding them is returned unchanged, a record
+     dictionary is converted.
+  """
+
+    if isinstance(rec_dict, RecordStore) and \
+            set(use_attr_list).issubset(rec_dict.attributes):
+        return rec_dict
+
+    store_builder = RecordStoreBuilder(use_attr_list)
+    for (rec_id, rec_values) in rec_dict.items():
+        store_builder.add(rec_id, rec_values)
+
+    return store_builder.build()
+
+# -----------------------------------------------------------------------------
+
+# End of program.
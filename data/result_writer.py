@@ -0,0 +1,80 @@
+""" Module to write the record pairs of a linkage to a CSV file while they are
+    compared and classified in chunks (see comparison.compare_blocks_chunked
+    and threshold_classification.classify_chunks), so that the result of a
+    large linkage never has to be held in memory.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import csv
+import gzip
+
+
+# =============================================================================
+
+def write_linkage_chunks(file_name, classified_chunk_iter, attr_name_list=None,
+                         matches_only=True):
+    """Write the classified record pairs of each chunk to a CSV file, and
+     yield the chunks unchanged, so that the writer can be placed between the
+     classification and the evaluation of the chunks. The file is complete
+     once all chunks have been consumed.
+
+     Each line contains the two record identifiers, the match status (1 or 0)
+     and the similarities of the record pair. A file name ending with '.gz'
+     is written gzipped.
+
+     Parameters
+     ----------
+       file_name             :
+          Name of the CSV file to be written
+       classified_chunk_iter :
+          Iterable of (pair_list, sim_matrix, is_match_array) chunks
+       attr_name_list        :
+          List of the names of the compared attributes for the header line
+          (if None the similarities are named sim_0, sim_1, ...)
+       matches_only          :
+          If True only the record pairs classified as matches are written
+
+     Yields
+     -------
+     pair_list, sim_matrix, is_match_array:
+         the chunks of classified_chunk_iter
+  """
+
+    print('Write classified record pairs to file: ' + file_name)
+
+    if file_name.endswith('.gz'):
+        out_f = gzip.open(file_name, 'wt', newline='')
+    else:
+        out_f = open(file_name, 'w', newline='')
+
+    num_pairs_written = 0
+
+    with out_f:
+        csv_writer = csv.writer(out_f)
+        header_written = False
+
+        for (pair_list, sim_matrix, is_match_array) in classified_chunk_iter:
+            if not header_written:
+                if attr_name_list is None:
+                    attr_name_list = ['sim_%d' % (i) for i in range(sim_matrix.shape[1])]
+                csv_writer.writerow(['rec_id_a', 'rec_id_b', 'match'] + list(attr_name_list))
+                header_written = True
+
+            for (rec_id_tuple, sim_list, is_match) in zip(pair_list, sim_matrix.tolist(),
+                                                          is_match_array.tolist()):
+                if matches_only and not is_match:
+                    continue
+                csv_writer.writerow([rec_id_tuple[0], rec_id_tuple[1], int(is_match)] +
+                                    ['%.6g' % (sim) for sim in sim_list])
+                num_pairs_written += 1
+
+            yield pair_list, sim_matrix, is_match_array
+
+    print('  Wrote %d record pairs' % (num_pairs_written))
+    print('')
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -0,0 +1,125 @@
+""" Module with a compact index of the true matching record pairs.
+
+    The true matches are stored as a sorted int64 array of packed (rowA,
+    rowB) keys (see interning.py), so that the match status of many candidate
+    pairs can be looked up with a single vectorised binary search instead of
+    hashing one tuple of record identifiers at a time.
+"""
+
+# =============================================================================
+# Import necessary modules
+
+import numpy as np
+
+from data import interning
+from data.loadDataset import load_truth_data
+
+
+# =============================================================================
+
+class TruthIndex:
+    """Sorted array of packed true match pair keys.
+
+     The index can be used in place of a set of true matches that holds
+     (rowA, rowB) tuples: it supports len(), iteration over (rowA, rowB)
+     tuples and the in operator for single pairs. The contains methods look
+     up whole arrays of pairs at once.
+
+     Parameters
+     ----------
+       pair_keys :
+          Array of packed int64 pair keys of the true matches
+  """
+
+    def __init__(self, pair_keys):
+        self.pair_keys = np.unique(np.asarray(pair_keys, dtype=np.int64))
+
+    @classmethod
+    def from_pair_set(cls, true_match_set, id_mapA, id_mapB):
+        """Create the index from a set of true matching record identifier
+         pairs and the RecordIdMap objects of the two data sets.
+      """
+        return cls(interning.pack_pair_set(true_match_set, id_mapA, id_mapB))
+
+    def __len__(self):
+        return len(self.pair_keys)
+
+    def __iter__(self):
+        rowA_array, rowB_array = interning.unpack_pairs(self.pair_keys)
+        return zip(rowA_array.tolist(), rowB_array.tolist())
+
+    def __contains__(self, row_pair):
+        pair_key = interning.pack_pair(row_pair[0], row_pair[1])
+        pos = np.searchsorted(self.pair_keys, pair_key)
+
+        return pos < len(self.pair_keys) and self.pair_keys[pos] == pair_key
+
+    def contains(self, pair_keys):
+        """Return a boolean mask that is True for each packed pair key in the
+         given array that is a true match.
+      """
+        pair_keys = np.asarray(pair_keys, dtype=np.int64)
+        if len(self.pair_keys) == 0:
+            return np.zeros(pair_keys.shape, dtype=bool)
+
+        pos_array = np.searchsorted(self.pair_keys, pair_keys)
+        pos_array[pos_array == len(self.pair_keys)] = 0
+
+        return self.pair_keys[pos_array] == pair_keys
+
+    def contains_rows(self, rowA_array, rowB_array):
+        """Return a boolean mask for aligned arrays of A and B rows."""
+        return self.contains(interning.pack_pairs(rowA_array, rowB_array))
+
+    def contains_pairs(self, row_pairs):
+        """Return a boolean mask for an iterable of (rowA, rowB) tuples."""
+        return self.contains(interning.pack_pair_tuples(row_pairs))
+
+    def count(self, pair_keys):
+        """Return the number of true matches among the given packed keys."""
+        return int(np.count_nonzero(self.contains(pair_keys)))
+
+
+# -----------------------------------------------------------------------------
+
+def load_truth_index(file_name, id_mapA, id_mapB):
+    """Load a truth data file (see loadDataset.load_truth_data) into a
+     TruthIndex using the RecordIdMap objects of the two data sets.
+  """
+
+    truth_index = TruthIndex.from_pair_set(load_truth_data(file_name),
+                                           id_mapA, id_mapB)
+
+    print('  Indexed %d true matching record pairs' % (len(truth_index)))
+    print('')
+
+    return truth_index
+
+
+# -----------------------------------------------------------------------------
+
+def label_pairs(pair_list, true_match_set, symmetric=False):
+    """Return a boolean array that is True for each record pair in pair_list
+     that is contained in true_match_set. If true_match_set is a TruthIndex
+     the lookup is vectorised, otherwise every pair is looked up in the set.
+
+     With symmetric set to True a pair also counts as match if the reversed
+     pair is in the set. This only applies to sets of record identifier
+     pairs, as the rows of a TruthIndex always refer to data set A first.
+  """
+
+    if isinstance(true_match_set, TruthIndex):
+        return true_match_set.contains_pairs(pair_list)
+
+    if symmetric:
+        return np.fromiter(((rec_id1, rec_id2) in true_match_set or
+                            (rec_id2, rec_id1) in true_match_set
+                            for (rec_id1, rec_id2) in pair_list),
+                           dtype=bool, count=len(pair_list))
+
+    return np.fromiter((rec_id_pair in true_match_set for rec_id_pair in pair_list),
+                       dtype=bool, count=len(pair_list))
+
+# -----------------------------------------------------------------------------
+
+# End of program.
@@ -3,6 +3,8 @@
 """
 from sklearn import metrics
 
+from data.truth_index import TruthIndex, label_pairs
+
 
 # =============================================================================
 
@@ -39,6 +41,10 @@ def confusion_matrix(class_match_set, class_nonmatch_set, true_match_set,
           (len(class_match_set), len(class_nonmatch_set)) + 'classified ' + \
           'non-matches, and %d true matches' % (len(true_match_set)))
 
+    if isinstance(true_match_set, TruthIndex):
+        return _confusion_matrix_truth_index(class_match_set, class_nonmatch_set,
+                                             true_match_set, all_comparisons)
+
     num_tp = 0  # number of true positives
     num_fp = 0  # number of false positives
     num_tn = 0  # number of true negatives
@@ -79,6 +85,74 @@ def confusion_matrix(class_match_set, class_nonmatch_set, true_match_set,
     return [num_tp, num_fp, num_fn, num_tn]
 
 
+def _confusion_matrix_truth_index(class_match_set, class_nonmatch_set,
+                                  truth_index, all_comparisons):
+    """Compute the confusion matrix (see confusion_matrix) for classified
+     (rowA, rowB) pairs and a TruthIndex with one vectorised lookup.
+  """
+
+    # Check a record tuple is only counted once
+    #
+    assert class_match_set.isdisjoint(class_nonmatch_set)
+
+    num_tp = int(truth_index.contains_pairs(class_match_set).sum())
+    num_fp = len(class_match_set) - num_tp
+
+    # All true matches not classified as matches (classified as non-matches
+    # or not compared at all) are false negatives
+    #
+    num_fn = len(truth_index) - num_tp
+    num_tn = all_comparisons - num_tp - num_fp - num_fn
+    print('  TP=%s, FP=%d, FN=%d, TN=%d' % (num_tp, num_fp, num_fn, num_tn))
+    print('')
+
+    return [num_tp, num_fp, num_fn, num_tn]
+
+
+def confusion_matrix_chunked(classified_chunk_iter, true_match_set,
+                             all_comparisons):
+    """Compute the confusion matrix (see confusion_matrix) from chunks of
+     classified record pairs, as yielded by
+     threshold_classification.classify_chunks, counting the chunks one after
+     the other instead of building sets of all classified pairs.
+
+     Parameter Description:
+       classified_chunk_iter : Iterable of (pair_list, sim_matrix,
+                               is_match_array) chunks
+       true_match_set        : Set of true matches (record identifier pairs)
+                               or TruthIndex (if the pairs are row pairs)
+       all_comparisons       : The total number of comparisons between all
+                               record pairs
+
+     This function returns a list with four values representing TP, FP, FN,
+     and TN.
+  """
+
+    print('Calculating confusion matrix from chunks of classified record ' + \
+          'pairs and %d true matches' % (len(true_match_set)))
+
+    num_tp = 0  # number of true positives
+    num_fp = 0  # number of false positives
+
+    for (pair_list, sim_matrix, is_match_array) in classified_chunk_iter:
+        match_pair_list = [rec_id_tuple for (rec_id_tuple, is_match)
+                           in zip(pair_list, is_match_array.tolist()) if is_match]
+
+        num_chunk_tp = int(label_pairs(match_pair_list, true_match_set).sum())
+        num_tp += num_chunk_tp
+        num_fp += len(match_pair_list) - num_chunk_tp
+
+    # All true matches not classified as matches (classified as non-matches
+    # or not compared at all) are false negatives
+    #
+    num_fn = len(true_match_set) - num_tp
+    num_tn = all_comparisons - num_tp - num_fp - num_fn
+    print('  TP=%s, FP=%d, FN=%d, TN=%d' % (num_tp, num_fp, num_fn, num_tn))
+    print('')
+
+    return [num_tp, num_fp, num_fn, num_tn]
+
+
 # =============================================================================
 # TODO Implement accuracy
 def accuracy(confusion_matrix):
@@ -18,9 +18,11 @@ from statistics import mean
 
 from classification.machine_learning import util
 from data import loadDataset
+from data import dataset_cache
 from blocking import blocking_functions
 from blocking import blocking
 from comparison import comparison
+from comparison import comparison_cache
 from comparison import string_functions
 from classification import threshold_classification
 from evaluation import evaluation as evaluation
@@ -49,6 +51,17 @@ truthfile_name = 'datasets/clean-true-matches-1000.csv'
 headerA_line = True  # Dataset A header line available - True or Flase
 headerB_line = True  # Dataset B header line available - True or Flase
 
+# Reload parsed datasets from the binary cache (see data/dataset_cache.py)
+# instead of parsing the CSV files in every run (writes the cache into
+# .dataset_cache/ in the working directory; off by default)
+#
+use_dataset_cache = False
+
+# Cache the similarities of repeated attribute value pairs during the
+# comparison (see comparison/comparison_cache.py); off by default
+#
+use_comparison_cache = False
+
 # The two attribute numbers that contain the record identifiers
 #
 rec_idA_col = 0
@@ -99,10 +112,16 @@ approx_comp_funct_list = [(string_functions.jaro_comp, 1, 1),  # First name
 
 start_time = time.time()
 
-recA_dict = loadDataset.load_data_set(datasetA_name, rec_idA_col, \
-                                      attrA_list, headerA_line)
-recB_dict = loadDataset.load_data_set(datasetB_name, rec_idB_col, \
-                                      attrB_list, headerB_line)
+if use_dataset_cache:
+    recA_dict = dataset_cache.load_data_set_cached(datasetA_name, rec_idA_col, \
+                                                   attrA_list, headerA_line)
+    recB_dict = dataset_cache.load_data_set_cached(datasetB_name, rec_idB_col, \
+                                                   attrB_list, headerB_line)
+else:
+    recA_dict = loadDataset.load_data_set(datasetA_name, rec_idA_col, \
+                                          attrA_list, headerA_line)
+    recB_dict = loadDataset.load_data_set(datasetB_name, rec_idB_col, \
+                                          attrB_list, headerB_line)
 
 # Load data set of true matching pairs
 #
@@ -136,12 +155,18 @@ blocking.print_block_statistics(blockA_dict, blockB_dict)
 # Step 3: Compare the candidate pairs
 
 start_time = time.time()
+if use_comparison_cache:
+    approx_comp_funct_list = comparison_cache.cache_attr_comp_list(approx_comp_funct_list)
+
 sim_vec_dict = comparison.compare_blocks(blockA_dict, blockB_dict, \
                                         recA_dict, recB_dict, \
                                         approx_comp_funct_list)
 
 comparison_time = time.time() - start_time
 
+if use_comparison_cache:
+    comparison_cache.print_cache_statistics(approx_comp_funct_list)
+
 # -----------------------------------------------------------------------------
 # Step 4: Classify the candidate pairs using k-fold cross validation
 